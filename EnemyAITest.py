@@ -1,12 +1,23 @@
 import arcade
 import random
 import math
-from arcade.tilemap import load_tilemap
+from wallgrid import GridPhysicsEngine
+from mapcache import load_map
+from chunks import ChunkStreamer
+from wallrects import WallRects, rect_chunk_builder
+from echoengine import EchoEngine
+from echorender import EchoBuffer
+from pathscheduler import PathScheduler
+from aiworkers import AIWorkerPool
+from spawns import SpawnIndex
+from flowfield import FlowField
+from replay import new_seed
+from startup import Preloader
 import traceback
 
 # Constants
-SCREEN_WIDTH = arcade.window_commands.get_display_size()[0]
-SCREEN_HEIGHT = arcade.window_commands.get_display_size()[1]
+MAP_PATH = "map_files/testingenemyaimap.tmx"
+MAP_SCALE = 1.9
 SCREEN_TITLE = "Echolocator"
 SPRITE_SCALING_PLAYER = 0.5
 SPRITE_SCALING_ENEMY = 0.1  # Make enemies smaller
@@ -21,6 +32,10 @@ RUNDETECTRAD = 400
 # Constants for the enemy
 ENEMY_SPEED = 3.25
 CHASE_RADIUS = 100  # Radius within which the enemy switches to simple pathing
+SPAWN_MIN_CELLS = 10  # Flow field steps kept between the player and where the enemy spawns
+SPAWN_SEED = None  # Seed for the enemy spawn; None picks a new one each run (printed so it can be reused)
+USE_AI_WORKERS = False  # Plan paths in worker processes instead of on the frame (for many enemies)
+AI_WORKERS = 2
 
 # Constants for the mouse
 mouse_x = None
@@ -40,26 +55,17 @@ class Enemy(arcade.Sprite):
         self.speed = ENEMY_SPEED
         # Path variables
         self.path = []
-        self.barrierlist = None
+        self.scheduler = None
         self.cur_position = 0
 
-    def definebarrierlist(self, player, walls, mapwidth, mapheight, tile_size):
-        # Define the barrier list for the enemy
-        self.barrierlist = arcade.AStarBarrierList(
-            self,  # Use self (the enemy instance) as the moving sprite
-            walls,
-            tile_size,
-            0,
-            mapwidth,
-            0,
-            mapheight
-        )
-
-    def spawnenemies(self, enemycount, map_width, map_height, walls, tile_size):
+    def spawnenemies(self, enemycount, spawns, scheduler, rng):
         if enemycount == 1:
-            self.center_x = random.randint(0, map_width)
-            self.center_y = random.randint(0, map_height)
-            self.definebarrierlist(self.player, walls, map_width, map_height, tile_size)  # Use self to call the method
+            # An open spot the player can be reached from, away from them if there is room
+            source = spawns.grid.cell_at(self.player.center_x, self.player.center_y)
+            position = spawns.pick(rng, source, SPAWN_MIN_CELLS) or spawns.pick(rng, source)
+            self.center_x, self.center_y = position
+            # Path requests go through the scheduler shared by every enemy
+            self.scheduler = scheduler
         else:
             print("More than one enemy spawn is not yet supported. :(")
         
@@ -67,12 +73,14 @@ class Enemy(arcade.Sprite):
     def findpath(self, player, walls, mapwidth, mapheight):
         #Find enemy path
             try:
-                enemyloc = (self.center_x, self.center_y)
-                playerloc = (self.player.center_x, self.player.center_y)
-                new_path = arcade.astar_calculate_path(enemyloc, playerloc, self.barrierlist, diagonal_movement=True)
-                if new_path:  # Only update the path if a valid one is found
+                grid = self.scheduler.grid
+                enemycell = grid.cell_at(self.center_x, self.center_y)
+                playercell = grid.cell_at(self.player.center_x, self.player.center_y)
+                # Cached until the player changes cell; new searches run in scheduler.run()
+                new_path = self.scheduler.request(self, enemycell, playercell)
+                if new_path and new_path is not self.path:  # Only update the path if a valid one is found
                     self.path = new_path
-                print(self.path)
+                    self.cur_position = 0
             except Exception:
                 traceback.print_exc()
     
@@ -245,18 +253,25 @@ class Player(arcade.Sprite):
 
 
 class Game(arcade.View):
-    def __init__(self, window):
+    def __init__(self, window, preloader=None, seed=SPAWN_SEED):
         super().__init__(window)
+        self.preloader = preloader  # Map loading started before the window was made
+        self.seed = seed
         self.player = None
         self.enemy = None
-        self.tile_map = None
-        self.scene = None
+        self.chunks = None  # Streams tile chunks in and out around the camera
+        self.walls = None  # Same for the walls, drawn as merged rectangles
         self.physics_engine = None
         self.camera = None
-        self.mapscale = 1.9
-        self.wave_radius = 0
+        self.mapscale = MAP_SCALE
         self.wave_position = None
-        self.walls = None  # Store the walls SpriteList
+        self.echoes = None
+        self.echo_buffer = None
+        self.player_wave = None
+        self.baked_map = None  # Cached compiled form of the .tmx
+        self.wallgrid = None  # Occupancy grid of the Walls layer used for collision
+        self.planner = None
+        self.pathscheduler = None
         self.fps = 0  # Add FPS attribute
         self.dot_sprite = None  # For optimized dot drawing
         self.window = window  # Store window reference
@@ -275,99 +290,84 @@ class Game(arcade.View):
         self.player.center_x = 2 * self.mapscale
         self.player.center_y = 2 * self.mapscale
 
-        # Load the tile map
-        self.tile_map = load_tilemap("map_files/testingenemyaimap.tmx", self.mapscale)
-        self.scene = arcade.Scene.from_tilemap(self.tile_map)
-
-        # Get the walls SpriteList. This is CRUCIAL for your collision detection.
-        self.walls = self.scene["Walls"]
+        # Load the tile map. Collision and nav data come from the baked map cache (rebuilt when the .tmx changes)
+        # Collision queries go through the grid so they don't scale with the wall count
+        if self.preloader is not None and "map" in self.preloader:
+            self.baked_map = self.preloader.take("map")
+        else:
+            self.baked_map = load_map(MAP_PATH, self.mapscale)
+        self.wallgrid = self.baked_map.grid()
+        # Cluster entrances and intra-cluster costs are baked with the map
+        self.planner = self.baked_map.planner(self.wallgrid)
+        if self.pathscheduler is not None and hasattr(self.pathscheduler, "close"):
+            self.pathscheduler.close()
+        if USE_AI_WORKERS:
+            # Searches run off the frame; results are applied a few frames later
+            self.pathscheduler = AIWorkerPool(self.wallgrid, workers=AI_WORKERS, baked=self.baked_map)
+        else:
+            self.pathscheduler = PathScheduler(self.planner, budget_ms=2.0)
 
-        # Add the player to the scene
-        self.scene.add_sprite("Player", self.player)
+        # Only the chunks around the camera are turned into sprites. Walls are
+        # merged into rectangles, one shape per straight run instead of a sprite per tile
+        self.wallrects = WallRects(self.wallgrid, block_size=16)
+        self.walls = ChunkStreamer(self.baked_map, layers=["Walls"], chunk_size=16, margin=1, max_resident=64,
+                                   build_chunk=rect_chunk_builder(self.wallrects))
+        others = [name for name in self.baked_map.layer_names if name != "Walls"]
+        self.chunks = ChunkStreamer(self.baked_map, layers=others, chunk_size=16, margin=1,
+                                    max_resident=64) if others else None
 
         # Set up the physics engine for collision detection
-        self.physics_engine = arcade.PhysicsEngineSimple(self.player, self.walls)
+        self.physics_engine = GridPhysicsEngine(self.player, self.wallgrid)
 
         # Initialise the camera
-        self.camera = arcade.Camera(viewport_width=SCREEN_WIDTH, viewport_height=SCREEN_HEIGHT)
+        self.camera = arcade.Camera(viewport_width=self.window.width, viewport_height=self.window.height)
 
         # Initialize the dot sprite
         self.dot_sprite = arcade.Sprite("images/player.png", scale=0.001)
         self.dot_sprite.visible = False
 
-        # Initialize the rectangle sprite
-        self.rect_sprite = arcade.SpriteSolidColor(8, 2, arcade.color.RED)
-        self.rect_sprite.visible = False
+        # Echo waves are advanced in one batch against the wall grid
+        self.echoes = EchoEngine(self.wallgrid)
+        self.echo_buffer = EchoBuffer()
 
         self.window.game_view = self  # Set game_view reference in window
 
-        map_width = self.tile_map.width * self.tile_map.tile_width * self.mapscale
-        map_height = self.tile_map.height * self.tile_map.tile_height * self.mapscale
-
         self.enemy = Enemy(self.window, player=self.player)  # Pass the player instance
-        self.enemy.spawnenemies(1, map_width, map_height, self.walls, self.tile_map.tile_width)  # Call on the Enemy instance
+        # Spawn distances are steps along open floor from the player, and the
+        # spawn comes from one seeded rng so a seed places it the same again
+        seed = new_seed() if self.seed is None else self.seed
+        print(f"Spawn seed {seed}")
+        flowfield = FlowField(self.wallgrid)
+        flowfield.update(self.wallgrid.cell_at(self.player.center_x, self.player.center_y))
+        spawns = SpawnIndex(self.wallgrid, (self.enemy.width, self.enemy.height), flowfield)
+        self.enemy.spawnenemies(1, spawns, self.pathscheduler, random.Random(seed))  # Call on the Enemy instance
 
     def echowave(self, step, speed, max_range, repetitions):
-        for i in range(repetitions):
-            try:
-                if self.wave_position is None:
-                    self.wave_position = (self.player.center_x, self.player.center_y)
-                    self.wave_radius = 0
-
-                self.wave_radius += speed * step
-
-                if self.wave_radius > max_range:
-                    self.wave_position = None
-                    self.stopped = True  # Ensure stopped is set to True when wave completes
-                    return
-
-                if self.wave_position is not None:
-                    num_dots = 20
-                    thickness = 1
-
-                    angles = [-2 * math.pi * i / num_dots for i in range(num_dots)]  # Rotate angles in the opposite direction
-
-                    for t in range(thickness):
-                        numcount = 0
-                        for i in range(num_dots):
-                            angle = angles[i]
-                            radius = self.wave_radius + t * 5  # Precompute the radius addition
-                            x = self.wave_position[0] + radius * math.cos(angle)
-                            y = self.wave_position[1] + radius * math.sin(angle)
-
-                            a = 255
-                            b = 0
-                            c = 0
-                            alpha = 255
-
-                            self.rect_sprite.center_x = x
-                            self.rect_sprite.center_y = y
-                            self.rect_sprite.angle = math.degrees(angles[numcount])  # Rotate to face outwards
-                            numcount += 1
-                            self.rect_sprite.visible = True
-
-                            hit_list = arcade.check_for_collision_with_list(self.rect_sprite, self.walls)
-                            if hit_list:
-                                a = 0
-                                b = 255
-                                c = 0
-                            
-                            if self.rect_sprite.visible: #only draw if it wasn't a collision
-                                if self.wave_radius / max_range > 0.2:
-                                    alpha = int(255 * (1 - self.wave_radius / max_range))
-
-                                camera_left = self.camera.position[0]
-                                camera_bottom = self.camera.position[1]
-                                camera_right = camera_left + self.camera.viewport_width
-                                camera_top = camera_bottom + self.camera.viewport_height
-
-                                if camera_left <= x <= camera_right and camera_bottom <= y <= camera_top:
-                                    arcade.draw_rectangle_filled(x, y, 64, 16, (a, b, c, alpha), self.rect_sprite.angle)
-
-                                self.rect_sprite.visible = False #hide it again
+        try:
+            # Start a new wave from the player once the last one has finished
+            if self.wave_position is None:
+                self.wave_position = (self.player.center_x, self.player.center_y)
+                self.player_wave = self.echoes.emit(self.wave_position[0], self.wave_position[1], speed=speed * repetitions, max_range=max_range, step=step)
+        except Exception:
+            traceback.print_exc()
 
-            except Exception:
-                traceback.print_exc()
+    def update_echoes(self):
+        # Advance every live wave (player, shouts, enemies) in one batch
+        self.echoes.update()
+        if self.wave_position is not None and not self.echoes.is_active(self.player_wave):
+            self.wave_position = None
+            self.stopped = True  # Ensure stopped is set to True when wave completes
+
+    def draw_echoes(self):
+        camera_left = self.camera.position[0]
+        camera_bottom = self.camera.position[1]
+        camera_right = camera_left + self.camera.viewport_width
+        camera_top = camera_bottom + self.camera.viewport_height
+
+        # Every visible dot goes into one buffer and is drawn in a single call
+        self.echo_buffer.build(self.echoes.x, self.echoes.y, self.echoes.angle, self.echoes.colours(),
+                               camera_left, camera_bottom, camera_right, camera_top)
+        self.echo_buffer.draw()
 
     def on_show(self):
         pass
@@ -375,11 +375,16 @@ class Game(arcade.View):
     def on_draw(self):
         arcade.start_render()
         self.camera.use()
-        self.scene.draw()
+        self.walls.draw()
+        if self.chunks is not None:
+            self.chunks.draw()
+        self.player.draw()
         arcade.set_background_color(self.backcolour)
         if not self.stopped or self.wave_position is not None:
             if not self.walking:
                 self.echowave(step = 0.5, speed = 10, max_range = 100, repetitions=1)
+        self.update_echoes()
+        self.draw_echoes()
         
         # Draw the detection circle
         if self.player.detection_circle:
@@ -408,10 +413,12 @@ class Game(arcade.View):
     def on_update(self, delta_time):
         self.player.update(self.camera)
         self.physics_engine.update()
+        self.walls.refresh(self.wallrects.take_dirty())
         self.update_camera()
         self.fps = 1 / delta_time  # Update FPS
 
-        self.enemy.findpath(self.player, self.walls, self.mapwidth, self.mapheight)
+        self.enemy.findpath(self.player, self.wallgrid, self.mapwidth, self.mapheight)
+        self.pathscheduler.run()
         #Allow enemy to follow Path
         self.enemy.followpath()
         
@@ -421,7 +428,7 @@ class Game(arcade.View):
         fps_text = f"FPS: {int(self.fps)}"
         camera_left = self.camera.position[0]
         camera_bottom = self.camera.position[1]
-        arcade.draw_text(fps_text, camera_left + SCREEN_WIDTH - 10, camera_bottom + SCREEN_HEIGHT - 20, arcade.color.GREEN, 14, anchor_x="right")
+        arcade.draw_text(fps_text, camera_left + self.camera.viewport_width - 10, camera_bottom + self.camera.viewport_height - 20, arcade.color.GREEN, 14, anchor_x="right")
 
     def update_camera(self):
         # Center the camera on the player
@@ -429,8 +436,8 @@ class Game(arcade.View):
         screen_center_y = self.player.center_y - (self.camera.viewport_height / 2)
 
         # Don't let the camera go beyond the boundaries of the map
-        map_width = self.tile_map.width * self.tile_map.tile_width * self.mapscale
-        map_height = self.tile_map.height * self.tile_map.tile_height * self.mapscale
+        map_width = self.baked_map.width
+        map_height = self.baked_map.height
         self.mapwidth = map_width
         self.mapheight = map_height
 
@@ -440,6 +447,9 @@ class Game(arcade.View):
         screen_center_y = min(screen_center_y, map_height - self.camera.viewport_height)
 
         self.camera.move_to((screen_center_x, screen_center_y))
+        self.walls.update(screen_center_x, screen_center_y, self.camera.viewport_width, self.camera.viewport_height)
+        if self.chunks is not None:
+            self.chunks.update(screen_center_x, screen_center_y, self.camera.viewport_width, self.camera.viewport_height)
 
         # Update the player's direction with the adjusted mouse coordinates
         self.player.update_direction(self.camera)
@@ -467,6 +477,8 @@ class Game(arcade.View):
         if key == arcade.key.SPACE:
             self.backcolour = arcade.color.WHITE
         if key == arcade.key.ESCAPE:
+            if USE_AI_WORKERS:
+                self.pathscheduler.close()
             self.window.close()
             quit()
 
@@ -496,12 +508,16 @@ class Game(arcade.View):
         
 
 def main():
-    window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE, fullscreen=True)
-    game_view = Game(window)  # Initialize game_view HERE
-    game_view.__init__(window)
+    # The map bakes on a worker while the window is being made
+    preloader = Preloader(workers=1)
+    preloader.submit("map", load_map, MAP_PATH, MAP_SCALE)
+    screen_width, screen_height = arcade.window_commands.get_display_size()
+    window = arcade.Window(screen_width, screen_height, SCREEN_TITLE, fullscreen=True)
+    game_view = Game(window, preloader)  # Initialize game_view HERE
     game_view.setup()
     window.show_view(game_view)
     arcade.run()
+    preloader.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
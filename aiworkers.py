@@ -0,0 +1,251 @@
+import gc
+import multiprocessing
+import queue
+import time
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from mapcache import open_baked
+from pathfinding import HierarchicalPlanner
+from wallgrid import WallGrid
+
+
+def _worker(index, shm_name, shape, cell_size, folder, requests, results):
+    # Worker process: plans over the main process's grid in shared memory
+    # with its own planner, one batch of requests at a time. The planner's
+    # searches read the open-cell flags there directly, so every search sees
+    # the walls as the main process last wrote them; edit messages only tell
+    # the planner which clusters to rebuild.
+    shm = shared_memory.SharedMemory(name=shm_name)
+    size = shape[0] * shape[1]
+    open_cells = shm.buf[size:2 * size]
+    grid = WallGrid(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf), cell_size)
+    planner = open_baked(folder).planner(grid, open_cells) if folder else HierarchicalPlanner(grid, open=open_cells)
+    results.put(("ready", index))
+    while True:
+        message = requests.get()
+        if message[0] == "stop":
+            break
+        if message[0] == "edits":
+            # The cells are already written; only the planner needs telling
+            for col, row, blocked in message[1]:
+                grid.notify_edit(col, row, blocked)
+        elif message[0] == "paths":
+            begin = time.perf_counter()
+            found = [(agent_id, goal, planner.find_path(start, goal)) for agent_id, start, goal in message[1]]
+            results.put(("paths", index, found, (time.perf_counter() - begin) * 1000))
+    # The planner and grid reference each other; both must be gone before
+    # the shared memory can close
+    del grid, planner
+    gc.collect()
+    open_cells.release()
+    shm.close()
+
+
+def _shutdown(shm, processes, requests):
+    for inbox in requests:
+        try:
+            inbox.put(("stop",))
+        except (OSError, ValueError):
+            pass
+    for process in processes:
+        process.join(timeout=1)
+        if process.is_alive():
+            process.terminate()
+    shm.close()
+    shm.unlink()
+
+
+class AIWorkerPool:
+    # Drop-in for PathScheduler that runs the searches in worker processes,
+    # so a slow search never holds up a frame. The wall grid is copied into
+    # shared memory once, followed by the same cells as open flags (1 where
+    # open) that the workers' searches read in place. Wall edits are written
+    # to both straight away and broadcast so each worker's planner can
+    # rebuild the clusters they touch.
+    # request() only queues work and hands back the agent's current path;
+    # run() sends the queued requests out in batches and collects whatever
+    # has come back. A result is dropped as stale if the agent has asked for
+    # a different goal since, or if a wall now sits on the path.
+    def __init__(self, grid, workers=2, baked=None, batch_size=64, clock=time.perf_counter):
+        self.grid = grid
+        self.batch_size = batch_size
+        self.clock = clock
+        self.shm = shared_memory.SharedMemory(create=True, size=2 * grid.cells.size)
+        planes = np.ndarray((2,) + grid.cells.shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.cells = planes[0]
+        self.open = planes[1]
+        self.cells[:] = grid.cells
+        self.open[:] = grid.cells == 0
+        # The baked nav graph only matches the map as it was loaded
+        folder = baked.folder if baked is not None and grid.version == 0 else None
+        self.results = multiprocessing.Queue()
+        self.inboxes = [multiprocessing.Queue() for _ in range(workers)]
+        self.processes = [
+            multiprocessing.Process(target=_worker, daemon=True,
+                                    args=(index, self.shm.name, grid.cells.shape, grid.cell_size, folder,
+                                          inbox, self.results))
+            for index, inbox in enumerate(self.inboxes)
+        ]
+        for process in self.processes:
+            process.start()
+        self._finalizer = weakref.finalize(self, _shutdown, self.shm, self.processes, self.inboxes)
+        self.edits = []  # (col, row, blocked) not yet sent to the workers
+        self.outbox = {}  # agent -> (start, goal) to send on the next run()
+        self.in_flight = {}  # agent -> (goal, time sent) of its newest submitted search
+        self.wanted = {}  # agent -> goal it is waiting on a path to
+        self.paths = {}  # agent -> (goal, cell path, world path)
+        self.agent_ids = {}  # agent -> id sent to the workers (agents themselves stay here)
+        self.agents = {}  # id -> agent
+        self._next_id = 0
+        self._next_worker = 0
+        # Counters
+        self.requests = 0
+        self.submitted = 0
+        self.batches = 0
+        self.completed = 0
+        self.stale = 0
+        self.blocked = 0
+        self.ready_workers = 0
+        self.last_frame_ms = 0.0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.worker_ms = 0.0
+        grid.subscribe(self.on_edit)
+
+    @property
+    def queue_depth(self):
+        return len(self.outbox) + len(self.in_flight)
+
+    def on_edit(self, col, row, blocked):
+        self.cells[row, col] = blocked
+        self.open[row, col] = not blocked
+        self.edits.append((col, row, blocked))
+        if blocked:
+            # Paths through the new wall are replanned on the next request
+            for agent in [agent for agent, (_, cells, _) in self.paths.items() if cells and (col, row) in cells]:
+                del self.paths[agent]
+
+    def request(self, agent, start, goal):
+        # Returns the best path the agent has right now (possibly the previous
+        # one while a new search is out), as a list of world points or None
+        self.requests += 1
+        current = self.paths.get(agent)
+        if current is not None and current[0] == goal:
+            self.wanted.pop(agent, None)
+            return current[2]
+        self.wanted[agent] = goal
+        sent = self.in_flight.get(agent)
+        if sent is None or sent[0] != goal:
+            # A newer request replaces whatever the agent was going to send
+            self.outbox[agent] = (start, goal)
+        return current[2] if current is not None else None
+
+    def invalidate(self, agent=None):
+        # Forget an agent's path (or everyone's) so the next request replans
+        if agent is None:
+            self.paths.clear()
+        else:
+            self.paths.pop(agent, None)
+
+    def remove(self, agent):
+        self.paths.pop(agent, None)
+        self.outbox.pop(agent, None)
+        self.in_flight.pop(agent, None)
+        self.wanted.pop(agent, None)
+        agent_id = self.agent_ids.pop(agent, None)
+        self.agents.pop(agent_id, None)
+
+    def run(self):
+        # Send edits and queued requests, then take whatever results are back
+        begin = self.clock()
+        if self.edits:
+            for inbox in self.inboxes:
+                inbox.put(("edits", self.edits))
+            self.edits = []
+        if self.outbox:
+            self._submit()
+        while True:
+            try:
+                message = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "ready":
+                self.ready_workers += 1
+            elif message[0] == "paths":
+                self._collect(message[2])
+                self.worker_ms += message[3]
+        self.last_frame_ms = (self.clock() - begin) * 1000
+
+    def _submit(self):
+        now = self.clock()
+        jobs = []
+        for agent, (start, goal) in self.outbox.items():
+            agent_id = self.agent_ids.get(agent)
+            if agent_id is None:
+                agent_id = self.agent_ids[agent] = self._next_id
+                self.agents[agent_id] = agent
+                self._next_id += 1
+            jobs.append((agent_id, start, goal))
+            self.in_flight[agent] = (goal, now)
+        self.outbox.clear()
+        # Batches go to the workers in turn
+        for first in range(0, len(jobs), self.batch_size):
+            self.inboxes[self._next_worker].put(("paths", jobs[first:first + self.batch_size]))
+            self._next_worker = (self._next_worker + 1) % len(self.inboxes)
+            self.batches += 1
+        self.submitted += len(jobs)
+
+    def _collect(self, found):
+        now = self.clock()
+        is_wall = self.grid.is_wall
+        for agent_id, goal, cells in found:
+            self.completed += 1
+            agent = self.agents.get(agent_id)
+            if agent is None:
+                continue
+            sent = self.in_flight.get(agent)
+            if sent is not None and sent[0] == goal:
+                del self.in_flight[agent]
+                self.last_latency_ms = (now - sent[1]) * 1000
+                self.max_latency_ms = max(self.max_latency_ms, self.last_latency_ms)
+            if self.wanted.get(agent) != goal:
+                self.stale += 1
+                continue
+            if cells and any(is_wall(col, row) for col, row in cells):
+                # Planned before an edit reached the worker; ask again
+                self.blocked += 1
+                self.outbox[agent] = (cells[0], goal)
+                continue
+            world = [self.grid.cell_center(col, row) for col, row in cells] if cells else None
+            self.paths[agent] = (goal, cells, world)
+            del self.wanted[agent]
+
+    def close(self):
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def stats(self):
+        return {
+            "workers": len(self.processes),
+            "ready_workers": self.ready_workers,
+            "requests": self.requests,
+            "submitted": self.submitted,
+            "batches": self.batches,
+            "completed": self.completed,
+            "stale": self.stale,
+            "blocked": self.blocked,
+            "queue_depth": self.queue_depth,
+            "last_frame_ms": self.last_frame_ms,
+            "last_latency_ms": self.last_latency_ms,
+            "max_latency_ms": self.max_latency_ms,
+            "worker_ms": self.worker_ms,
+        }
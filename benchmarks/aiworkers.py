@@ -0,0 +1,90 @@
+# Main-thread frame time of enemy pathfinding with many enemies chasing a
+# player who jumps to a new cell every second (so every enemy replans at
+# once): searching inline, time-sliced by PathScheduler, and in AIWorkerPool
+# processes. Frames are paced at 60 FPS, so the workers get the idle part
+# of each frame, and the time from a goal change to the enemy having a path
+# to it is reported in frames.
+# Run from the repo root: python -m benchmarks.aiworkers
+import argparse
+import random
+import time
+
+import numpy as np
+
+from aiworkers import AIWorkerPool
+from mapcache import load_map
+from pathscheduler import PathScheduler
+
+MAPSCALE = 1.9
+FRAME = 1 / 60
+GOAL_EVERY = 60  # Frames between player jumps
+
+
+class Agent:
+    def __init__(self, cell):
+        self.cell = cell
+
+
+def run(scheduler, agents, goals, frames):
+    times = []
+    latencies = []
+    asked = {}  # agent -> frame it first asked for the current goal
+    for frame in range(frames):
+        goal = goals[frame // GOAL_EVERY]
+        begin = time.perf_counter()
+        for agent in agents:
+            path = scheduler.request(agent, agent.cell, goal)
+            if path is None or scheduler.paths.get(agent, (None,))[0] != goal:
+                asked.setdefault(agent, frame)
+            elif agent in asked:
+                latencies.append(frame - asked.pop(agent))
+        scheduler.run()
+        elapsed = time.perf_counter() - begin
+        times.append(elapsed * 1000)
+        if elapsed < FRAME:
+            time.sleep(FRAME - elapsed)
+    return np.array(times), latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Frame-time jitter of inline, time-sliced and worker pathfinding")
+    parser.add_argument("--map", default="map_files/Maze_1.tmx")
+    parser.add_argument("--enemies", nargs="+", type=int, default=[100, 500])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    baked = load_map(args.map, MAPSCALE)
+    rng = random.Random(0)
+    cols, rows = baked.grid().free_cells()
+
+    def random_cell():
+        index = rng.randrange(len(cols))
+        return int(cols[index]), int(rows[index])
+
+    print(f"{'enemies':>8}  {'mode':<10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'latency p50':>13}{'latency max':>13}")
+    for count in args.enemies:
+        starts = [random_cell() for _ in range(count)]
+        goals = [random_cell() for _ in range(args.frames // GOAL_EVERY + 1)]
+        for mode in ("inline", "sliced", "workers"):
+            grid = baked.grid()
+            agents = [Agent(cell) for cell in starts]
+            if mode == "workers":
+                scheduler = AIWorkerPool(grid, workers=args.workers, baked=baked)
+                # Let the workers load the nav graph before timing
+                while scheduler.ready_workers < args.workers:
+                    scheduler.run()
+                    time.sleep(0.01)
+            else:
+                budget = float("inf") if mode == "inline" else 2.0
+                scheduler = PathScheduler(baked.planner(grid), budget_ms=budget)
+            times, latencies = run(scheduler, agents, goals, args.frames)
+            if mode == "workers":
+                scheduler.close()
+            p50, p99 = np.percentile(times, (50, 99))
+            latency = f"{np.median(latencies):>13.0f}{max(latencies):>13}" if latencies else f"{'-':>13}{'-':>13}"
+            print(f"{count:>8}  {mode:<10}{p50:>9.2f}{p99:>9.2f}{times.max():>9.2f}{latency}")
+
+
+if __name__ == "__main__":
+    main()
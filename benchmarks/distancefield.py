@@ -0,0 +1,93 @@
+# Distance field on the shipped maps: build and edit cost, size, clearance
+# lookups, sphere-traced ray casts against the cell by cell DDA, and echo
+# engine updates with per-frame marching versus rays cast once per wave.
+# Run from the repo root: python -m benchmarks.distancefield
+import random
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.wallrects import grid_raycast
+from distancefield import DistanceField
+from echoengine import EchoEngine
+from mapcache import load_map
+
+MAPS = ["map_files/Maze2mid.tmx", "map_files/Maze_1.tmx"]
+MAPSCALE = 1.9
+WAVE_DOTS = 20
+RANGES = (100, 600, 2000)  # The player's waves reach 100 (WAVE_RANGE)
+
+
+def random_points(grid, rng, count):
+    cols, rows = grid.free_cells()
+    points = []
+    for _ in range(count):
+        index = rng.randrange(len(cols))
+        x, y = grid.cell_center(int(cols[index]), int(rows[index]))
+        points.append((x + rng.uniform(-20, 20), y + rng.uniform(-20, 20)))
+    return points
+
+
+def echo_run(grid, field, points, max_range):
+    # Every wave emitted at once, then updated until all have finished
+    engine = EchoEngine(grid, field=field)
+    begin = time.perf_counter()
+    for x, y in points:
+        engine.emit(x, y, speed=6, max_range=max_range)
+    updates = 0
+    while len(engine):
+        engine.update()
+        updates += 1
+    return (time.perf_counter() - begin) * 1000, updates
+
+
+def main(waves=100):
+    angles = 2 * np.pi * np.arange(WAVE_DOTS) / WAVE_DOTS
+    dir_x = np.cos(angles)
+    dir_y = np.sin(angles)
+    print(f"{'map':<14}{'build ms':>10}{'KB':>7}{'edit ms':>9}{'clear us':>10}{'range':>7}{'DDA us':>9}"
+          f"{'traced us':>11}{'steps':>7}{'agree':>8}{'echo march ms':>15}{'echo traced ms':>16}")
+    for path in MAPS:
+        grid = load_map(path, MAPSCALE).grid()
+        begin = time.perf_counter()
+        field = DistanceField(grid)
+        build_ms = (time.perf_counter() - begin) * 1000
+        rng = random.Random(0)
+        points = random_points(grid, rng, waves)
+
+        begin = time.perf_counter()
+        for x, y in points:
+            field.clearance(x, y)
+        clear_us = (time.perf_counter() - begin) / len(points) * 1e6
+
+        for max_range in RANGES:
+            begin = time.perf_counter()
+            expected = [[grid_raycast(grid, x, y, dx, dy, max_range) for dx, dy in zip(dir_x.tolist(), dir_y.tolist())]
+                        for x, y in points]
+            dda_us = (time.perf_counter() - begin) / len(points) * 1e6
+            steps = 0
+            begin = time.perf_counter()
+            traced = []
+            for x, y in points:
+                traced.append(field.raycast(x, y, dir_x, dir_y, max_range))
+                steps += field.last_cast_steps
+            traced_us = (time.perf_counter() - begin) / len(points) * 1e6
+            agree = np.mean([a == b or abs(a - b) < 1e-6 for wave, distances in zip(expected, traced)
+                             for a, b in zip(wave, distances.tolist())])
+            march_ms, _ = echo_run(grid, None, points, max_range)
+            echo_ms, _ = echo_run(grid, field, points, max_range)
+            print(f"{path.split('/')[-1]:<14}{build_ms:>10.1f}{field.field.nbytes / 1024:>7.0f}{'':>9}"
+                  f"{clear_us:>10.2f}{max_range:>7}{dda_us:>9.0f}{traced_us:>11.0f}{steps / len(points):>7.1f}"
+                  f"{agree:>8.1%}{march_ms:>15.1f}{echo_ms:>16.1f}")
+
+        edit_ms = []
+        for _ in range(50):
+            col, row = rng.randrange(grid.cols), rng.randrange(grid.rows)
+            grid.set_wall(col, row, not grid.is_wall(col, row))
+            edit_ms.append(field.last_update_ms)
+        print(f"{'':<14}{'':>10}{'':>7}{np.mean(edit_ms):>9.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
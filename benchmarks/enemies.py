@@ -0,0 +1,69 @@
+# The array-backed enemy store under scripted headless play with 100 to
+# 10000 enemies: p50/p99 of the enemy stages and the whole tick against the
+# 60 Hz budget, how many enemies end up chasing, and how many sprites a
+# 1920x1080 camera on the player would actually have to sync.
+# Run from the repo root: python -m benchmarks.enemies
+import argparse
+import random
+
+import numpy as np
+
+from benchmarks.scenarios import script
+from mapcache import load_map
+from profiler import FrameProfiler
+from simulation import Simulation, DT
+
+MAPS = ["map_files/Maze2mid.tmx", "map_files/Maze_1.tmx"]
+ENEMY_COUNTS = [100, 1000, 3000, 10000]
+MAPSCALE = 1.9
+VIEW = (1920, 1080)
+WARMUP_TICKS = 10
+SEED = 0
+
+
+def run(baked, enemies, ticks, seed):
+    rng = random.Random(seed)
+    grid = baked.grid()
+    cols, rows = grid.free_cells()
+    index = rng.randrange(len(cols))
+    sim = Simulation(grid, enemy_count=enemies, seed=seed,
+                     player_start=grid.cell_center(int(cols[index]), int(rows[index])), tiles=baked.wall_tiles())
+    profiler = sim.profiler = FrameProfiler(window=ticks)
+    shown = []
+    for tick, controls in enumerate(script(sim, rng, ticks + WARMUP_TICKS)):
+        if tick == WARMUP_TICKS:
+            profiler.reset()
+        profiler.begin_frame()
+        sim.step(controls)
+        profiler.end_frame()
+        left = sim.player.center_x - VIEW[0] / 2
+        bottom = sim.player.center_y - VIEW[1] / 2
+        shown.append(len(sim.enemies.visible(left, bottom, left + VIEW[0], bottom + VIEW[1])))
+    return profiler.summary(), sim.enemies.stats(), np.mean(shown)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enemy store tick cost from 100 to 10000 enemies")
+    parser.add_argument("--maps", nargs="+", default=MAPS)
+    parser.add_argument("--enemies", nargs="+", type=int, default=ENEMY_COUNTS)
+    parser.add_argument("--ticks", type=int, default=300)
+    args = parser.parse_args(argv)
+
+    budget_ms = DT * 1000
+    print(f"{'map':<16}{'enemies':>8}{'enemies p50':>13}{'p99':>8}{'physics p50':>13}{'p99':>8}"
+          f"{'detection p99':>15}{'tick p50':>10}{'p99':>8}{'budget':>8}{'chasing':>9}{'on screen':>11}")
+    for path in args.maps:
+        baked = load_map(path, MAPSCALE)
+        for count in args.enemies:
+            summary, stats, shown = run(baked, count, args.ticks, SEED)
+            enemies = summary["enemies"]
+            physics = summary["physics"]
+            tick = summary["frame"]
+            print(f"{path.split('/')[-1]:<16}{count:>8}{enemies['p50']:>13.2f}{enemies['p99']:>8.2f}"
+                  f"{physics['p50']:>13.2f}{physics['p99']:>8.2f}{summary['detection']['p99']:>15.2f}"
+                  f"{tick['p50']:>10.2f}{tick['p99']:>8.2f}{tick['p99'] / budget_ms:>8.0%}"
+                  f"{stats['chase']:>9}{shown:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Wall tiles submitted for drawing per frame with the whole Walls layer
+# streamed around the camera versus only the walls echoes have revealed,
+# over scripted headless play. Also times the fog update and the chunk
+# rebuilds it causes. Chunks are counted rather than turned into sprites.
+# Run from the repo root: python -m benchmarks.fog
+import random
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.scenarios import script
+from chunks import ChunkStreamer
+from mapcache import load_map
+from profiler import FrameProfiler
+from simulation import Simulation
+
+MAPS = ["map_files/Maze2mid.tmx", "map_files/Maze_1.tmx"]
+MAPSCALE = 1.9
+VIEW = (1920, 1080)
+
+
+def count_chunk(streamer, cx, cy):
+    count = sum(len(streamer.tiles(layer, cx, cy)[0]) for layer in streamer.layers)
+    return count, count
+
+
+def run(path, ticks):
+    baked = load_map(path, MAPSCALE)
+    rng = random.Random(0)
+    grid = baked.grid()
+    cols, rows = grid.free_cells()
+    index = rng.randrange(len(cols))
+    sim = Simulation(grid, enemy_count=0, seed=0,
+                     player_start=grid.cell_center(int(cols[index]), int(rows[index])))
+    fog = sim.fog
+    profiler = sim.profiler = FrameProfiler(window=ticks)
+
+    def count_lit(streamer, cx, cy):
+        count = len(fog.tiles(streamer, "Walls", cx, cy)[0])
+        return (count or None), count
+
+    full = ChunkStreamer(baked, layers=["Walls"], chunk_size=fog.chunk_size, build_chunk=count_chunk)
+    lit = ChunkStreamer(baked, layers=["Walls"], chunk_size=fog.chunk_size, build_chunk=count_lit)
+    full_tiles = []
+    lit_tiles = []
+    refresh_ms = []
+    for controls in script(sim, rng, ticks):
+        profiler.begin_frame()
+        sim.step(controls)
+        profiler.end_frame()
+        begin = time.perf_counter()
+        lit.refresh(fog.take_dirty())
+        refresh_ms.append((time.perf_counter() - begin) * 1000)
+
+        left = sim.player.center_x - VIEW[0] / 2
+        bottom = sim.player.center_y - VIEW[1] / 2
+        full.update(left, bottom, *VIEW)
+        lit.update(left, bottom, *VIEW)
+        full_tiles.append(sum(full.visible))
+        lit_tiles.append(sum(lit.visible))
+    return np.array(full_tiles), np.array(lit_tiles), profiler.recent("fog"), np.array(refresh_ms), lit.rebuilds
+
+
+def main(ticks=1200):
+    print(f"{'map':<16}{'full tiles':>12}{'lit tiles':>11}{'fog p50 ms':>12}{'fog p99 ms':>12}"
+          f"{'refresh p99 ms':>16}{'rebuilds/s':>12}")
+    for path in MAPS:
+        full, lit, fog_ms, refresh_ms, rebuilds = run(path, ticks)
+        print(f"{path.split('/')[-1]:<16}{full.mean():>12.0f}{lit.mean():>11.1f}"
+              f"{np.percentile(fog_ms, 50):>12.3f}{np.percentile(fog_ms, 99):>12.3f}"
+              f"{np.percentile(refresh_ms, 99):>16.3f}{rebuilds / (ticks / 60):>12.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1200)
@@ -0,0 +1,47 @@
+# Cold (parse + bake) and warm (memory-mapped cache) load times for each shipped map,
+# next to parsing the .tmx and building the nav graph from scratch.
+# Run from the repo root: python -m benchmarks.mapload
+import shutil
+import tempfile
+import time
+
+from wallgrid import WallGrid
+from pathfinding import HierarchicalPlanner
+from mapcache import load_map
+
+MAPS = ["map_files/testingenemyaimap.tmx", "map_files/Maze2mid.tmx", "map_files/Maze_1.tmx"]
+MAPSCALE = 1.9
+
+
+def timed(function, repeat=1):
+    best = None
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    cache_dir = tempfile.mkdtemp(prefix="echolocator-bench-")
+    try:
+        print(f"{'map':<26}{'uncached ms':>13}{'cold ms':>10}{'warm ms':>10}")
+        for path in MAPS:
+            def uncached():
+                HierarchicalPlanner(WallGrid.from_tmx(path, MAPSCALE))
+
+            def cached(rebuild):
+                baked = load_map(path, MAPSCALE, cache_dir, rebuild=rebuild)
+                baked.planner(baked.grid())
+
+            uncached_ms = timed(uncached)
+            cold_ms = timed(lambda: cached(True))
+            warm_ms = timed(lambda: cached(False), repeat=3)
+            print(f"{path.split('/')[-1]:<26}{uncached_ms:>13.1f}{cold_ms:>10.1f}{warm_ms:>10.1f}")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
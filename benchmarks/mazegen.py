@@ -0,0 +1,55 @@
+# Procedural maze chunk throughput: generated inline vs on the worker pool,
+# plus the most time the frame loop spent in request()/poll() per frame.
+# Run from the repo root: python -m benchmarks.mazegen
+import os
+import sys
+import time
+
+import numpy as np
+
+from mazegen import ChunkGenerator, generate_chunk
+
+SEED = 1234
+FRAME = 1 / 60
+
+
+def keys(count):
+    side = int(np.ceil(np.sqrt(count)))
+    return [(cx - side // 2, cy - side // 2) for cy in range(side) for cx in range(side)][:count]
+
+
+def run_pool(workers, wanted):
+    # Feed the pool like a game would: ask for chunks and poll once per frame
+    with ChunkGenerator(SEED, workers=workers, max_ready=len(wanted)) as generator:
+        worst = 0
+        begin = time.perf_counter()
+        for key in wanted:
+            generator.request(*key)
+        while generator.pending:
+            frame = time.perf_counter()
+            generator.poll()
+            worst = max(worst, time.perf_counter() - frame)
+            time.sleep(FRAME / 4)
+        elapsed = time.perf_counter() - begin
+        # Same seed, same chunk, whichever process made it
+        for key in wanted[:8]:
+            if not np.array_equal(generator.get(*key).tiles, generate_chunk(SEED, *key).tiles):
+                raise AssertionError(f"chunk {key} differs between the pool and inline generation")
+    return elapsed, worst
+
+
+def main(count=96):
+    wanted = keys(count)
+    begin = time.perf_counter()
+    for key in wanted:
+        generate_chunk(SEED, *key)
+    inline = time.perf_counter() - begin
+    print(f"{'mode':<14}{'chunks/s':>10}{'worst frame ms':>16}")
+    print(f"{'inline':<14}{count / inline:>10.1f}{inline / count * 1000:>16.2f}")
+    for workers in sorted({1, 2, os.cpu_count() or 1}):
+        elapsed, worst = run_pool(workers, wanted)
+        print(f"{f'{workers} workers':<14}{count / elapsed:>10.1f}{worst * 1000:>16.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 96)
@@ -0,0 +1,68 @@
+# Moving N agents one tick against the walls: one GridPhysicsEngine per agent
+# vs a single batched MovementResolver pass, on a small and a large map.
+# Run from the repo root: python -m benchmarks.movement
+import random
+import sys
+import time
+
+from enemies import ENEMY_SIZE, ENEMY_SPEED
+from mapcache import load_map
+from movement import MovementResolver
+from simulation import Body
+from wallgrid import GridPhysicsEngine
+
+MAPS = ["map_files/Maze2mid.tmx", "map_files/Maze_1.tmx"]
+MAPSCALE = 1.9
+COUNTS = [10, 100, 1000, 10000]
+
+
+def spawn(grid, count, rng):
+    cols, rows = grid.free_cells()
+    bodies = []
+    while len(bodies) < count:
+        index = rng.randrange(len(cols))
+        body = Body(*grid.cell_center(int(cols[index]), int(rows[index])), *ENEMY_SIZE)
+        if not grid.hit_sprite(body):
+            bodies.append(body)
+    return bodies
+
+
+def jiggle(bodies, twins, rng):
+    # Same random patrol step for an agent and its twin
+    for body, twin in zip(bodies, twins):
+        body.change_x = twin.change_x = rng.choice([-1, 0, 1]) * ENEMY_SPEED
+        body.change_y = twin.change_y = rng.choice([-1, 0, 1]) * ENEMY_SPEED
+
+
+def main(ticks=20):
+    print(f"{'map':<16}{'agents':>8}{'engines ms':>12}{'resolver ms':>13}{'speedup':>10}")
+    for path in MAPS:
+        grid = load_map(path, MAPSCALE).grid()
+        resolver = MovementResolver(grid)
+        for count in COUNTS:
+            # Two identical crowds, one for each way of moving them
+            bodies = spawn(grid, count, random.Random(0))
+            twins = spawn(grid, count, random.Random(0))
+            engines = [GridPhysicsEngine(body, grid) for body in twins]
+            rng = random.Random(1)
+            engine_time = resolver_time = 0
+            for _ in range(ticks):
+                jiggle(bodies, twins, rng)
+                begin = time.perf_counter()
+                for engine in engines:
+                    engine.update()
+                engine_time += time.perf_counter() - begin
+                begin = time.perf_counter()
+                resolver.move_bodies(bodies)
+                resolver_time += time.perf_counter() - begin
+            if any(abs(a.center_x - b.center_x) > 1e-6 or abs(a.center_y - b.center_y) > 1e-6
+                   for a, b in zip(bodies, twins)):
+                raise AssertionError("resolver and GridPhysicsEngine disagree")
+            engine_ms = engine_time * 1000 / ticks
+            resolver_ms = resolver_time * 1000 / ticks
+            print(f"{path.split('/')[-1]:<16}{count:>8}{engine_ms:>12.3f}{resolver_ms:>13.3f}"
+                  f"{engine_ms / resolver_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,55 @@
+# Per-edit cost of moving walls on the shared navigation grid, and the cost of
+# repairing an enemy path that crosses the edited cell.
+# Run from the repo root: python -m benchmarks.navedits
+import random
+import sys
+
+from wallgrid import WallGrid
+from pathfinding import HierarchicalPlanner
+from pathscheduler import PathScheduler
+from flowfield import FlowField
+
+MAPS = ["map_files/Maze2mid.tmx", "map_files/Maze_1.tmx"]
+MAPSCALE = 1.9
+
+
+def main(edits=200):
+    print(f"{'map':<16}{'edits':>7}{'edit mean ms':>14}{'edit max ms':>13}{'repairs':>9}{'repair mean ms':>16}")
+    for path in MAPS:
+        grid = WallGrid.from_tmx(path, MAPSCALE)
+        planner = HierarchicalPlanner(grid)
+        scheduler = PathScheduler(planner, budget_ms=1000)
+        FlowField(grid)
+        rng = random.Random(0)
+        cols, rows = grid.free_cells()
+        costs = []
+        repair_costs = []
+        for _ in range(edits):
+            start_index = rng.randrange(len(cols))
+            goal_index = rng.randrange(len(cols))
+            start = (int(cols[start_index]), int(rows[start_index]))
+            goal = (int(cols[goal_index]), int(rows[goal_index]))
+            scheduler.request("enemy", start, goal)
+            scheduler.run()
+            cells = scheduler.paths["enemy"][2]
+            if not cells or len(cells) < 3:
+                continue
+            # Drop a wall in the middle of the current path, then ask again
+            col, row = cells[len(cells) // 2]
+            grid.set_wall(col, row, True)
+            costs.append(grid.last_edit_ms)
+            repairs = scheduler.repairs
+            scheduler.request("enemy", start, goal)
+            if scheduler.repairs > repairs:
+                repair_costs.append(scheduler.last_repair_ms)
+            grid.set_wall(col, row, False)
+            costs.append(grid.last_edit_ms)
+        if not costs:
+            continue
+        repair_mean = sum(repair_costs) / len(repair_costs) if repair_costs else 0.0
+        print(f"{path.split('/')[-1]:<16}{len(costs):>7}{sum(costs) / len(costs):>14.3f}{max(costs):>13.3f}"
+              f"{len(repair_costs):>9}{repair_mean:>16.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,88 @@
+# Echo dots in the pooled engine at 1k to 50k live particles: a steady
+# stream of waves from random open cells, emitted at the rate that holds the
+# live count level. Reports update and emit cost, how often the pools had to
+# reallocate and the temporary NumPy memory an update churns through.
+# Run from the repo root: python -m benchmarks.particles
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from distancefield import DistanceField
+from echoengine import EchoEngine
+from mapcache import load_map
+
+MAP = "map_files/Maze_1.tmx"
+MAPSCALE = 1.9
+LIVE_COUNTS = [1000, 10000, 50000]
+WAVE_DOTS = 20
+WAVE_RANGE = 600
+SPEED = 6
+STEP = 0.5
+
+
+def run(grid, field, target, updates, rng, cols, rows):
+    engine = EchoEngine(grid, field=field)
+    lifetime = WAVE_RANGE / (SPEED * STEP)
+    per_update = target / WAVE_DOTS / lifetime
+    owed = 0.0
+
+    def emit():
+        nonlocal owed
+        owed += per_update
+        begin = time.perf_counter()
+        emitted = 0
+        while owed >= 1:
+            index = rng.randrange(len(cols))
+            x, y = grid.cell_center(int(cols[index]), int(rows[index]))
+            engine.emit(x, y, speed=SPEED, max_range=WAVE_RANGE, step=STEP)
+            owed -= 1
+            emitted += 1
+        return time.perf_counter() - begin, emitted
+
+    # Fill up to the steady state first
+    for _ in range(int(lifetime) + 1):
+        emit()
+        engine.update()
+    grows = engine.dots.grows
+    update_ms = []
+    emit_seconds = 0.0
+    emitted = 0
+    live = []
+    temp_kb = []
+    tracemalloc.start()
+    for _ in range(updates):
+        seconds, count = emit()
+        emit_seconds += seconds
+        emitted += count
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        begin = time.perf_counter()
+        engine.update()
+        update_ms.append((time.perf_counter() - begin) * 1000)
+        temp_kb.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+        live.append(len(engine.dots))
+    tracemalloc.stop()
+    return (np.mean(live), np.array(update_ms), emit_seconds / max(emitted, 1) * 1e6,
+            engine.dots.grows - grows, engine.dots.capacity, np.mean(temp_kb))
+
+
+def main(updates=200):
+    grid = load_map(MAP, MAPSCALE).grid()
+    field = DistanceField(grid)
+    cols, rows = grid.free_cells()
+    print(f"{'mode':<8}{'target':>8}{'live':>8}{'update p50 ms':>15}{'update p99 ms':>15}{'ns/dot':>8}"
+          f"{'emit us':>9}{'reallocs':>10}{'capacity':>10}{'temp KB':>9}")
+    for mode, mode_field in (("march", None), ("traced", field)):
+        for target in LIVE_COUNTS:
+            live, update_ms, emit_us, grows, capacity, temp_kb = run(
+                grid, mode_field, target, updates, random.Random(0), cols, rows)
+            print(f"{mode:<8}{target:>8}{live:>8.0f}{np.percentile(update_ms, 50):>15.2f}"
+                  f"{np.percentile(update_ms, 99):>15.2f}{np.median(update_ms) / live * 1e6:>8.0f}"
+                  f"{emit_us:>9.0f}{grows:>10}{capacity:>10}{temp_kb:>9.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,51 @@
+# Query time of the hierarchical planner against full-grid A* on the shipped maps.
+# Run from the repo root: python -m benchmarks.pathfinding
+import random
+import sys
+import time
+
+from wallgrid import WallGrid
+from pathfinding import GridSearch, HierarchicalPlanner
+
+MAPS = ["map_files/testingenemyaimap.tmx", "map_files/Maze2mid.tmx", "map_files/Maze_1.tmx"]
+MAPSCALE = 1.9
+
+
+def random_pairs(grid, count, seed=0):
+    rng = random.Random(seed)
+    cols, rows = grid.free_cells()
+    pairs = []
+    for _ in range(count):
+        a = rng.randrange(len(cols))
+        b = rng.randrange(len(cols))
+        pairs.append(((int(cols[a]), int(rows[a])), (int(cols[b]), int(rows[b]))))
+    return pairs
+
+
+def time_queries(find_path, pairs):
+    times = []
+    for start, goal in pairs:
+        begin = time.perf_counter()
+        find_path(start, goal)
+        times.append(time.perf_counter() - begin)
+    times.sort()
+    return sum(times) / len(times), times[len(times) // 2], times[-1]
+
+
+def main(queries=30):
+    print(f"{'map':<28}{'build ms':>10}{'nodes':>8}{'A* mean':>10}{'A* max':>10}{'HPA mean':>10}{'HPA max':>10}{'speedup':>9}")
+    for path in MAPS:
+        grid = WallGrid.from_tmx(path, MAPSCALE)
+        begin = time.perf_counter()
+        planner = HierarchicalPlanner(grid)
+        build = time.perf_counter() - begin
+        pairs = random_pairs(grid, queries)
+        astar_mean, _, astar_max = time_queries(GridSearch(grid).astar, pairs)
+        hpa_mean, _, hpa_max = time_queries(planner.find_path, pairs)
+        print(f"{path.split('/')[-1]:<28}{build * 1000:>10.1f}{len(planner.nodes):>8}"
+              f"{astar_mean * 1000:>10.2f}{astar_max * 1000:>10.2f}{hpa_mean * 1000:>10.2f}{hpa_max * 1000:>10.2f}"
+              f"{astar_mean / hpa_mean:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30)
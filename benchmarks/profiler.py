@@ -0,0 +1,96 @@
+# Cost of the frame profiler itself: per-stage overhead of `with
+# profiler.stage()` when disabled and enabled, and simulation tick time with
+# no profiler, a disabled one and an enabled one attached.
+# Run from the repo root: python -m benchmarks.profiler
+import sys
+import time
+
+from mapcache import load_map
+from simulation import Simulation, Controls
+from profiler import FrameProfiler
+
+MAP = "map_files/Maze2mid.tmx"
+MAPSCALE = 1.9
+ENEMIES = 10
+REPEATS = 7
+
+
+def stage_cost(profiler, iterations):
+    # ns per stage, minus the bare loop
+    stage = profiler.stage
+    best = None
+    for _ in range(REPEATS):
+        profiler.begin_frame()
+        begin = time.perf_counter()
+        for _ in range(iterations):
+            with stage("stage"):
+                pass
+        elapsed = time.perf_counter() - begin
+        profiler.end_frame()
+        best = elapsed if best is None else min(best, elapsed)
+    begin = time.perf_counter()
+    for _ in range(iterations):
+        pass
+    bare = time.perf_counter() - begin
+    return (best - bare) / iterations * 1e9
+
+
+def frame_cost(profiler, frames, stages=8):
+    # µs of profiler bookkeeping for a frame with this many empty stages
+    names = [f"stage{i}" for i in range(stages)]
+    best = None
+    for _ in range(REPEATS):
+        begin = time.perf_counter()
+        for _ in range(frames):
+            profiler.begin_frame()
+            for name in names:
+                with profiler.stage(name):
+                    pass
+            profiler.end_frame()
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return best / frames * 1e6
+
+
+def tick_costs(profilers, ticks):
+    # Best µs per tick for each profiler (None = not attached). Runs are
+    # interleaved so machine noise hits every configuration alike.
+    baked = load_map(MAP, MAPSCALE)
+    best = {name: None for name in profilers}
+    for _ in range(REPEATS):
+        for name, profiler in profilers.items():
+            grid = baked.grid()
+            cols, rows = grid.free_cells()
+            start = grid.cell_center(int(cols[0]), int(rows[0]))
+            sim = Simulation(grid, enemy_count=ENEMIES, seed=0, player_start=start)
+            sim.profiler = profiler
+            controls = Controls(move=1, aim_x=grid.width / 2, aim_y=grid.height / 2)
+            begin = time.perf_counter()
+            for _ in range(ticks):
+                if profiler is not None:
+                    profiler.begin_frame()
+                sim.step(controls)
+                if profiler is not None:
+                    profiler.end_frame()
+            elapsed = (time.perf_counter() - begin) / ticks * 1e6
+            best[name] = elapsed if best[name] is None else min(best[name], elapsed)
+    return best
+
+
+def main(ticks=2000):
+    print(f"{'':<22}{'disabled':>10}{'enabled':>10}")
+    print(f"{'ns per stage':<22}{stage_cost(FrameProfiler(enabled=False), 200000):>10.1f}"
+          f"{stage_cost(FrameProfiler(), 200000):>10.1f}")
+    print(f"{'µs per 8-stage frame':<22}{frame_cost(FrameProfiler(enabled=False), 20000):>10.2f}"
+          f"{frame_cost(FrameProfiler(), 20000):>10.2f}")
+
+    label = f"{MAP.split('/')[-1]}, {ENEMIES} enemies"
+    print(f"\n{label:<22}{'µs/tick':>10}{'overhead':>10}")
+    costs = tick_costs({"no profiler": None, "disabled": FrameProfiler(enabled=False),
+                        "enabled": FrameProfiler()}, ticks)
+    bare = costs["no profiler"]
+    for name, cost in costs.items():
+        print(f"{name:<22}{cost:>10.1f}{(cost - bare) / bare:>10.1%}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,178 @@
+# Scripted headless play on every shipped map with 1 to 1000 enemies,
+# reporting p50/p99 tick time overall and per simulation stage. Results can
+# be written as JSON and checked against a stored baseline; the run exits
+# with status 1 when a gated metric regresses past the threshold: tick p50
+# and p99, and each stage's p50 (a stage's p99 over a few hundred ticks is
+# too noisy to gate, so it is only reported). Each scenario is run several
+# times and the percentiles are taken over the ticks of every run together.
+# Run from the repo root: python -m benchmarks.scenarios
+#   --output results.json               write this run's results
+#   --baseline benchmarks/baseline.json compare against a stored run
+#   --save-baseline                     store this run as the new baseline
+import argparse
+import json
+import platform
+import random
+import sys
+
+from mapcache import load_map
+from simulation import Simulation, Controls, STAGES
+from profiler import FrameProfiler
+
+MAPS = ["map_files/testingenemyaimap.tmx", "map_files/Maze2mid.tmx", "map_files/Maze_1.tmx"]
+ENEMY_COUNTS = [1, 10, 100, 1000]
+MAPSCALE = 1.9
+BASELINE = "benchmarks/baseline.json"
+WARMUP_TICKS = 10
+SEED = 0
+REPEATS = 3
+
+
+def script(sim, rng, ticks):
+    # Controls for every tick: run at a new random open cell every couple of
+    # seconds, walk now and then, stop briefly and shout whenever allowed
+    cols, rows = sim.grid.free_cells()
+    controls = Controls(move=1)
+    for tick in range(ticks):
+        if tick % 120 == 0:
+            index = rng.randrange(len(cols))
+            controls.aim_x, controls.aim_y = sim.grid.cell_center(int(cols[index]), int(rows[index]))
+        controls.walk = tick % 240 >= 180
+        controls.move = 0 if tick % 300 >= 280 else 1
+        controls.shout = tick % 600 == 0
+        yield controls
+
+
+def run_scenario(baked, enemies, ticks, seed, repeats=1):
+    # Every tick after the warmup is one profiler frame, pooled over the repeats
+    profiler = FrameProfiler(window=ticks * repeats)
+    for _ in range(repeats):
+        rng = random.Random(seed)
+        grid = baked.grid()
+        cols, rows = grid.free_cells()
+        index = rng.randrange(len(cols))
+        start = grid.cell_center(int(cols[index]), int(rows[index]))
+        sim = Simulation(grid, enemy_count=enemies, seed=seed, player_start=start,
+                         tiles=baked.wall_tiles())
+        sim.profiler = profiler
+        for tick, controls in enumerate(script(sim, rng, ticks + WARMUP_TICKS)):
+            if tick < WARMUP_TICKS:
+                sim.step(controls)
+                continue
+            profiler.begin_frame()
+            sim.step(controls)
+            profiler.end_frame()
+    summary = profiler.summary()
+    return {
+        "map": baked.meta["source"],
+        "enemies": enemies,
+        "ticks": ticks,
+        "tick": {"p50": summary["frame"]["p50"], "p99": summary["frame"]["p99"]},
+        "stages": {name: {"p50": summary[name]["p50"], "p99": summary[name]["p99"]} for name in STAGES},
+    }
+
+
+def run(maps, enemy_counts, ticks, seed, repeats=REPEATS):
+    results = {
+        "meta": {"ticks": ticks, "seed": seed, "repeats": repeats, "python": platform.python_version(),
+                 "machine": platform.machine(), "platform": platform.platform()},
+        "scenarios": {},
+    }
+    for path in maps:
+        baked = load_map(path, MAPSCALE)
+        open_cells = len(baked.grid().free_cells()[0])
+        for enemies in enemy_counts:
+            # More enemies than open cells would only measure them piling up
+            if enemies > open_cells:
+                continue
+            name = f"{path.split('/')[-1][:-4]}/{enemies}"
+            results["scenarios"][name] = run_scenario(baked, enemies, ticks, seed, repeats)
+    return results
+
+
+def metrics(scenario):
+    # The gated metrics: (name, {percentile: ms})
+    yield "tick", scenario["tick"]
+    for name, values in scenario["stages"].items():
+        yield name, {"p50": values["p50"]}
+
+
+def compare(results, baseline, threshold, min_ms, min_p99_ms):
+    # (scenario, metric, percentile, baseline ms, current ms) for every metric
+    # that got slower by more than threshold (fraction) and more than min_ms
+    # (min_p99_ms for p99s, which hang on a handful of ticks)
+    regressions = []
+    for name, scenario in results["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            continue
+        old_metrics = dict(metrics(old))
+        for metric, values in metrics(scenario):
+            if metric not in old_metrics:
+                continue
+            for percentile, current in values.items():
+                before = old_metrics[metric][percentile]
+                floor = min_p99_ms if percentile == "p99" else min_ms
+                if current > before * (1 + threshold) and current - before > floor:
+                    regressions.append((name, metric, percentile, before, current))
+    return regressions
+
+
+def report(results):
+    header = f"{'scenario':<26}{'tick p50':>10}{'tick p99':>10}"
+    header += "".join(f"{name + ' p99':>16}" for name in STAGES)
+    print(header)
+    for name, scenario in results["scenarios"].items():
+        line = f"{name:<26}{scenario['tick']['p50']:>10.3f}{scenario['tick']['p99']:>10.3f}"
+        line += "".join(f"{scenario['stages'][stage]['p99']:>16.3f}" for stage in STAGES)
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scripted headless play with per-stage tick timings")
+    parser.add_argument("--maps", nargs="+", default=MAPS)
+    parser.add_argument("--enemies", nargs="+", type=int, default=ENEMY_COUNTS)
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--repeats", type=int, default=REPEATS,
+                        help=f"runs per scenario, pooled before taking percentiles (default {REPEATS})")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", default=BASELINE, help="results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown as a fraction of the baseline (default 0.25)")
+    parser.add_argument("--min-ms", type=float, default=0.5,
+                        help="ignore slowdowns smaller than this many ms (default 0.5)")
+    parser.add_argument("--min-p99-ms", type=float, default=2.0,
+                        help="the same for tick p99 (default 2.0)")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    args = parser.parse_args(argv)
+
+    results = run(args.maps, args.enemies, args.ticks, args.seed, args.repeats)
+    report(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=1)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}, skipping the regression check")
+        return 0
+    regressions = compare(results, baseline, args.threshold, args.min_ms, args.min_p99_ms)
+    for name, metric, percentile, before, current in regressions:
+        print(f"REGRESSION {name} {metric} {percentile}: {before:.3f} ms -> {current:.3f} ms")
+    if regressions:
+        return 1
+    print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%}, "
+          f"min {args.min_ms} ms, p99 {args.min_p99_ms} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
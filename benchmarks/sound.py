@@ -0,0 +1,40 @@
+# Cost of building a wall-attenuated sound field from a fresh source cell at
+# different propagation radii, and of looking loudness up in a cached one.
+# Run from the repo root: python -m benchmarks.sound
+import random
+import sys
+import time
+
+from mapcache import load_map
+from sound import SoundField
+
+MAPS = ["map_files/Maze2mid.tmx", "map_files/Maze_1.tmx"]
+MAPSCALE = 1.9
+RADII = [8, 16, 40]
+
+
+def main(sources=20):
+    print(f"{'map':<16}{'radius':>8}{'build mean ms':>15}{'build max ms':>14}{'lookup ns':>11}")
+    for path in MAPS:
+        grid = load_map(path, MAPSCALE).grid()
+        cols, rows = grid.free_cells()
+        for radius in RADII:
+            sound = SoundField(grid, radius=radius, cache_size=sources)
+            rng = random.Random(0)
+            cells = [(int(cols[i]), int(rows[i])) for i in (rng.randrange(len(cols)) for _ in range(sources))]
+            builds = []
+            for cell in cells:
+                sound.field(*cell)
+                builds.append(sound.last_compute_ms)
+            lookups = [(cell, cell[0] + rng.randint(-radius, radius), cell[1] + rng.randint(-radius, radius))
+                       for cell in cells for _ in range(100)]
+            begin = time.perf_counter()
+            for source, col, row in lookups:
+                sound.loudness(source, radius, col, row)
+            lookup_ns = (time.perf_counter() - begin) / len(lookups) * 1e9
+            print(f"{path.split('/')[-1]:<16}{radius:>8}{sum(builds) / len(builds):>15.2f}{max(builds):>14.2f}"
+                  f"{lookup_ns:>11.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,92 @@
+# Per-frame cost of the agent proximity queries the simulation makes -
+# noise detection around the player, enemy separation pairs, the enemies on
+# screen and the nearest few to the player - brute force over every enemy
+# vs the agent spatial hash (including keeping it in step as everyone
+# moves), at growing enemy counts. Both must give the same answers.
+# Run from the repo root: python -m benchmarks.spatialhash
+import random
+import sys
+import time
+
+import numpy as np
+
+from enemies import AGENT_CELL_SIZE, SEPARATION_RADIUS
+from mapcache import load_map
+from spatialhash import SpatialHash
+
+MAP = "map_files/Maze2mid.tmx"
+MAPSCALE = 1.9
+COUNTS = [10, 100, 1000]
+DETECT_RADIUS = 17 * 60.8  # Running footsteps: RUN_LOUDNESS + 1 cells
+VIEW = (1280, 720)
+NEAREST = 5
+
+
+def brute_frame(player, x, y):
+    px, py = player
+    distance = (x - px) ** 2 + (y - py) ** 2
+    heard = np.flatnonzero(distance <= DETECT_RADIUS ** 2)
+    near = (x[:, None] - x) ** 2 + (y[:, None] - y) ** 2 <= SEPARATION_RADIUS ** 2
+    np.fill_diagonal(near, False)
+    pairs = int(near.sum())
+    left, bottom = px - VIEW[0] / 2, py - VIEW[1] / 2
+    shown = np.flatnonzero((x >= left) & (x <= left + VIEW[0]) & (y >= bottom) & (y <= bottom + VIEW[1]))
+    nearest = np.argsort(distance, kind="stable")[:NEAREST]
+    return heard.tolist(), pairs, shown.tolist(), distance[nearest].tolist()
+
+
+def hash_frame(player, x, y, index):
+    px, py = player
+    index.move(slice(0, len(x)), x, y)
+    heard = np.sort(index.query_radius(px, py, DETECT_RADIUS))
+    pairs = len(index.pairs(SEPARATION_RADIUS)[0])
+    left, bottom = px - VIEW[0] / 2, py - VIEW[1] / 2
+    shown = np.sort(index.query_aabb(left, bottom, left + VIEW[0], bottom + VIEW[1]))
+    nearest = index.nearest(px, py, NEAREST)
+    return heard.tolist(), pairs, shown.tolist(), ((x[nearest] - px) ** 2 + (y[nearest] - py) ** 2).tolist()
+
+
+def main(frames=50):
+    grid = load_map(MAP, MAPSCALE).grid()
+    cols, rows = grid.free_cells()
+    print(f"{'enemies':>8}{'brute ms':>12}{'hash ms':>11}{'speedup':>10}")
+    for count in COUNTS:
+        rng = random.Random(0)
+        starts = [grid.cell_center(int(cols[i]), int(rows[i])) for i in
+                  (rng.randrange(len(cols)) for _ in range(count))]
+        start_x = np.array([x for x, _ in starts])
+        start_y = np.array([y for _, y in starts])
+        player = (float(np.median(start_x)), float(np.median(start_y)))
+        index = SpatialHash(AGENT_CELL_SIZE, count)
+        for x, y in starts:
+            index.insert(x, y)
+
+        timings = {}
+        for name in ("brute", "hash"):
+            # Both runs replay the same movement so their answers must match
+            motion = np.random.default_rng(1)
+            x = start_x.copy()
+            y = start_y.copy()
+            answers = []
+            elapsed = 0.0
+            for _ in range(frames):
+                # Everyone shuffles a little each frame, like enemies on patrol
+                x += motion.uniform(-3, 3, count)
+                y += motion.uniform(-3, 3, count)
+                begin = time.perf_counter()
+                if name == "brute":
+                    answers.append(brute_frame(player, x, y))
+                else:
+                    answers.append(hash_frame(player, x, y, index))
+                elapsed += time.perf_counter() - begin
+            timings[name] = elapsed * 1000 / frames
+            if name == "brute":
+                expected = answers
+            elif answers != expected:
+                raise AssertionError("hash and brute force found different agents")
+        print(f"{count:>8}{timings['brute']:>12.3f}{timings['hash']:>11.3f}"
+              f"{timings['brute'] / timings['hash']:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
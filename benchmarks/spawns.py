@@ -0,0 +1,86 @@
+# Enemy spawn placement on the shipped maps: rejection sampling (random map
+# coordinates until the box misses every wall) against the reachability
+# index. Reports the cost per spawn, how many retries sampling needed, and
+# how many spawns landed where the player cannot be reached or within
+# SPAWN_MIN_STEPS of them.
+# Run from the repo root: python -m benchmarks.spawns
+import random
+import sys
+import time
+
+import numpy as np
+
+from enemies import ENEMY_SIZE
+from flowfield import FlowField, UNREACHED
+from mapcache import load_map
+from simulation import SPAWN_MIN_STEPS
+from spawns import SpawnIndex
+
+MAPS = ["map_files/testingenemyaimap.tmx", "map_files/Maze2mid.tmx", "map_files/Maze_1.tmx"]
+MAPSCALE = 1.9
+PLAYERS = 5  # Player positions tried per map
+
+
+def sample(grid, rng):
+    # Old placement; returns (x, y, retries)
+    half_w = ENEMY_SIZE[0] / 2
+    half_h = ENEMY_SIZE[1] / 2
+    retries = 0
+    while True:
+        x = rng.randint(0, int(grid.width))
+        y = rng.randint(0, int(grid.height))
+        if not grid.hit_aabb(x - half_w, y - half_h, x + half_w, y + half_h):
+            return x, y, retries
+        retries += 1
+
+
+def bad(grid, flowfield, positions):
+    # Spawns the player can't be reached from, and ones too close to them
+    cols = np.array([grid.cell_at(x, y)[0] for x, y in positions])
+    rows = np.array([grid.cell_at(x, y)[1] for x, y in positions])
+    inside = (cols >= 0) & (cols < grid.cols) & (rows >= 0) & (rows < grid.rows)
+    steps = np.full(len(positions), UNREACHED)
+    steps[inside] = flowfield.dist[rows[inside], cols[inside]]
+    return np.mean(steps == UNREACHED), np.mean((steps != UNREACHED) & (steps < SPAWN_MIN_STEPS))
+
+
+def main(spawns=1000):
+    print(f"{'map':<24}{'build ms':>10}{'sample us':>11}{'retries':>9}{'max':>6}{'unreachable':>13}{'too near':>10}"
+          f"{'index us':>10}{'first ms':>10}{'unreachable':>13}{'too near':>10}")
+    for path in MAPS:
+        grid = load_map(path, MAPSCALE).grid()
+        flowfield = FlowField(grid)
+        index = SpawnIndex(grid, ENEMY_SIZE, flowfield)
+        build_ms = index.stats()["last_build_ms"]
+        rng = random.Random(0)
+        cols, rows = grid.free_cells()
+        results = []
+        for _ in range(PLAYERS):
+            at = rng.randrange(len(cols))
+            source = int(cols[at]), int(rows[at])
+            flowfield.update(source)
+
+            begin = time.perf_counter()
+            sampled = [sample(grid, rng) for _ in range(spawns)]
+            sample_us = (time.perf_counter() - begin) / spawns * 1e6
+            retries = [retry for _, _, retry in sampled]
+
+            begin = time.perf_counter()
+            index.pick(rng, source, SPAWN_MIN_STEPS)
+            first_ms = (time.perf_counter() - begin) * 1000
+            begin = time.perf_counter()
+            picked = [index.pick(rng, source, SPAWN_MIN_STEPS) for _ in range(spawns)]
+            index_us = (time.perf_counter() - begin) / spawns * 1e6
+            picked = [position for position in picked if position is not None]
+            results.append((sample_us, np.mean(retries), max(retries),
+                            *bad(grid, flowfield, [(x, y) for x, y, _ in sampled]),
+                            index_us, first_ms, *(bad(grid, flowfield, picked) if picked else (0, 0))))
+        sample_us, retries, most, unreachable, near, index_us, first_ms, index_unreachable, index_near = \
+            np.array(results).T
+        print(f"{path.split('/')[-1]:<24}{build_ms:>10.1f}{sample_us.mean():>11.1f}{retries.mean():>9.1f}"
+              f"{most.max():>6.0f}{unreachable.mean():>13.1%}{near.mean():>10.1%}{index_us.mean():>10.1f}"
+              f"{first_ms.mean():>10.2f}{index_unreachable.mean():>13.1%}{index_near.mean():>10.1%}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
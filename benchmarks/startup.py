@@ -0,0 +1,91 @@
+# Time from launch to a playable simulation, with the map, nav bake and
+# Simulation built inline after the click (the old start) against the
+# preloader started at launch. Each run is a fresh process so imports are
+# paid for; the menu is stood in for by 60 Hz frames for a given dwell before
+# the click. Reports how long the click then waited and the longest frame
+# the menu saw while loading ran on the worker. Textures need arcade and a
+# window, so they are not included here.
+# Run from the repo root: python -m benchmarks.startup
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+STARTED = time.perf_counter()
+
+MAPS = ["map_files/testingenemyaimap.tmx", "map_files/Maze2mid.tmx", "map_files/Maze_1.tmx"]
+MAPSCALE = 1.9
+ENEMY_COUNT = 5
+DWELLS_MS = [0, 250, 500, 1000]  # Time on the menu before the click
+FRAME = 1 / 60
+
+
+def child(path, cache_dir, mode, dwell_ms):
+    from startup import Preloader, load_world
+    player_start = (100 * MAPSCALE, 100 * MAPSCALE)
+    preloader = None
+    if mode == "preload":
+        preloader = Preloader()
+        preloader.submit("world", load_world, path, MAPSCALE, ENEMY_COUNT, player_start, 0, cache_dir)
+    # The menu: one frame every 1/60 s until the click
+    longest = 0.0
+    last = time.perf_counter()
+    while (time.perf_counter() - STARTED) * 1000 < dwell_ms:
+        time.sleep(FRAME)
+        now = time.perf_counter()
+        longest = max(longest, now - last)
+        last = now
+    click = time.perf_counter()
+    if preloader is not None:
+        preloader.take("world")
+        preloader.close()
+    else:
+        load_world(path, MAPSCALE, ENEMY_COUNT, player_start, 0, cache_dir)
+    done = time.perf_counter()
+    print(json.dumps({"waited_ms": (done - click) * 1000, "playable_ms": (done - STARTED) * 1000,
+                      "longest_frame_ms": longest * 1000}))
+
+
+def run(path, cache_dir, mode, dwell_ms):
+    output = subprocess.run([sys.executable, "-m", "benchmarks.startup", "--child", path, cache_dir, mode,
+                             str(dwell_ms)], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Click-to-playable wait, inline loading vs the preloader")
+    parser.add_argument("--child", nargs=4, metavar=("MAP", "CACHE", "MODE", "DWELL"), help=argparse.SUPPRESS)
+    parser.add_argument("--maps", nargs="+", default=MAPS)
+    args = parser.parse_args(argv)
+    if args.child:
+        path, cache_dir, mode, dwell_ms = args.child
+        child(path, cache_dir, mode, float(dwell_ms))
+        return
+
+    print(f"{'map':<24}{'cache':>6}{'dwell ms':>10}{'inline wait':>13}{'preload wait':>14}"
+          f"{'playable ms':>13}{'menu frame max':>16}")
+    for path in args.maps:
+        for cache in ("cold", "warm"):
+            cache_dir = tempfile.mkdtemp(prefix="echolocator-bench-")
+            try:
+                if cache == "warm":
+                    run(path, cache_dir, "inline", 0)  # Bake it once up front
+                for dwell_ms in DWELLS_MS:
+                    if cache == "cold":
+                        shutil.rmtree(cache_dir, ignore_errors=True)
+                    inline = run(path, cache_dir, "inline", dwell_ms)
+                    if cache == "cold":
+                        shutil.rmtree(cache_dir, ignore_errors=True)
+                    preload = run(path, cache_dir, "preload", dwell_ms)
+                    print(f"{path.split('/')[-1]:<24}{cache:>6}{dwell_ms:>10}{inline['waited_ms']:>13.1f}"
+                          f"{preload['waited_ms']:>14.1f}{preload['playable_ms']:>13.1f}"
+                          f"{preload['longest_frame_ms']:>16.1f}")
+            finally:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
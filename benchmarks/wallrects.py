@@ -0,0 +1,101 @@
+# Wall tiles versus greedy-meshed wall rectangles on the shipped maps:
+# primitive counts, rotated-box collision and ray casts against the
+# per-cell grid versions, and the cost of re-meshing after a wall edit.
+# Run from the repo root: python -m benchmarks.wallrects
+import math
+import random
+import sys
+import time
+
+import numpy as np
+
+from mapcache import load_map
+from wallrects import WallRects
+
+MAPS = ["map_files/Maze2mid.tmx", "map_files/Maze_1.tmx"]
+MAPSCALE = 1.9
+BOX = (108, 88.5)  # Enemy size
+RAY_RANGE = 600
+WAVE_DOTS = 20  # Rays per echo wave
+
+
+def grid_raycast(grid, x, y, dir_x, dir_y, max_dist):
+    # Cell by cell DDA, as the echo engine marches a single ray
+    size = grid.cell_size
+    col, row = grid.cell_at(x, y)
+    if grid.is_wall(col, row):
+        return 0.0
+    step_x = 1 if dir_x >= 0 else -1
+    step_y = 1 if dir_y >= 0 else -1
+    t_max_x = ((col + (step_x > 0)) * size - x) / dir_x if dir_x else math.inf
+    t_max_y = ((row + (step_y > 0)) * size - y) / dir_y if dir_y else math.inf
+    t_delta_x = abs(size / dir_x) if dir_x else math.inf
+    t_delta_y = abs(size / dir_y) if dir_y else math.inf
+    while True:
+        if t_max_x < t_max_y:
+            entered = t_max_x
+            col += step_x
+            t_max_x += t_delta_x
+        else:
+            entered = t_max_y
+            row += step_y
+            t_max_y += t_delta_y
+        if entered > max_dist:
+            return math.inf
+        if grid.is_wall(col, row):
+            return entered
+
+
+def time_calls(function, cases):
+    begin = time.perf_counter()
+    results = [function(*case) for case in cases]
+    return (time.perf_counter() - begin) / len(cases) * 1e6, results
+
+
+def main(queries=2000):
+    print(f"{'map':<14}{'tiles':>8}{'rects':>8}{'ratio':>7}{'mesh ms':>9}{'box grid us':>13}{'box rects us':>14}"
+          f"{'wave grid us':>14}{'wave rects us':>15}{'agree':>7}{'edit ms':>9}")
+    for path in MAPS:
+        baked = load_map(path, MAPSCALE)
+        grid = baked.grid()
+        begin = time.perf_counter()
+        rects = WallRects(grid)
+        mesh_ms = (time.perf_counter() - begin) * 1000
+        tiles = int(np.count_nonzero(grid.cells))
+        count = len(rects)  # Before the edits below
+
+        rng = random.Random(0)
+        cols, rows = grid.free_cells()
+        boxes = [(rng.uniform(0, grid.width), rng.uniform(0, grid.height), *BOX, rng.uniform(1, 89))
+                 for _ in range(queries)]
+        # Whole echo waves: a ring of rays from one open cell
+        angles = 2 * np.pi * np.arange(WAVE_DOTS) / WAVE_DOTS
+        waves = []
+        for _ in range(queries // WAVE_DOTS):
+            index = rng.randrange(len(cols))
+            x, y = grid.cell_center(int(cols[index]), int(rows[index]))
+            waves.append((x, y, np.cos(angles), np.sin(angles), RAY_RANGE))
+        box_grid, hits_grid = time_calls(grid.hit_rect, boxes)
+        box_rects, hits_rects = time_calls(rects.hit_rect, boxes)
+        ray_grid, dist_grid = time_calls(
+            lambda x, y, dir_x, dir_y, max_dist: [grid_raycast(grid, x, y, dx, dy, max_dist)
+                                                  for dx, dy in zip(dir_x.tolist(), dir_y.tolist())], waves)
+        ray_rects, dist_rects = time_calls(rects.raycast, waves)
+        agree = sum(a == b for a, b in zip(hits_grid, hits_rects))
+        agree += sum(a == b or abs(a - b) < 1e-6 for wave_grid, wave_rects in zip(dist_grid, dist_rects)
+                     for a, b in zip(wave_grid, wave_rects.tolist()))
+
+        edit_ms = []
+        for _ in range(100):
+            col, row = rng.randrange(grid.cols), rng.randrange(grid.rows)
+            grid.set_wall(col, row, not grid.is_wall(col, row))
+            edit_ms.append(rects.last_remesh_ms)
+        assert np.array_equal(rects.owner >= 0, grid.cells != 0)
+
+        print(f"{path.split('/')[-1]:<14}{tiles:>8}{count:>8}{tiles / count:>6.1f}x{mesh_ms:>9.1f}"
+              f"{box_grid:>13.1f}{box_rects:>14.1f}{ray_grid:>14.1f}{ray_rects:>15.1f}"
+              f"{agree / (queries + len(waves) * WAVE_DOTS):>7.1%}{np.mean(edit_ms):>9.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
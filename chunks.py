@@ -0,0 +1,162 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from wallgrid import GID_MASK
+
+FLIPPED_HORIZONTALLY = 0x80000000
+FLIPPED_VERTICALLY = 0x40000000
+FLIPPED_DIAGONALLY = 0x20000000
+
+
+class ChunkStreamer:
+    # Splits a baked map's tile layers into chunk_size square chunks and only
+    # keeps the ones around the camera resident. Chunks within margin chunks of
+    # the view are loaded; they are only evicted once they drift margin + 1
+    # chunks away (hysteresis), or earlier when more than max_resident are held,
+    # least recently used first. Only chunks overlapping the view are drawn.
+    # build_chunk(streamer, cx, cy) makes whatever is drawn for a chunk; the
+    # default builds an arcade SpriteList, tests can pass a plain function.
+    def __init__(self, baked_map, layers=None, chunk_size=16, margin=1, max_resident=64, build_chunk=None):
+        self.map = baked_map
+        self.layers = list(layers or baked_map.layer_names)
+        self.chunk_size = chunk_size
+        self.margin = margin
+        self.max_resident = max_resident
+        self.build_chunk = build_chunk or build_sprite_chunk
+        self.chunk_world = chunk_size * baked_map.cell_size
+        self.chunks_x = math.ceil(baked_map.cols / chunk_size)
+        self.chunks_y = math.ceil(baked_map.rows / chunk_size)
+        self.resident = OrderedDict()  # (cx, cy) -> (drawable, tile count), least recently used first
+        self.visible = []
+        self._textures = {}
+        # Counters and gauges
+        self.loads = 0
+        self.evictions = 0
+        self.rebuilds = 0
+        self.resident_tiles = 0
+
+    @property
+    def resident_chunks(self):
+        return len(self.resident)
+
+    def chunk_range(self, left, bottom, right, top, margin=0):
+        # Inclusive chunk coordinates covering a world rect, clamped to the map
+        size = self.chunk_world
+        cx0 = max(int(math.floor(left / size)) - margin, 0)
+        cy0 = max(int(math.floor(bottom / size)) - margin, 0)
+        cx1 = min(int(math.floor(right / size)) + margin, self.chunks_x - 1)
+        cy1 = min(int(math.floor(top / size)) + margin, self.chunks_y - 1)
+        return cx0, cy0, cx1, cy1
+
+    def tiles(self, layer, cx, cy):
+        # (cols, rows, gids) of the non-empty tiles of one layer inside a chunk
+        size = self.chunk_size
+        block = self.map.layer(layer)[cy * size:(cy + 1) * size, cx * size:(cx + 1) * size]
+        rows, cols = np.nonzero(block)
+        return cols + cx * size, rows + cy * size, block[rows, cols]
+
+    def update(self, left, bottom, width, height):
+        right = left + width
+        top = bottom + height
+        cx0, cy0, cx1, cy1 = self.chunk_range(left, bottom, right, top, self.margin)
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                key = (cx, cy)
+                if key in self.resident:
+                    self.resident.move_to_end(key)
+                else:
+                    self._load(key)
+
+        kx0, ky0, kx1, ky1 = self.chunk_range(left, bottom, right, top, self.margin + 1)
+        for key in list(self.resident):
+            if not (kx0 <= key[0] <= kx1 and ky0 <= key[1] <= ky1):
+                self._evict(key)
+        # Over the cap: drop the least recently wanted chunks first
+        for key in list(self.resident):
+            if len(self.resident) <= self.max_resident:
+                break
+            if not (cx0 <= key[0] <= cx1 and cy0 <= key[1] <= cy1):
+                self._evict(key)
+
+        vx0, vy0, vx1, vy1 = self.chunk_range(left, bottom, right, top)
+        self.visible = [drawable for (cx, cy), (drawable, _) in self.resident.items()
+                        if vx0 <= cx <= vx1 and vy0 <= cy <= vy1 and drawable is not None]
+
+    def _load(self, key):
+        drawable, count = self.build_chunk(self, *key)
+        self.resident[key] = (drawable, count)
+        self.loads += 1
+        self.resident_tiles += count
+
+    def _evict(self, key):
+        _, count = self.resident.pop(key)
+        self.evictions += 1
+        self.resident_tiles -= count
+
+    def refresh(self, keys):
+        # Rebuild the resident chunks among keys because what they draw has
+        # changed; the rest are built fresh when they load. Call before update().
+        for key in keys:
+            entry = self.resident.get(key)
+            if entry is None:
+                continue
+            drawable, count = self.build_chunk(self, *key)
+            self.resident[key] = (drawable, count)
+            self.resident_tiles += count - entry[1]
+            self.rebuilds += 1
+
+    def draw(self):
+        for drawable in self.visible:
+            drawable.draw()
+
+    def stats(self):
+        return {
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "rebuilds": self.rebuilds,
+            "resident_chunks": self.resident_chunks,
+            "resident_tiles": self.resident_tiles,
+            "visible_chunks": len(self.visible),
+        }
+
+    def texture(self, gid):
+        # arcade Texture for a raw gid (flip flags included), cached per gid
+        texture = self._textures.get(gid)
+        if texture is None:
+            import arcade
+            tile_id = gid & GID_MASK
+            tileset = max((entry for entry in self.map.tilesets if entry["first_gid"] <= tile_id),
+                          key=lambda entry: entry["first_gid"])
+            local = tile_id - tileset["first_gid"]
+            texture = arcade.load_texture(
+                tileset["image"],
+                x=(local % tileset["columns"]) * tileset["tile_width"],
+                y=(local // tileset["columns"]) * tileset["tile_height"],
+                width=tileset["tile_width"],
+                height=tileset["tile_height"],
+                flipped_horizontally=bool(gid & FLIPPED_HORIZONTALLY),
+                flipped_vertically=bool(gid & FLIPPED_VERTICALLY),
+                flipped_diagonally=bool(gid & FLIPPED_DIAGONALLY),
+            )
+            self._textures[gid] = texture
+        return texture
+
+
+def build_sprite_chunk(streamer, cx, cy):
+    # One SpriteList per chunk holding every layer's tiles, bottom layer first
+    import arcade
+    sprites = arcade.SpriteList(use_spatial_hash=False)
+    scale = streamer.map.scale
+    cell_size = streamer.map.cell_size
+    for layer in streamer.layers:
+        cols, rows, gids = streamer.tiles(layer, cx, cy)
+        for col, row, gid in zip(cols, rows, gids):
+            texture = streamer.texture(int(gid))
+            sprite = arcade.Sprite(texture=texture, scale=scale)
+            # Tiles sit on the bottom left corner of their cell like in Tiled
+            sprite.center_x = col * cell_size + texture.width * scale / 2
+            sprite.center_y = row * cell_size + texture.height * scale / 2
+            sprites.append(sprite)
+    return sprites, len(sprites)
@@ -0,0 +1,168 @@
+import math
+import time
+
+import numpy as np
+
+RESOLUTION = 8  # Stored steps per cell
+MAX_CELLS = 16  # Distances are capped here; anything farther reads as this
+
+
+def _gap_squared(offset):
+    # Squared gap between two unit squares offset cells apart on one axis
+    return np.maximum(np.abs(offset) - 1, 0) ** 2
+
+
+class DistanceField:
+    # For every cell, how far it is from the nearest wall: the smallest gap
+    # between any point of the cell and any point of a wall cell, in cells,
+    # capped at max_cells and stored as a uint8 in 1 / RESOLUTION steps
+    # (rounded down, so it never overstates the room). Exact, and built in
+    # two passes: the nearest wall up or down each column, then the nearest
+    # of those across the row. A wall edit only redoes the cells within
+    # max_cells of it. Wall cells and cells touching one read 0.
+    def __init__(self, grid, max_cells=MAX_CELLS):
+        self.grid = grid
+        self.max_cells = max_cells
+        self.field = np.zeros((grid.rows, grid.cols), dtype=np.uint8)
+        # Flat bytearray copies for ray casts; much faster than numpy scalar access
+        self._walls = bytearray((grid.cells != 0).ravel().tobytes())
+        self._rooms = bytearray(grid.rows * grid.cols)
+        # Counters
+        self.updates = 0
+        self.last_update_ms = 0.0
+        self.last_cast_steps = 0
+        self._compute(0, 0, grid.cols, grid.rows)
+        grid.subscribe(self.on_edit)
+
+    def on_edit(self, col, row, blocked):
+        begin = time.perf_counter()
+        self._walls[row * self.grid.cols + col] = 1 if blocked else 0
+        reach = self.max_cells + 1
+        self._compute(max(col - reach, 0), max(row - reach, 0),
+                      min(col + reach + 1, self.grid.cols), min(row + reach + 1, self.grid.rows))
+        self.updates += 1
+        self.last_update_ms = (time.perf_counter() - begin) * 1000
+
+    def _compute(self, col0, row0, col1, row1):
+        # Refill field[row0:row1, col0:col1] from the walls within reach of it
+        reach = self.max_cells + 1
+        wc0 = max(col0 - reach, 0)
+        wr0 = max(row0 - reach, 0)
+        wc1 = min(col1 + reach, self.grid.cols)
+        wr1 = min(row1 + reach, self.grid.rows)
+        walls = self.grid.cells[wr0:wr1, wc0:wc1] != 0
+        # Rows to the nearest wall up or down each column (capped past reach)
+        index = np.arange(walls.shape[0])[:, None]
+        far = walls.shape[0] + reach
+        below = np.maximum.accumulate(np.where(walls, index, -far), axis=0)
+        above = np.minimum.accumulate(np.where(walls, index, 2 * far)[::-1], axis=0)[::-1]
+        vertical = _gap_squared(np.minimum(np.minimum(index - below, above - index), reach + 1))
+        vertical = vertical[row0 - wr0:row1 - wr0].astype(np.float32)
+        # Nearest of those across the row, one column offset at a time
+        best = np.full((row1 - row0, col1 - col0), np.inf, dtype=np.float32)
+        first = col0 - wc0
+        for offset in range(-reach, reach + 1):
+            source0 = max(first + offset, 0)
+            source1 = min(first + col1 - col0 + offset, walls.shape[1])
+            if source0 >= source1:
+                continue
+            target = slice(source0 - offset - first, source1 - offset - first)
+            np.minimum(best[:, target], _gap_squared(offset) + vertical[:, source0:source1], out=best[:, target])
+        distance = np.minimum(np.sqrt(best), self.max_cells)
+        self.field[row0:row1, col0:col1] = np.floor(distance * RESOLUTION).astype(np.uint8)
+        for row in range(row0, row1):
+            start = row * self.grid.cols
+            self._rooms[start + col0:start + col1] = self.field[row, col0:col1].tobytes()
+
+    def cells_to_wall(self, col, row):
+        # Room around a cell in cells; off the map there are no walls
+        if not self.grid.in_bounds(col, row):
+            return float(self.max_cells)
+        return self.field[row, col] / RESOLUTION
+
+    def clearance(self, x, y):
+        # Lower bound on the distance from (x, y) to the nearest wall, in world
+        # units; within one cell of the true distance
+        size = self.grid.cell_size
+        col = math.floor(x / size)
+        row = math.floor(y / size)
+        if not (0 <= col < self.grid.cols and 0 <= row < self.grid.rows):
+            return self.max_cells * size
+        return self._rooms[row * self.grid.cols + col] * size / RESOLUTION
+
+    def clearances(self, x, y):
+        # clearance for arrays of points
+        size = self.grid.cell_size
+        cols = np.floor(np.asarray(x) / size).astype(np.int64)
+        rows = np.floor(np.asarray(y) / size).astype(np.int64)
+        inside = (cols >= 0) & (cols < self.grid.cols) & (rows >= 0) & (rows < self.grid.rows)
+        room = self.field[np.where(inside, rows, 0), np.where(inside, cols, 0)] * (size / RESOLUTION)
+        return np.where(inside, room, self.max_cells * size)
+
+    def cast(self, x, y, dir_x, dir_y, max_dist):
+        # Sphere-traced rays along unit directions: (distance to the first
+        # wall, its col, its row) per ray, inf and -1 where none is within
+        # max_dist, 0 for rays starting inside a wall. Across open space a
+        # ray jumps the stored room around its cell in one step; next to a
+        # wall it steps cell by cell like the DDA, so hits land exactly on
+        # the wall's edge. Off the map a ray never comes back, so it stops.
+        size = self.grid.cell_size
+        cols = self.grid.cols
+        rows = self.grid.rows
+        walls = self._walls
+        rooms = self._rooms
+        room_size = size / RESOLUTION
+        x, y, dir_x, dir_y, max_dist = (np.ravel(value).tolist() for value in np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(value, dtype=float)) for value in (x, y, dir_x, dir_y, max_dist))))
+        count = len(x)
+        distance = [math.inf] * count
+        hit_col = [-1] * count
+        hit_row = [-1] * count
+        steps = 0
+        for ray in range(count):
+            ox, oy, dx, dy, limit = x[ray], y[ray], dir_x[ray], dir_y[ray], max_dist[ray]
+            col = math.floor(ox / size)
+            row = math.floor(oy / size)
+            step_x = 1 if dx >= 0 else -1
+            step_y = 1 if dy >= 0 else -1
+            t = 0.0
+            while 0 <= col < cols and 0 <= row < rows and t <= limit:
+                index = row * cols + col
+                if walls[index]:
+                    distance[ray] = t
+                    hit_col[ray] = col
+                    hit_row[ray] = row
+                    break
+                steps += 1
+                room = rooms[index]
+                if room:
+                    # In the open: nothing is within room of any point of the cell
+                    t += room * room_size
+                    col = math.floor((ox + dx * t) / size)
+                    row = math.floor((oy + dy * t) / size)
+                    continue
+                # Next to a wall: DDA step into the next cell along the ray
+                next_x = ((col + (step_x > 0)) * size - ox) / dx if dx else math.inf
+                next_y = ((row + (step_y > 0)) * size - oy) / dy if dy else math.inf
+                if next_x < next_y:
+                    t = max(next_x, t)
+                    col += step_x
+                else:
+                    t = max(next_y, t)
+                    row += step_y
+        self.last_cast_steps = steps
+        return np.array(distance), np.array(hit_col, dtype=np.int64), np.array(hit_row, dtype=np.int64)
+
+    def raycast(self, x, y, dir_x, dir_y, max_dist):
+        # Distance to the first wall per ray (a float for a single ray)
+        distance = self.cast(x, y, dir_x, dir_y, max_dist)[0]
+        if np.ndim(x) == 0 and np.ndim(dir_x) == 0:
+            return float(distance[0])
+        return distance
+
+    def stats(self):
+        return {
+            "bytes": self.field.nbytes,
+            "updates": self.updates,
+            "last_update_ms": self.last_update_ms,
+        }
@@ -0,0 +1,294 @@
+import numpy as np
+
+from particles import ParticlePool
+
+HIT_COLOUR = (0, 255, 0)
+MISS_COLOUR = (255, 0, 0)
+
+_NO_CELLS = np.zeros(0, dtype=np.int64)
+
+WAVE_FIELDS = {
+    "id": np.int64,
+    "radius": np.float64,
+    "rate": np.float64,
+    "range": np.float64,
+}
+DOT_FIELDS = {
+    "wave": np.int64,  # Slot of the dot's wave in the wave pool
+    "origin_x": np.float64,
+    "origin_y": np.float64,
+    "dir_x": np.float64,
+    "dir_y": np.float64,
+    "angle": np.float64,
+    # DDA state while marching
+    "col": np.int64,
+    "row": np.int64,
+    "step_x": np.int64,
+    "step_y": np.int64,
+    "t_max_x": np.float64,
+    "t_max_y": np.float64,
+    "t_delta_x": np.float64,
+    "t_delta_y": np.float64,
+    "hit": bool,
+    "hit_dist": np.float64,
+    "hit_col": np.int64,  # Wall cell the dot will stop in, -1 if none
+    "hit_row": np.int64,
+    # Output of the last update
+    "x": np.float64,
+    "y": np.float64,
+    "colour": (np.uint8, 4),  # RGBA; the wave's colour until the dot hits a wall
+}
+
+
+class EchoEngine:
+    # Advances every live echo wave in one NumPy batch. Each dot of a wave is
+    # a ray from the wave origin; rays are DDA-marched through the WallGrid as
+    # the wave radius grows and stop at the first wall cell they enter.
+    # Given a DistanceField, each ray is instead sphere-traced once when its
+    # wave is emitted (and again if a wall edit lands while it is live), and
+    # updates only compare the radius with the precomputed hit distance.
+    # Waves and dots live in ParticlePools, so any number of waves (player
+    # footsteps, shouts, enemies) run side by side and emitting or retiring
+    # one only claims or frees slots. Dot outputs are the pool arrays up to
+    # its high slot; free slots there have NaN positions and zero alpha.
+    def __init__(self, grid, num_dots=20, field=None, capacity=256):
+        self.grid = grid
+        self.num_dots = num_dots
+        self.field = field
+        self._direction_tables = {}
+        self._next_id = 0
+        self._wave_slots = {}  # Wave id -> slot in the wave pool
+        self.waves = ParticlePool(WAVE_FIELDS, max(capacity // num_dots, 16))
+        self.dots = ParticlePool(DOT_FIELDS, capacity)
+        # Wall cells reached by a dot during the last update
+        self.hit_cols = _NO_CELLS
+        self.hit_rows = _NO_CELLS
+        if field is not None:
+            grid.subscribe(self.on_edit)
+
+    @property
+    def x(self):
+        return self.dots.x[:self.dots.high]
+
+    @property
+    def y(self):
+        return self.dots.y[:self.dots.high]
+
+    @property
+    def angle(self):
+        return self.dots.angle[:self.dots.high]
+
+    @property
+    def hit(self):
+        return self.dots.hit[:self.dots.high]
+
+    @property
+    def alpha(self):
+        return self.dots.colour[:self.dots.high, 3]
+
+    def on_edit(self, col, row, blocked):
+        # Recast every live dot still in flight from where it has got to,
+        # so a wall appearing behind it is never hit
+        dots = self.dots
+        high = dots.high
+        flying = np.flatnonzero(dots.alive[:high] & ~dots.hit[:high])
+        if len(flying):
+            self._cast(flying, self.waves.radius[dots.wave[flying]])
+
+    def _cast(self, slots, travelled=0.0):
+        dots = self.dots
+        dir_x = dots.dir_x[slots]
+        dir_y = dots.dir_y[slots]
+        distance, col, row = self.field.cast(dots.origin_x[slots] + dir_x * travelled,
+                                             dots.origin_y[slots] + dir_y * travelled, dir_x, dir_y,
+                                             self.waves.range[dots.wave[slots]] - travelled)
+        dots.hit_dist[slots] = distance + travelled
+        dots.hit_col[slots] = col
+        dots.hit_row[slots] = row
+
+    def directions(self, num_dots):
+        # Unit directions (and sprite angles in degrees) for a ring of num_dots,
+        # built once per dot count. Angles run clockwise like the old echowave.
+        table = self._direction_tables.get(num_dots)
+        if table is None:
+            angles = -2 * np.pi * np.arange(num_dots) / num_dots
+            table = (np.cos(angles), np.sin(angles), np.degrees(angles))
+            self._direction_tables[num_dots] = table
+        return table
+
+    def __len__(self):
+        return len(self.waves)
+
+    def is_active(self, wave_id):
+        return wave_id in self._wave_slots
+
+    def emit(self, x, y, speed=6, max_range=100, step=0.5, num_dots=None, colour=MISS_COLOUR):
+        # Start a new wave at (x, y) growing by speed * step every update
+        num_dots = num_dots or self.num_dots
+        dir_x, dir_y, angle = self.directions(num_dots)
+        wave_id = self._next_id
+        self._next_id += 1
+
+        size = self.grid.cell_size
+        col, row = self.grid.cell_at(x, y)
+        step_x = np.where(dir_x >= 0, 1, -1)
+        step_y = np.where(dir_y >= 0, 1, -1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_delta_x = np.abs(size / dir_x)
+            t_delta_y = np.abs(size / dir_y)
+            next_x = (col + (step_x > 0)) * size
+            next_y = (row + (step_y > 0)) * size
+            t_max_x = np.where(dir_x != 0, (next_x - x) / dir_x, np.inf)
+            t_max_y = np.where(dir_y != 0, (next_y - y) / dir_y, np.inf)
+        t_max_x = np.where(np.isfinite(t_max_x), t_max_x, np.inf)
+        t_max_y = np.where(np.isfinite(t_max_y), t_max_y, np.inf)
+        starts_in_wall = self.grid.is_wall(col, row)
+
+        waves = self.waves
+        wave = int(waves.spawn(1)[0])
+        waves.id[wave] = wave_id
+        waves.radius[wave] = 0.0
+        waves.rate[wave] = speed * step
+        waves.range[wave] = max_range
+        self._wave_slots[wave_id] = wave
+
+        dots = self.dots
+        slots = dots.spawn(num_dots)
+        dots.wave[slots] = wave
+        dots.origin_x[slots] = x
+        dots.origin_y[slots] = y
+        dots.dir_x[slots] = dir_x
+        dots.dir_y[slots] = dir_y
+        dots.angle[slots] = angle
+        dots.col[slots] = col
+        dots.row[slots] = row
+        dots.step_x[slots] = step_x
+        dots.step_y[slots] = step_y
+        dots.t_max_x[slots] = t_max_x
+        dots.t_max_y[slots] = t_max_y
+        dots.t_delta_x[slots] = t_delta_x
+        dots.t_delta_y[slots] = t_delta_y
+        dots.hit[slots] = starts_in_wall
+        dots.hit_dist[slots] = 0.0 if starts_in_wall else np.inf
+        dots.hit_col[slots] = -1
+        dots.hit_row[slots] = -1
+        if self.field is not None and not starts_in_wall:
+            self._cast(slots)
+        # New dots stay invisible at the origin until the next update
+        dots.x[slots] = x
+        dots.y[slots] = y
+        dots.colour[slots, :3] = HIT_COLOUR if starts_in_wall else colour
+        dots.colour[slots, 3] = 0
+        return wave_id
+
+    def update(self):
+        # Grow every wave, retire the finished ones and march all rays forward
+        self.hit_cols = self.hit_rows = _NO_CELLS
+        waves = self.waves
+        if not len(waves):
+            return
+        top = waves.high
+        waves.radius[:top] += waves.rate[:top]
+        finished = waves.alive[:top] & (waves.radius[:top] > waves.range[:top])
+        if finished.any():
+            self._retire(np.flatnonzero(finished))
+            if not len(waves):
+                return
+
+        dots = self.dots
+        high = dots.high
+        live = dots.alive[:high]
+        wave = dots.wave[:high]
+        radius = waves.radius[wave]
+        if self.field is None:
+            self._march(live, radius)
+        else:
+            reached = live & ~dots.hit[:high] & (dots.hit_dist[:high] <= radius)
+            dots.hit[:high] |= reached
+            dots.colour[:high, :3][reached] = HIT_COLOUR
+            self.hit_cols = dots.hit_col[:high][reached]
+            self.hit_rows = dots.hit_row[:high][reached]
+
+        # Free slots have NaN origins, so their positions stay NaN
+        travelled = np.minimum(radius, dots.hit_dist[:high], out=radius)
+        x = dots.x[:high]
+        y = dots.y[:high]
+        np.multiply(dots.dir_x[:high], travelled, out=x)
+        np.multiply(dots.dir_y[:high], travelled, out=y)
+        x += dots.origin_x[:high]
+        y += dots.origin_y[:high]
+        top = waves.high
+        fraction = waves.radius[:top] / waves.range[:top]
+        wave_alpha = np.where(fraction > 0.2, 255 * (1 - fraction), 255).astype(np.uint8)
+        wave_alpha[~waves.alive[:top]] = 0
+        dots.colour[:high, 3] = wave_alpha[np.minimum(wave, top - 1)] * live
+
+    def _march(self, live, radius):
+        # Step each ray cell by cell until its next boundary lies beyond the
+        # wave radius; usually zero or one iteration per frame
+        cells = self.grid.cells
+        rows, cols = cells.shape
+        dots = self.dots
+        high = dots.high
+        t_max_x = dots.t_max_x
+        t_max_y = dots.t_max_y
+        pending = np.flatnonzero(live & ~dots.hit[:high] &
+                                 (np.minimum(t_max_x[:high], t_max_y[:high]) <= radius))
+        hits = []
+        while len(pending):
+            along_x = t_max_x[pending] < t_max_y[pending]
+            ix = pending[along_x]
+            iy = pending[~along_x]
+            entered = np.empty(len(pending))
+            entered[along_x] = t_max_x[ix]
+            entered[~along_x] = t_max_y[iy]
+            dots.col[ix] += dots.step_x[ix]
+            t_max_x[ix] += dots.t_delta_x[ix]
+            dots.row[iy] += dots.step_y[iy]
+            t_max_y[iy] += dots.t_delta_y[iy]
+
+            col = dots.col[pending]
+            row = dots.row[pending]
+            inside = (col >= 0) & (col < cols) & (row >= 0) & (row < rows)
+            wall = np.zeros(len(pending), dtype=bool)
+            wall[inside] = cells[row[inside], col[inside]] != 0
+            if wall.any():
+                stopped = pending[wall]
+                dots.hit[stopped] = True
+                dots.hit_dist[stopped] = entered[wall]
+                dots.colour[stopped, :3] = HIT_COLOUR
+                hits.append(stopped)
+
+            pending = pending[~wall]
+            pending = pending[np.minimum(t_max_x[pending], t_max_y[pending]) <= radius[pending]]
+        if hits:
+            hits = np.concatenate(hits)
+            self.hit_cols = dots.col[hits]
+            self.hit_rows = dots.row[hits]
+
+    def _retire(self, finished):
+        # Free the slots of finished waves and of all their dots
+        waves = self.waves
+        dots = self.dots
+        ending = np.zeros(waves.capacity, dtype=bool)
+        ending[finished] = True
+        for wave_id in waves.id[finished].tolist():
+            del self._wave_slots[wave_id]
+        high = dots.high
+        slots = np.flatnonzero(dots.alive[:high] & ending[dots.wave[:high]])
+        dots.origin_x[slots] = np.nan
+        dots.origin_y[slots] = np.nan
+        dots.x[slots] = np.nan
+        dots.y[slots] = np.nan
+        dots.colour[slots, 3] = 0
+        dots.retire(slots)
+        waves.retire(finished)
+
+    def colours(self):
+        # (n, 4) uint8 RGBA for the dots of the last update, aligned with x and y
+        return self.dots.colour[:self.dots.high]
+
+    def stats(self):
+        stats = self.dots.stats()
+        stats["waves"] = len(self.waves)
+        return stats
@@ -0,0 +1,88 @@
+import numpy as np
+
+# Interleaved layout matching arcade's shape element shader ("2f 4f1")
+VERTEX_DTYPE = np.dtype([("pos", np.float32, 2), ("color", np.uint8, 4)])
+VERTICES_PER_QUAD = 6
+
+# Corner offsets of a unit quad as two triangles: (0, 1, 2) and (0, 2, 3)
+_CORNERS = np.array([(-0.5, -0.5), (0.5, -0.5), (0.5, 0.5),
+                     (-0.5, -0.5), (0.5, 0.5), (-0.5, 0.5)], dtype=np.float32)
+
+
+class EchoBuffer:
+    # Persistent vertex/colour buffer holding every echo quad of a frame.
+    # build() is pure NumPy so it runs headless; draw() submits the whole
+    # buffer in a single call. Storage only grows when capacity is exceeded.
+    def __init__(self, quad_width=64, quad_height=16, capacity=256):
+        self.quad_width = quad_width
+        self.quad_height = quad_height
+        self.vertices = np.zeros(capacity * VERTICES_PER_QUAD, dtype=VERTEX_DTYPE)
+        self.quad_count = 0
+        self.grow_count = 0
+        self.draw_calls = 0
+        self._buffer = None
+        self._geometry = None
+        self._gl_size = 0
+
+    @property
+    def capacity(self):
+        return len(self.vertices) // VERTICES_PER_QUAD
+
+    @property
+    def vertex_count(self):
+        return self.quad_count * VERTICES_PER_QUAD
+
+    def reserve(self, quads):
+        if quads <= self.capacity:
+            return
+        new_capacity = max(quads, self.capacity * 2)
+        vertices = np.zeros(new_capacity * VERTICES_PER_QUAD, dtype=VERTEX_DTYPE)
+        vertices[:len(self.vertices)] = self.vertices
+        self.vertices = vertices
+        self.grow_count += 1
+
+    def build(self, x, y, angle, colours, left, bottom, right, top):
+        # Cull dot centres against the camera rect in bulk, then write one
+        # rotated quad per visible dot. angle is in degrees like arcade.
+        visible = (x >= left) & (x <= right) & (y >= bottom) & (y <= top)
+        count = int(np.count_nonzero(visible))
+        self.reserve(count)
+        self.quad_count = count
+        if not count:
+            return 0
+
+        rad = np.radians(angle[visible])
+        cos = np.cos(rad).astype(np.float32)[:, None]
+        sin = np.sin(rad).astype(np.float32)[:, None]
+        corner_x = _CORNERS[:, 0] * self.quad_width
+        corner_y = _CORNERS[:, 1] * self.quad_height
+
+        quads = self.vertices[:count * VERTICES_PER_QUAD].reshape(count, VERTICES_PER_QUAD)
+        quads["pos"][:, :, 0] = x[visible][:, None] + corner_x * cos - corner_y * sin
+        quads["pos"][:, :, 1] = y[visible][:, None] + corner_x * sin + corner_y * cos
+        quads["color"][:] = colours[visible][:, None, :]
+        return count
+
+    def draw(self):
+        # One draw call for every quad written by the last build()
+        if not self.quad_count:
+            return
+        import arcade
+        from arcade.gl import BufferDescription
+
+        ctx = arcade.get_window().ctx
+        data = self.vertices[:self.vertex_count]
+        if self._buffer is None or self._gl_size < self.vertices.nbytes:
+            self._gl_size = self.vertices.nbytes
+            self._buffer = ctx.buffer(reserve=self._gl_size, usage="stream")
+            self._geometry = ctx.geometry(
+                [BufferDescription(self._buffer, "2f 4f1", ["in_vert", "in_color"], normalized=["in_color"])],
+                mode=ctx.TRIANGLES,
+            )
+        self._buffer.write(data.tobytes())
+
+        program = ctx.shape_element_list_program
+        program["Position"] = 0, 0
+        program["Angle"] = 0
+        self._geometry.render(program, vertices=self.vertex_count)
+        self.draw_calls += 1
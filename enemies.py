@@ -0,0 +1,260 @@
+import numpy as np
+
+from spatialhash import SpatialHash
+
+ENEMY_SIZE = (108, 88.5)  # images/enemy.png at 0.1 scale
+ENEMY_SPEED = 3
+CHASE_TIME = 5  # Seconds an enemy keeps chasing after it was alerted
+FLEE_TIME = 3  # Seconds an enemy keeps running once scared
+SEPARATION_RADIUS = 40  # Enemies closer than this push apart
+STEER_LOOKAHEAD = 20  # Ticks of a patrol step checked for room ahead
+AGENT_CELL_SIZE = SEPARATION_RADIUS  # Cell size of the agent spatial hash; pairs() needs it >= the radius
+
+# Modes
+PATROL = 0
+CHASE = 1
+FLEE = 2
+MODE_NAMES = ("patrol", "chase", "flee")
+
+_NO_INDICES = np.zeros(0, dtype=np.int64)
+
+
+class EnemyStore:
+    # Every enemy as a row of contiguous arrays - position, velocity, mode
+    # and timer - advanced a whole mode at a time. Patrollers take a random
+    # step (turned round when it heads for a wall) and start chasing once
+    # they touch the player; chasers follow the shared flow field to the
+    # player until it times out or they lose it; fleers take the flow
+    # field's step away from the player until their timer runs out. Then all
+    # of them are pushed apart and moved against the walls in one batch.
+    # All randomness comes from one seeded generator, so a seed replays.
+    # Every enemy is registered in an agent SpatialHash (shared with the
+    # player when one is passed in) and kept in step with it as it moves;
+    # contact, separation, noise and on-screen queries go through it.
+    # Enemies take consecutive agent ids, from first_agent on, so nothing
+    # else may be inserted in the hash once the first enemy is added.
+    def __init__(self, grid, flowfield, field=None, seed=None, capacity=64, size=ENEMY_SIZE,
+                 speed=ENEMY_SPEED, chase_time=CHASE_TIME, flee_time=FLEE_TIME, agents=None):
+        self.grid = grid
+        self.flowfield = flowfield  # Shared field pointing every chaser at the player
+        self.field = field  # Distance to the nearest wall, for steering clear of them
+        self.rng = np.random.default_rng(seed)
+        self.width, self.height = size
+        self.speed = speed
+        self.chase_time = chase_time
+        self.flee_time = flee_time
+        self.count = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.mode = np.zeros(capacity, dtype=np.int8)
+        self.timer = np.zeros(capacity)  # Chase or flee time left
+        self.agents = SpatialHash(AGENT_CELL_SIZE, capacity) if agents is None else agents
+        self.first_agent = None  # Agent id of enemy 0
+        # Counters
+        self.grows = 0
+        self.last_pairs = 0
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        for name in ("x", "y", "vx", "vy", "mode", "timer"):
+            array = getattr(self, name)
+            grown = np.zeros(max(len(array) * 2, 1), dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+        self.grows += 1
+
+    def add(self, x, y):
+        # New patrolling enemy; returns its index
+        if self.count == len(self.x):
+            self._grow()
+        index = self.count
+        agent = self.agents.insert(x, y)
+        if index == 0:
+            self.first_agent = agent
+        elif agent != self.first_agent + index:
+            raise ValueError(f"Agent {self.first_agent + index} was taken by something other than an enemy")
+        self.x[index] = x
+        self.y[index] = y
+        self.vx[index] = self.vy[index] = 0.0
+        self.mode[index] = PATROL
+        self.timer[index] = self.chase_time
+        self.count += 1
+        return index
+
+    def modes(self):
+        return [MODE_NAMES[mode] for mode in self.mode[:self.count].tolist()]
+
+    def alert(self, indices):
+        # Enemies that heard the player start chasing; scared ones keep running
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = indices[self.mode[indices] != FLEE]
+        self.mode[indices] = CHASE
+
+    def scare(self, x, y, radius, duration=None):
+        # Every enemy within radius of (x, y) runs from the player for duration seconds
+        near = self.within(x, y, radius)
+        self.mode[near] = FLEE
+        self.timer[near] = self.flee_time if duration is None else duration
+        return len(near)
+
+    def update(self, dt, player):
+        # New velocities for every enemy; modes change for the next tick
+        n = self.count
+        if not n:
+            return
+        mode = self.mode[:n]
+        patrol = np.flatnonzero(mode == PATROL)
+        chase = np.flatnonzero(mode == CHASE)
+        flee = np.flatnonzero(mode == FLEE)
+        if len(patrol):
+            self._patrol(patrol, player)
+        if len(chase):
+            self._pursue(chase, dt, player, away=False)
+        if len(flee):
+            self._pursue(flee, dt, player, away=True)
+        self._separate()
+
+    def _patrol(self, index, player):
+        self.timer[index] = self.chase_time
+        step = self.rng.integers(-1, 2, size=(2, len(index))) * float(self.speed)
+        vx, vy = step
+        x = self.x[index]
+        y = self.y[index]
+        # A random step towards a wall is turned round, so patrols drift into open space
+        if self.field is not None:
+            room = self.field.clearances(np.concatenate((x, x + vx * STEER_LOOKAHEAD)),
+                                         np.concatenate((y, y + vy * STEER_LOOKAHEAD)))
+            here = room[:len(index)]
+            ahead = room[len(index):]
+            turn = ((vx != 0) | (vy != 0)) & (ahead < here)
+            vx[turn] = -vx[turn]
+            vy[turn] = -vy[turn]
+        self.vx[index] = vx
+        self.vy[index] = vy
+        # Touching the player starts a chase
+        touching = self.within(player.center_x, player.center_y, (self.width + player.width) / 2)
+        self.mode[touching[self.mode[touching] == PATROL]] = CHASE
+
+    def _pursue(self, index, dt, player, away):
+        # Head for the centre of the next cell on the flow field, towards the
+        # player or away from it; enemies it has no step for go back to patrol
+        flowfield = self.flowfield
+        size = self.grid.cell_size
+        x = self.x[index]
+        y = self.y[index]
+        cols = np.floor(x / size).astype(np.int64)
+        rows = np.floor(y / size).astype(np.int64)
+        if away:
+            target_col, target_row, found = flowfield.steps_away(cols, rows)
+        else:
+            target_col, target_row, found = flowfield.next_steps(cols, rows)
+        self.mode[index[~found]] = PATROL
+        index = index[found]
+        if not len(index):
+            return
+        x = x[found]
+        y = y[found]
+        target_x = (target_col[found] + 0.5) * size
+        target_y = (target_row[found] + 0.5) * size
+        if not away:
+            # In the player's own cell, go straight for the player
+            there = flowfield.dist[rows[found], cols[found]] == 0
+            target_x[there] = player.center_x
+            target_y[there] = player.center_y
+        diff_x = target_x - x
+        diff_y = target_y - y
+        distance = np.sqrt(diff_x ** 2 + diff_y ** 2)
+        moving = distance != 0
+        distance = distance[moving]
+        speed = np.minimum(self.speed, distance)
+        self.vx[index[moving]] = (diff_x[moving] / distance) * speed
+        self.vy[index[moving]] = (diff_y[moving] / distance) * speed
+
+        timer = self.timer[index]
+        running = timer > 0
+        self.timer[index[running]] = timer[running] - dt
+        self.mode[index[~running]] = PATROL
+
+    def _enemies(self, agents):
+        # Enemy indices of the agent ids that are this store's enemies
+        if self.first_agent is None:
+            return _NO_INDICES
+        index = agents - self.first_agent
+        return index[(index >= 0) & (index < self.count)]
+
+    def within(self, x, y, radius):
+        # Indices of the enemies within radius of (x, y), in index order
+        return np.sort(self._enemies(self.agents.query_radius(x, y, radius)))
+
+    def nearest(self, x, y, k=1, max_radius=None):
+        # Indices of up to k enemies closest to (x, y), nearest first
+        others = len(self.agents) - self.count
+        return self._enemies(self.agents.nearest(x, y, k + others, max_radius))[:k]
+
+    def pairs(self, radius):
+        # (i, j) index arrays of every ordered pair of enemies within radius
+        # of each other, from the agent spatial hash
+        i, j = self.agents.pairs(radius)
+        if self.first_agent is None or not len(i):
+            return _NO_INDICES, _NO_INDICES
+        i = i - self.first_agent
+        j = j - self.first_agent
+        ours = (i >= 0) & (i < self.count) & (j >= 0) & (j < self.count)
+        return i[ours], j[ours]
+
+    def _separate(self):
+        # Nudge enemies apart so chasers don't stack on the same spot
+        i, j = self.pairs(SEPARATION_RADIUS)
+        self.last_pairs = len(i)
+        if not len(i):
+            return
+        diff_x = self.x[i] - self.x[j]
+        diff_y = self.y[i] - self.y[j]
+        distance = np.sqrt(diff_x ** 2 + diff_y ** 2)
+        apart = distance != 0
+        i = i[apart]
+        distance = distance[apart]
+        push = (SEPARATION_RADIUS - distance) / SEPARATION_RADIUS
+        n = self.count
+        self.vx[:n] += np.bincount(i, weights=diff_x[apart] / distance * push, minlength=n)
+        self.vy[:n] += np.bincount(i, weights=diff_y[apart] / distance * push, minlength=n)
+
+    def move(self, resolver, bodies=()):
+        # Apply the velocities, resolved against the walls. bodies (the
+        # player) are moved by their change_x/change_y in the same batch.
+        n = self.count
+        k = len(bodies)
+        if not n and not k:
+            return
+        extra = [np.array([getattr(body, name) for body in bodies], dtype=float)
+                 for name in ("center_x", "center_y", "change_x", "change_y", "width", "height")]
+        x, y, _, _ = resolver.resolve(np.concatenate((extra[0], self.x[:n])), np.concatenate((extra[1], self.y[:n])),
+                                      np.concatenate((extra[2], self.vx[:n])), np.concatenate((extra[3], self.vy[:n])),
+                                      np.concatenate((extra[4] / 2, np.full(n, self.width / 2))),
+                                      np.concatenate((extra[5] / 2, np.full(n, self.height / 2))))
+        for body, new_x, new_y in zip(bodies, x[:k].tolist(), y[:k].tolist()):
+            body.center_x = new_x
+            body.center_y = new_y
+        self.x[:n] = x[k:]
+        self.y[:n] = y[k:]
+        if n:
+            self.agents.move(slice(self.first_agent, self.first_agent + n), self.x[:n], self.y[:n])
+
+    def visible(self, left, bottom, right, top):
+        # Indices of the enemies whose box overlaps a world rectangle
+        half_w = self.width / 2
+        half_h = self.height / 2
+        found = self.agents.query_aabb(left - half_w, bottom - half_h, right + half_w, top + half_h)
+        return np.sort(self._enemies(found))
+
+    def stats(self):
+        mode = self.mode[:self.count]
+        stats = {name: int((mode == value).sum()) for value, name in enumerate(MODE_NAMES)}
+        stats["count"] = self.count
+        stats["capacity"] = len(self.x)
+        stats["pairs"] = self.last_pairs
+        return stats
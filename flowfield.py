@@ -0,0 +1,356 @@
+import numpy as np
+
+# Neighbour order used by the direction arrays: 4 orthogonal then 4 diagonal
+STEPS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+UNREACHED = -1
+NO_STEP = -1
+# Index into STEPS of each step's reverse
+REVERSE = tuple(STEPS.index((-dc, -dr)) for dc, dr in STEPS)
+# dc/dr of a stored step index; NO_STEP reads the last entry, standing still
+STEP_COL = np.array([dc for dc, dr in STEPS] + [0], dtype=np.int64)
+STEP_ROW = np.array([dr for dc, dr in STEPS] + [0], dtype=np.int64)
+# Wall edits past this share of the map rebuild the field instead of repairing it
+REPAIR_LIMIT = 1 / 16
+# What one search level costs on top of its cells, counted in cells, for budgets
+LEVEL_WORK = 128
+
+
+class FlowField:
+    # Breadth-first distance field over a WallGrid, seeded from one cell (the
+    # player) and shared by every enemy that chases it. Each open cell stores
+    # its distance in steps and the neighbour one step closer (the first in
+    # STEPS order), so a chaser's next step is a single array lookup however
+    # many enemies read it.
+    # max_distance caps the search (patrol leashes, cheap local fields);
+    # slack lets the field stay rooted at an old cell while the target is
+    # only that many cells away, trading a little accuracy for fewer rebuilds.
+    # Wall edits are repaired in place: cells whose route ran through a new
+    # wall are cleared and refilled from the cells around them, and a removed
+    # wall only relaxes the distances it shortens, so an edit costs the area
+    # it changes. Moving the root changes every distance, so that is a full
+    # search; with a budget it is spread over updates (about budget cells
+    # expanded each, see LEVEL_WORK) into a second buffer while the old field
+    # keeps being served.
+    def __init__(self, grid, max_distance=None, slack=0, budget=None):
+        self.grid = grid
+        self.max_distance = max_distance
+        self.slack = slack
+        self.budget = budget
+        self.rows, self.cols = grid.cells.shape
+        self.source = None
+        self.dirty = False  # Wall edits waiting for the next update
+        self._edits = []
+        self._pending = None  # (source, search) of a rebuild still in progress
+        # Counters
+        self.recomputes = 0
+        self.reuses = 0
+        self.repairs = 0
+        self.slices = 0
+        self.version = 0  # Bumped whenever any distance changes
+        self._build_topology()
+        self._dist, self._step = self._buffers()
+        self._back = None
+        self._show()
+        grid.subscribe(self.on_edit)
+
+    def _build_topology(self):
+        # Open mask padded with a wall border so flat neighbour offsets never
+        # wrap, and per cell a bit for each step in STEPS it may take
+        width = self.cols + 2
+        padded = np.zeros((self.rows + 2, width), dtype=bool)
+        padded[1:-1, 1:-1] = self.grid.cells == 0
+        self._open = padded.ravel()
+        self._width = width
+        self._offsets = np.array([dc + dr * width for dc, dr in STEPS], dtype=np.int64)
+        # For diagonals, the two orthogonal cells that must be open (no corner cutting)
+        self._corner_a = np.array([dc for dc, dr in STEPS], dtype=np.int64)
+        self._corner_b = np.array([dr * width for dc, dr in STEPS], dtype=np.int64)
+        self._diagonal = np.array([dc != 0 and dr != 0 for dc, dr in STEPS])
+        self._moves = np.zeros(self._open.shape, dtype=np.uint8)
+        inner = ((np.arange(self.rows)[:, None] + 1) * width + np.arange(self.cols) + 1).ravel()
+        self._inner = np.zeros(self._open.shape, dtype=bool)
+        self._inner[inner] = True
+        self._update_moves(inner)
+        # Expansion order: a cell reached from several frontier cells at once
+        # keeps the step back with the lowest index, written last
+        order = sorted(range(len(STEPS)), key=lambda k: -REVERSE[k])
+        # Step bits -> which of the expansion rows they allow
+        self._expand_table = ((np.arange(256)[:, None] >> np.array(order)) & 1).astype(bool)
+        self._expand_offsets = self._offsets[order]
+        self._expand_back = np.array([REVERSE[k] for k in order], dtype=np.int8)
+        self._stamp = np.zeros(self._open.shape, dtype=np.int64)
+
+    def _update_moves(self, cells):
+        # Recompute the step bits of flat cells (never on the border)
+        is_open = self._open
+        moves = np.zeros(len(cells), dtype=np.uint8)
+        for k, (offset, corner_a, corner_b, diagonal) in enumerate(
+                zip(self._offsets, self._corner_a, self._corner_b, self._diagonal)):
+            ok = is_open[cells] & is_open[cells + offset]
+            if diagonal:
+                ok &= is_open[cells + corner_a] & is_open[cells + corner_b]
+            moves |= ok.astype(np.uint8) << k
+        self._moves[cells] = moves
+
+    def _buffers(self):
+        return (np.full(self._open.shape, UNREACHED, dtype=np.int32),
+                np.full(self._open.shape, NO_STEP, dtype=np.int8))
+
+    def _show(self):
+        # Public (rows, cols) views of the served buffers
+        shape = (self.rows + 2, self._width)
+        self.dist = self._dist.reshape(shape)[1:-1, 1:-1]
+        self.step = self._step.reshape(shape)[1:-1, 1:-1]
+
+    def on_edit(self, col, row, blocked):
+        # Patch the open mask now; the distances are repaired on the next update
+        self._open[self._flat(col, row)] = not blocked
+        self._edits.append(self._flat(col, row))
+        self.dirty = True
+
+    def _flat(self, col, row):
+        return (row + 1) * self._width + col + 1
+
+    def update(self, source):
+        # Re-seed from source (col, row) if it moved, and repair wall edits.
+        # Several wall edits in one frame are repaired together. Returns True
+        # when the served field changed.
+        changed = False
+        if self.dirty:
+            changed = self._apply_edits()
+        if self._pending is not None:
+            return self._advance() or changed
+        if self.source is not None:
+            if source == self.source:
+                return changed
+            near = max(abs(source[0] - self.source[0]), abs(source[1] - self.source[1])) <= self.slack
+            if near and self.reaches(*source):
+                self.reuses += 1
+                return changed
+        self._start(source)
+        return self._advance() or changed
+
+    def _start(self, source):
+        if self._back is None:
+            self._back = self._buffers()
+        dist, step = self._back
+        dist.fill(UNREACHED)
+        step.fill(NO_STEP)
+        col, row = source
+        seeds = np.zeros(0, dtype=np.int64)
+        if 0 <= col < self.cols and 0 <= row < self.rows and self._open[self._flat(col, row)]:
+            seeds = np.array([self._flat(col, row)], dtype=np.int64)
+            dist[seeds] = 0
+        self._pending = (source, self._search(dist, step, seeds, fresh=True))
+
+    def _advance(self, whole=False):
+        # Run the pending rebuild for one budget (all of it when whole, with
+        # no budget or with nothing served yet); True once it is served
+        source, search = self._pending
+        limit = None if whole or self.source is None else self.budget
+        spent = 0
+        for work in search:
+            spent += work
+            if limit is not None and spent >= limit:
+                self.slices += 1
+                return False
+        self._pending = None
+        self._back, (self._dist, self._step) = (self._dist, self._step), self._back
+        self._show()
+        self.source = source
+        self.recomputes += 1
+        self.version += 1
+        return True
+
+    def _expand(self, frontier):
+        # Every allowed step out of the frontier: (cells, back) where back is
+        # the step index from each cell to the frontier cell it came from
+        ok = self._expand_table[self._moves[frontier]].T
+        cells = (frontier[None, :] + self._expand_offsets[:, None])[ok]
+        back = np.broadcast_to(self._expand_back[:, None], ok.shape)[ok]
+        return cells, back
+
+    def _search(self, dist, step, seeds, fresh=False):
+        # Breadth-first relaxation from seed cells (flat) at the distances
+        # they hold: a neighbour is taken if it is unreached, further away, or
+        # as far but with a lower step index. Cells go through in order of
+        # distance, seeds joining at their own. fresh means everything but
+        # the seeds is unreached, so only unreached cells need looking at.
+        # A generator yielding the work of each level, so a search can be
+        # spread over updates.
+        seeds = seeds[dist[seeds] != UNREACHED]
+        if not len(seeds):
+            return
+        levels = dist[seeds]
+        order = np.argsort(levels, kind="stable")
+        seeds = seeds[order]
+        levels = levels[order]
+        stamp = self._stamp
+        taken = 0
+        frontier = seeds[:0]
+        level = int(levels[0])
+        while True:
+            if taken < len(seeds) and levels[taken] == level:
+                joined = int(np.searchsorted(levels, level, "right"))
+                joining = seeds[taken:joined]
+                frontier = np.concatenate((frontier, joining[dist[joining] == level]))
+                taken = joined
+            if not len(frontier) or (self.max_distance is not None and level >= self.max_distance):
+                if taken == len(seeds):
+                    return
+                frontier = seeds[:0]
+                level = int(levels[taken])
+                continue
+            cells, back = self._expand(frontier)
+            work = len(frontier) + LEVEL_WORK
+            level += 1
+            current = dist[cells]
+            if fresh:
+                better = current == UNREACHED
+            else:
+                better = (current == UNREACHED) | (level < current) | ((level == current) & (back < step[cells]))
+            cells = cells[better]
+            back = back[better]
+            current = current[better]
+            # One entry per cell; the last written wins, which is the lowest back
+            index = np.arange(len(cells))
+            stamp[cells] = index
+            first = stamp[cells] == index
+            cells = cells[first]
+            dist[cells] = level
+            step[cells] = back[first]
+            # Cells that only changed step keep their distance, so nothing past them moves
+            frontier = cells if fresh else cells[current[first] != level]
+            yield work
+
+    def _apply_edits(self):
+        edits = np.unique(np.array(self._edits, dtype=np.int64))
+        self._edits.clear()
+        self.dirty = False
+        around = np.unique((edits[:, None] + np.concatenate(([0], self._offsets))).ravel())
+        around = around[self._inner[around]]
+        self._update_moves(around)
+        if self.source is None:
+            return False
+        if len(edits) > REPAIR_LIMIT * self.rows * self.cols or not self._open[self._flat(*self.source)]:
+            # Rebuilt and served straight away: the old field may run through the new walls
+            self._start(self.source)
+            return self._advance(whole=True)
+        self.repairs += 1
+        dist = self._dist
+        step = self._step
+        # Clear every cell whose step now leads into a wall, a cleared cell or
+        # a corner it can no longer cut, then refill them from around
+        blocked = edits[~self._open[edits]]
+        dist[blocked] = UNREACHED
+        step[blocked] = NO_STEP
+        cleared = [blocked]
+        check = around
+        while len(check):
+            check = check[dist[check] > 0]
+            back = step[check].astype(np.int64)
+            parent = check + self._offsets[back]
+            kept = (dist[parent] != UNREACHED) & (((self._moves[check] >> back) & 1) != 0)
+            lost = check[~kept]
+            if not len(lost):
+                break
+            dist[lost] = UNREACHED
+            step[lost] = NO_STEP
+            cleared.append(lost)
+            # Cells stepping into the ones just cleared
+            neighbours = (lost[:, None] + self._offsets).ravel()
+            parents = np.repeat(lost, len(STEPS))
+            live = dist[neighbours] > 0
+            neighbours = neighbours[live]
+            parents = parents[live]
+            check = np.unique(neighbours[neighbours + self._offsets[step[neighbours].astype(np.int64)] == parents])
+        cleared = np.concatenate(cleared)
+        # Reached neighbours of the cleared cells, and the cells next to opened ones
+        edge = (cleared[:, None] + self._offsets).ravel()
+        seeds = np.concatenate((edge, around))
+        seeds = np.unique(seeds[dist[seeds] != UNREACHED])
+        for _ in self._search(dist, step, seeds):
+            pass
+        self.version += 1
+        if self._pending is not None:
+            # The rebuild in progress saw the old walls; start it again
+            self._start(self._pending[0])
+        return True
+
+    def reaches(self, col, row):
+        return 0 <= col < self.cols and 0 <= row < self.rows and self.dist[row, col] != UNREACHED
+
+    def distance(self, col, row):
+        # Steps to the source, or None if the cell is not covered by the field
+        if not self.reaches(col, row):
+            return None
+        return int(self.dist[row, col])
+
+    def next_step(self, col, row):
+        # Neighbouring cell one step closer to the source, the cell itself at
+        # the source, or None when unreachable
+        if not self.reaches(col, row):
+            return None
+        step = int(self.step[row, col])
+        return col + int(STEP_COL[step]), row + int(STEP_ROW[step])
+
+    def step_away(self, col, row):
+        # Flee: the open neighbour furthest from the source (or None)
+        if not self.reaches(col, row):
+            return None
+        best = None
+        best_dist = self.dist[row, col]
+        for dc, dr in STEPS:
+            ncol, nrow = col + dc, row + dr
+            if not self.reaches(ncol, nrow) or self.dist[nrow, ncol] <= best_dist:
+                continue
+            if dc and dr and (self.grid.is_wall(col + dc, row) or self.grid.is_wall(col, row + dr)):
+                continue
+            best = (ncol, nrow)
+            best_dist = self.dist[nrow, ncol]
+        return best
+
+    def _flat_cells(self, cols, rows):
+        # Flat indices of cells, with off-map ones moved to an unreached border cell
+        inside = (cols >= 0) & (cols < self.cols) & (rows >= 0) & (rows < self.rows)
+        return np.where(inside, (rows + 1) * self._width + cols + 1, 0)
+
+    def next_steps(self, cols, rows):
+        # next_step for arrays of cells: (cols, rows, reached), where cells
+        # the field does not reach are left where they are
+        cols = np.asarray(cols, dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int64)
+        flat = self._flat_cells(cols, rows)
+        reached = self._dist[flat] != UNREACHED
+        step = np.where(reached, self._step[flat], NO_STEP)
+        return cols + STEP_COL[step], rows + STEP_ROW[step], reached
+
+    def steps_away(self, cols, rows):
+        # step_away for arrays of cells: (cols, rows, found), keeping the
+        # first furthest neighbour in STEPS order like the scalar version
+        cols = np.asarray(cols, dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int64)
+        flat = self._flat_cells(cols, rows)
+        best = self._dist[flat]
+        reached = best != UNREACHED
+        flat = np.where(reached, flat, self._width + 1)  # Any inner cell; the result is masked out
+        moves = self._moves[flat]
+        found = np.zeros(len(cols), dtype=bool)
+        best_col = cols.copy()
+        best_row = rows.copy()
+        for k, ((dc, dr), offset) in enumerate(zip(STEPS, self._offsets)):
+            there = self._dist[flat + offset]
+            further = reached & (((moves >> k) & 1) != 0) & (there > best)
+            best = np.where(further, there, best)
+            best_col[further] = cols[further] + dc
+            best_row[further] = rows[further] + dr
+            found |= further
+        return best_col, best_row, found
+
+    def next_step_world(self, x, y, away=False):
+        # World-space centre of the next cell to move to from (x, y)
+        col, row = self.grid.cell_at(x, y)
+        cell = self.step_away(col, row) if away else self.next_step(col, row)
+        if cell is None:
+            return None
+        return self.grid.cell_center(*cell)
@@ -0,0 +1,113 @@
+import numpy as np
+
+FADE_TIME = 8.0  # Seconds a revealed wall takes to fade back into the dark
+LEVELS = 8  # Brightness steps a revealed wall is drawn with
+FOG_CHUNK_SIZE = 16  # Cells along each side of a redraw region
+
+
+class FogOfWar:
+    # What the player knows of the map. Walls light up where echoes hit them
+    # and fade back out over fade_time; brightness is kept per cell and
+    # quantised into levels steps for drawing. Only chunks holding a lit cell
+    # are decayed, and a chunk is marked dirty only when one of its cells
+    # changes step, so whatever is cached for drawing it is rebuilt at most a
+    # few times a second and dark chunks are never touched.
+    def __init__(self, grid, chunk_size=FOG_CHUNK_SIZE, fade_time=FADE_TIME, levels=LEVELS):
+        self.rows = grid.rows
+        self.cols = grid.cols
+        self.chunk_size = chunk_size
+        self.fade_time = fade_time
+        self.levels = levels
+        self.brightness = np.zeros((grid.rows, grid.cols), dtype=np.float32)  # 1 just revealed, 0 dark
+        self.steps = np.zeros((grid.rows, grid.cols), dtype=np.uint8)  # Quantised brightness, as drawn
+        self.lit = set()  # Chunks holding a cell with any brightness left
+        self.dirty = set()  # Chunks whose steps changed since take_dirty()
+        # Counters
+        self.reveals = 0
+        self.redraws = 0
+
+    def chunk_slices(self, key):
+        size = self.chunk_size
+        return slice(key[1] * size, (key[1] + 1) * size), slice(key[0] * size, (key[0] + 1) * size)
+
+    def reveal(self, cols, rows):
+        # Light cells up fully, e.g. the walls an echo hit this tick
+        cols = np.asarray(cols, dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int64)
+        inside = (cols >= 0) & (cols < self.cols) & (rows >= 0) & (rows < self.rows)
+        cols = cols[inside]
+        rows = rows[inside]
+        if not len(cols):
+            return
+        self.brightness[rows, cols] = 1
+        changed = self.steps[rows, cols] != self.levels
+        self.steps[rows, cols] = self.levels
+        size = self.chunk_size
+        keys = set(zip((cols // size).tolist(), (rows // size).tolist()))
+        self.lit |= keys
+        self.dirty |= set(zip((cols[changed] // size).tolist(), (rows[changed] // size).tolist()))
+        self.reveals += len(cols)
+
+    def update(self, dt):
+        # Fade every lit chunk; dirty the ones where a step changed
+        fade = dt / self.fade_time
+        for key in list(self.lit):
+            block = self.chunk_slices(key)
+            brightness = self.brightness[block]
+            brightness -= fade
+            np.maximum(brightness, 0, out=brightness)
+            steps = np.ceil(brightness * self.levels).astype(np.uint8)
+            if not np.array_equal(steps, self.steps[block]):
+                self.steps[block] = steps
+                self.dirty.add(key)
+            if not steps.any():
+                self.lit.discard(key)
+
+    def take_dirty(self):
+        # Chunks to redraw since the last call
+        dirty = self.dirty
+        self.dirty = set()
+        self.redraws += len(dirty)
+        return dirty
+
+    def alpha(self, steps):
+        return (np.asarray(steps, dtype=np.int64) * 255 // self.levels).astype(np.uint8)
+
+    def tiles(self, streamer, layer, cx, cy):
+        # (cols, rows, gids, alphas) of the lit tiles of one layer in a chunk
+        cols, rows, gids = streamer.tiles(layer, cx, cy)
+        steps = self.steps[rows, cols]
+        lit = steps > 0
+        return cols[lit], rows[lit], gids[lit], self.alpha(steps[lit])
+
+    def stats(self):
+        return {
+            "lit_chunks": len(self.lit),
+            "lit_cells": int(np.count_nonzero(self.steps)),
+            "reveals": self.reveals,
+            "redraws": self.redraws,
+        }
+
+
+def fog_chunk_builder(fog):
+    # build_chunk for a ChunkStreamer (same chunk size as the fog) that only
+    # makes sprites for lit tiles, faded to their brightness. A chunk with
+    # nothing lit builds nothing, so it is never drawn.
+    def build(streamer, cx, cy):
+        import arcade
+        sprites = arcade.SpriteList(use_spatial_hash=False)
+        scale = streamer.map.scale
+        cell_size = streamer.map.cell_size
+        for layer in streamer.layers:
+            cols, rows, gids, alphas = fog.tiles(streamer, layer, cx, cy)
+            for col, row, gid, alpha in zip(cols, rows, gids, alphas):
+                texture = streamer.texture(int(gid))
+                sprite = arcade.Sprite(texture=texture, scale=scale)
+                sprite.center_x = col * cell_size + texture.width * scale / 2
+                sprite.center_y = row * cell_size + texture.height * scale / 2
+                sprite.alpha = int(alpha)
+                sprites.append(sprite)
+        if not len(sprites):
+            return None, 0
+        return sprites, len(sprites)
+    return build
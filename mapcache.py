@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import shutil
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from wallgrid import GID_MASK, WallGrid
+from pathfinding import HierarchicalPlanner
+
+CACHE_DIR = os.path.join("map_files", ".cache")
+# Bump whenever the baked layout changes so old caches are rebuilt
+FORMAT_VERSION = 1
+CLUSTER_SIZE = 16
+
+
+def read_tileset(path):
+    root = ET.parse(path).getroot()
+    image = root.find("image")
+    return {
+        "name": root.get("name"),
+        "tile_width": int(root.get("tilewidth")),
+        "tile_height": int(root.get("tileheight")),
+        "tile_count": int(root.get("tilecount")),
+        "columns": int(root.get("columns")),
+        "image": os.path.normpath(os.path.join(os.path.dirname(path), image.get("source"))),
+    }
+
+
+def read_tmx(path):
+    # Every CSV tile layer of a .tmx as raw gids (flip flags kept) in Tiled
+    # order (row 0 = top), plus map and tileset metadata
+    root = ET.parse(path).getroot()
+    folder = os.path.dirname(path)
+    meta = {
+        "cols": int(root.get("width")),
+        "rows": int(root.get("height")),
+        "tile_width": int(root.get("tilewidth")),
+        "tile_height": int(root.get("tileheight")),
+        "tilesets": [],
+        "layers": [],
+    }
+    for tileset in root.iter("tileset"):
+        source = os.path.normpath(os.path.join(folder, tileset.get("source")))
+        entry = read_tileset(source)
+        entry["first_gid"] = int(tileset.get("firstgid"))
+        entry["source"] = source
+        meta["tilesets"].append(entry)
+    layers = {}
+    for layer in root.iter("layer"):
+        data = layer.find("data")
+        if data is None or data.get("encoding") != "csv":
+            raise ValueError(f"Layer {layer.get('name')!r} in {path} is not CSV encoded")
+        tiles = np.array(data.text.replace("\n", "").split(","), dtype=np.uint32)
+        layers[layer.get("name")] = tiles.reshape(int(layer.get("height")), int(layer.get("width")))
+        meta["layers"].append(layer.get("name"))
+    return meta, layers
+
+
+def source_hash(path):
+    # The map and every tileset it references
+    digest = hashlib.sha1()
+    digest.update(str(FORMAT_VERSION).encode())
+    with open(path, "rb") as file:
+        digest.update(file.read())
+    root = ET.parse(path).getroot()
+    for tileset in root.iter("tileset"):
+        source = os.path.join(os.path.dirname(path), tileset.get("source"))
+        if os.path.exists(source):
+            with open(source, "rb") as file:
+                digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+def cache_prefix(path, scale):
+    stem = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+    return f"{stem}-{scale:g}-"
+
+
+class BakedMap:
+    # A compiled map: per-layer tile arrays (memory-mapped, row 0 at the
+    # bottom like arcade's world), the wall occupancy grid and the baked
+    # hierarchical nav graph
+    def __init__(self, folder, meta, arrays):
+        self.folder = folder
+        self.meta = meta
+        self.arrays = arrays
+        self.scale = meta["scale"]
+        self.cols = meta["cols"]
+        self.rows = meta["rows"]
+        self.tile_width = meta["tile_width"]
+        self.tile_height = meta["tile_height"]
+        self.tilesets = meta["tilesets"]
+        self.cell_size = self.tile_width * self.scale
+        self.width = self.cols * self.cell_size
+        self.height = self.rows * self.cell_size
+
+    def layer(self, name):
+        return self.arrays["layer_" + name]
+
+    @property
+    def layer_names(self):
+        return self.meta["layers"]
+
+    def wall_tiles(self):
+        # Raw gids of the Walls layer, or None if the map has none
+        return self.arrays.get("layer_Walls")
+
+    def grid(self):
+        # Fresh WallGrid; cells are copied so runtime wall edits never touch the cache
+        return WallGrid(np.array(self.arrays["walls"]), self.cell_size)
+
+    def planner(self, grid, open=None):
+        if self.meta.get("cluster_size") == CLUSTER_SIZE and "nav_nodes" in self.arrays:
+            return HierarchicalPlanner(grid, CLUSTER_SIZE, baked=self.arrays, open=open)
+        return HierarchicalPlanner(grid, CLUSTER_SIZE, open=open)
+
+
+def bake(path, scale, cache_dir=CACHE_DIR):
+    # Compile path into a fresh cache folder and drop stale ones for the same map and scale
+    meta, layers = read_tmx(path)
+    meta["scale"] = scale
+    meta["source"] = path
+    meta["hash"] = source_hash(path)
+    meta["cluster_size"] = CLUSTER_SIZE
+    meta["format"] = FORMAT_VERSION
+
+    arrays = {}
+    for name, tiles in layers.items():
+        arrays["layer_" + name] = np.ascontiguousarray(np.flipud(tiles))
+    if "Walls" in layers:
+        walls = np.flipud((layers["Walls"] & GID_MASK) != 0).astype(np.uint8)
+    else:
+        walls = np.zeros((meta["rows"], meta["cols"]), dtype=np.uint8)
+    arrays["walls"] = np.ascontiguousarray(walls)
+    grid = WallGrid(walls.copy(), meta["tile_width"] * scale)
+    arrays.update(HierarchicalPlanner(grid, CLUSTER_SIZE).export())
+
+    os.makedirs(cache_dir, exist_ok=True)
+    prefix = cache_prefix(path, scale)
+    folder = os.path.join(cache_dir, prefix + meta["hash"])
+    staging = folder + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, name + ".npy"), array)
+    with open(os.path.join(staging, "meta.json"), "w") as file:
+        json.dump(meta, file, indent=1)
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(staging, folder)
+
+    for entry in os.listdir(cache_dir):
+        if entry.startswith(prefix) and os.path.join(cache_dir, entry) != folder:
+            shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+    return folder
+
+
+def load_map(path, scale, cache_dir=CACHE_DIR, rebuild=False):
+    # Baked form of a .tmx, compiling it first if there is no cache for the
+    # current source hash and scale
+    folder = os.path.join(cache_dir, cache_prefix(path, scale) + source_hash(path))
+    if rebuild or not os.path.exists(os.path.join(folder, "meta.json")):
+        folder = bake(path, scale, cache_dir)
+    return open_baked(folder)
+
+
+def open_baked(folder):
+    # Memory-map an existing cache folder (e.g. from a worker process)
+    with open(os.path.join(folder, "meta.json")) as file:
+        meta = json.load(file)
+    arrays = {}
+    for entry in os.listdir(folder):
+        if entry.endswith(".npy"):
+            arrays[entry[:-4]] = np.load(os.path.join(folder, entry), mmap_mode="r")
+    return BakedMap(folder, meta, arrays)
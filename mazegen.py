@@ -0,0 +1,278 @@
+import random
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from chunks import FLIPPED_HORIZONTALLY, FLIPPED_VERTICALLY, FLIPPED_DIAGONALLY
+from pathfinding import GridSearch
+from wallgrid import WallGrid
+
+MAZE_CELLS = 8  # Maze cells along each side of a chunk
+PITCH = 4  # One wall line plus a three tile corridor
+CHUNK_SIZE = MAZE_CELLS * PITCH  # Tiles along each side of a chunk
+
+# Blind Maze Tileset ids, as used by the shipped maps
+WALL_TILE = 1
+CORNER_TILE = 2
+# Flip flags that turn the rounded corner towards the two open sides
+CORNER_FLAGS = {
+    ("E", "S"): 0,
+    ("N", "W"): FLIPPED_HORIZONTALLY | FLIPPED_VERTICALLY,
+    ("N", "E"): FLIPPED_VERTICALLY | FLIPPED_DIAGONALLY,
+    ("S", "W"): FLIPPED_HORIZONTALLY | FLIPPED_DIAGONALLY,
+}
+
+# braid: chance each leftover inner wall is knocked through (loops)
+# doors: chance of each extra door on a chunk border (one is always there)
+# boxes: chance a corridor cell gets a box in one corner
+BIOMES = {
+    "central": {"braid": 0.1, "doors": 0.3, "boxes": 0.0},
+    "dense": {"braid": 0.0, "doors": 0.15, "boxes": 0.0},
+    "jagged": {"braid": 0.05, "doors": 0.25, "boxes": 0.15},
+    "shifting": {"braid": 0.2, "doors": 0.3, "boxes": 0.0},
+    "open": {"braid": 0.35, "doors": 0.5, "boxes": 0.3},
+}
+
+MASK = (1 << 64) - 1
+
+
+def mix(seed, *keys):
+    # Stable 64-bit hash of a seed and chunk coordinates (same in every process)
+    value = seed & MASK
+    for key in keys:
+        value = ((value ^ (key & MASK)) * 0x9E3779B97F4A7C15) & MASK
+        value ^= value >> 31
+    return value
+
+
+def biome_of(cx, cy):
+    # Central area around the origin, then one biome per quadrant like plan.txt
+    if abs(cx) <= 1 and abs(cy) <= 1:
+        return "central"
+    if abs(cy) >= abs(cx):
+        return "dense" if cy > 0 else "open"
+    return "jagged" if cx < 0 else "shifting"
+
+
+def border_doors(seed, side, cx, cy):
+    # Maze cells with a door in the west (side 0) or south (side 1) wall line
+    # of chunk (cx, cy). The neighbour on the other side asks the same question.
+    rng = random.Random(mix(seed, 1 + side, cx, cy))
+    chance = BIOMES[biome_of(cx, cy)]["doors"]
+    first = rng.randrange(MAZE_CELLS)
+    return [i for i in range(MAZE_CELLS) if i == first or rng.random() < chance]
+
+
+class MazeChunk:
+    # One generated chunk: Tiled-style gids and the wall occupancy (both row 0
+    # at the bottom, like a baked map), plus its nav summary: one entrance
+    # cell per border door and the walking cost between every pair of them.
+    def __init__(self, seed, cx, cy, biome, tiles, walls, entrances, entrance_costs):
+        self.seed = seed
+        self.cx = cx
+        self.cy = cy
+        self.biome = biome
+        self.tiles = tiles
+        self.walls = walls
+        self.entrances = entrances  # (n, 2) local (col, row)
+        self.entrance_costs = entrance_costs  # (n, n), inf when unreachable
+
+    @property
+    def origin(self):
+        # World cell of the chunk's bottom left tile
+        return self.cx * CHUNK_SIZE, self.cy * CHUNK_SIZE
+
+    def grid(self, cell_size):
+        return WallGrid(self.walls.copy(), cell_size)
+
+
+def generate_chunk(seed, cx, cy):
+    # Deterministic for (seed, cx, cy); runs in worker processes
+    biome = biome_of(cx, cy)
+    params = BIOMES[biome]
+    rng = random.Random(mix(seed, 0, cx, cy))
+    size = CHUNK_SIZE
+
+    # Every tile on a wall line is wall, everything between is corridor
+    lines = np.arange(size) % PITCH == 0
+    walls = (lines[:, None] | lines[None, :]).astype(np.uint8)
+
+    def open_east(i, j):
+        walls[j * PITCH + 1:(j + 1) * PITCH, (i + 1) * PITCH] = 0
+
+    def open_north(i, j):
+        walls[(j + 1) * PITCH, i * PITCH + 1:(i + 1) * PITCH] = 0
+
+    # Spanning tree over the maze cells (iterative backtracker)
+    visited = np.zeros((MAZE_CELLS, MAZE_CELLS), dtype=bool)
+    start = (rng.randrange(MAZE_CELLS), rng.randrange(MAZE_CELLS))
+    visited[start[1], start[0]] = True
+    stack = [start]
+    opened = set()
+    while stack:
+        i, j = stack[-1]
+        options = [(i + di, j + dj) for di, dj in ((1, 0), (-1, 0), (0, 1), (0, -1))
+                   if 0 <= i + di < MAZE_CELLS and 0 <= j + dj < MAZE_CELLS and not visited[j + dj, i + di]]
+        if not options:
+            stack.pop()
+            continue
+        ni, nj = rng.choice(options)
+        visited[nj, ni] = True
+        opened.add((min(i, ni), min(j, nj), ni != i))
+        stack.append((ni, nj))
+    # Knock through some of the remaining inner walls to make loops
+    for j in range(MAZE_CELLS):
+        for i in range(MAZE_CELLS):
+            for east in (True, False):
+                if (i, j, east) in opened or (east and i == MAZE_CELLS - 1) or (not east and j == MAZE_CELLS - 1):
+                    continue
+                if rng.random() < params["braid"]:
+                    opened.add((i, j, east))
+    for i, j, east in opened:
+        if east:
+            open_east(i, j)
+        else:
+            open_north(i, j)
+
+    # Doors in this chunk's own west and south wall lines
+    for j in border_doors(seed, 0, cx, cy):
+        walls[j * PITCH + 1:(j + 1) * PITCH, 0] = 0
+    for i in border_doors(seed, 1, cx, cy):
+        walls[0, i * PITCH + 1:(i + 1) * PITCH] = 0
+
+    # Boxes in a corner of some corridor cells; a corridor never loses more than one lane
+    for j in range(MAZE_CELLS):
+        for i in range(MAZE_CELLS):
+            if params["boxes"] and rng.random() < params["boxes"]:
+                col = i * PITCH + rng.choice((1, PITCH - 1))
+                row = j * PITCH + rng.choice((1, PITCH - 1))
+                walls[row, col] = 1
+
+    entrances = _entrances(seed, cx, cy)
+    return MazeChunk(seed, cx, cy, biome, decorate(walls), walls, entrances, _entrance_costs(walls, entrances))
+
+
+def _entrances(seed, cx, cy):
+    # Middle cell of every door on the chunk's border, on this chunk's side
+    middle = PITCH // 2
+    last = CHUNK_SIZE - 1
+    cells = [(0, j * PITCH + middle) for j in border_doors(seed, 0, cx, cy)]
+    cells += [(i * PITCH + middle, 0) for i in border_doors(seed, 1, cx, cy)]
+    cells += [(last, j * PITCH + middle) for j in border_doors(seed, 0, cx + 1, cy)]
+    cells += [(i * PITCH + middle, last) for i in border_doors(seed, 1, cx, cy + 1)]
+    return np.array(cells, dtype=np.int32).reshape(-1, 2)
+
+
+def _entrance_costs(walls, entrances):
+    search = GridSearch(WallGrid(walls, 1))
+    cells = [tuple(int(value) for value in cell) for cell in entrances]
+    costs = np.full((len(cells), len(cells)), np.inf, dtype=np.float32)
+    # Costs are symmetric, so each search only has to reach the later entrances
+    for a, start in enumerate(cells):
+        costs[a, a] = 0
+        reached = search.dijkstra(start, targets=cells[a + 1:])
+        for b in range(a + 1, len(cells)):
+            if cells[b] in reached:
+                costs[a, b] = costs[b, a] = reached[cells[b]]
+    return costs
+
+
+def decorate(walls):
+    # Gids for a wall grid: plain wall tiles, with the rounded corner tile on
+    # walls open on exactly two adjacent sides. Outside the chunk counts as wall.
+    padded = np.ones((walls.shape[0] + 2, walls.shape[1] + 2), dtype=bool)
+    padded[1:-1, 1:-1] = walls != 0
+    wall = padded[1:-1, 1:-1]
+    open_sides = {
+        "N": ~padded[2:, 1:-1],
+        "S": ~padded[:-2, 1:-1],
+        "E": ~padded[1:-1, 2:],
+        "W": ~padded[1:-1, :-2],
+    }
+    tiles = np.where(wall, WALL_TILE, 0).astype(np.uint32)
+    for sides, flags in CORNER_FLAGS.items():
+        mask = wall.copy()
+        for side, is_open in open_sides.items():
+            mask &= is_open if side in sides else ~is_open
+        tiles[mask] = CORNER_TILE | flags
+    return tiles
+
+
+class ChunkGenerator:
+    # Generates maze chunks for an endless map on a process pool, ahead of
+    # the player. request() and poll() never wait on a worker, so the frame
+    # loop is never stalled; finished chunks are picked up by poll() and read
+    # with get(). The same seed always gives the same chunks whatever order
+    # they are made in. workers=0 generates inline (headless tools only).
+    def __init__(self, seed, workers=None, max_ready=256):
+        self.seed = seed
+        self.pool = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+        self.max_ready = max_ready
+        self.pending = {}  # (cx, cy) -> Future
+        self.ready = OrderedDict()  # (cx, cy) -> MazeChunk, least recently used first
+        # Counters
+        self.requested = 0
+        self.generated = 0
+
+    def request(self, cx, cy):
+        key = (cx, cy)
+        if key in self.ready or key in self.pending:
+            return
+        self.requested += 1
+        if self.pool is None:
+            self._store(key, generate_chunk(self.seed, cx, cy))
+        else:
+            self.pending[key] = self.pool.submit(generate_chunk, self.seed, cx, cy)
+
+    def request_around(self, cx, cy, radius=2):
+        # Every chunk within radius of (cx, cy), nearest first
+        keys = [(cx + dx, cy + dy) for dy in range(-radius, radius + 1) for dx in range(-radius, radius + 1)]
+        keys.sort(key=lambda key: max(abs(key[0] - cx), abs(key[1] - cy)))
+        for key in keys:
+            self.request(*key)
+
+    def poll(self):
+        # Collect whatever the workers have finished; returns the new keys
+        done = [key for key, future in self.pending.items() if future.done()]
+        for key in done:
+            self._store(key, self.pending.pop(key).result())
+        return done
+
+    def _store(self, key, chunk):
+        self.ready[key] = chunk
+        self.generated += 1
+        while len(self.ready) > self.max_ready:
+            self.ready.popitem(last=False)
+
+    def get(self, cx, cy):
+        # The chunk if it is ready, else None (and it is requested)
+        chunk = self.ready.get((cx, cy))
+        if chunk is None:
+            self.request(cx, cy)
+            return None
+        self.ready.move_to_end((cx, cy))
+        return chunk
+
+    def close(self):
+        if self.pool is not None:
+            for future in self.pending.values():
+                future.cancel()
+            self.pool.shutdown(wait=False)
+            self.pool = None
+        self.pending.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def stats(self):
+        return {
+            "requested": self.requested,
+            "generated": self.generated,
+            "pending": len(self.pending),
+            "ready": len(self.ready),
+        }
@@ -0,0 +1,119 @@
+import numpy as np
+
+
+class ParticlePool:
+    # Struct-of-arrays storage for short-lived particles: one preallocated
+    # array per field, indexed by slot. Free slots sit on a stack, so spawning
+    # and retiring cost O(1) per particle and the arrays are only reallocated
+    # when a spawn finds the pool full (capacity then doubles). Slots at or
+    # above high are all free, so batch updates only need to look at [:high];
+    # dead slots below it are masked out with alive.
+    # fields maps a name to a dtype, or to (dtype, width) for a row per slot.
+    def __init__(self, fields, capacity=256):
+        self.fields = dict(fields)
+        self.capacity = 0
+        self.alive = np.zeros(0, dtype=bool)
+        self._free = np.zeros(0, dtype=np.int64)  # Stack of free slots, top at _free_count - 1
+        self._free_count = 0
+        self.high = 0  # One past the highest slot in use
+        for name, dtype in self.fields.items():
+            setattr(self, name, np.zeros(self._shape(dtype, 0), dtype=self._dtype(dtype)))
+        # Counters
+        self.spawned = 0
+        self.retired = 0
+        self.grows = 0
+        self.reserve(capacity)
+
+    @staticmethod
+    def _dtype(spec):
+        return spec[0] if isinstance(spec, tuple) else spec
+
+    @staticmethod
+    def _shape(spec, length):
+        return (length, spec[1]) if isinstance(spec, tuple) else length
+
+    def __len__(self):
+        return self.capacity - self._free_count
+
+    def reserve(self, capacity):
+        # Make room for capacity particles in all, doubling rather than
+        # growing to fit so a run of spawns reallocates only a few times
+        if capacity <= self.capacity:
+            return
+        old = self.capacity
+        new = max(capacity, old * 2)
+        for name, spec in self.fields.items():
+            array = np.zeros(self._shape(spec, new), dtype=self._dtype(spec))
+            array[:old] = getattr(self, name)
+            setattr(self, name, array)
+        alive = np.zeros(new, dtype=bool)
+        alive[:old] = self.alive
+        self.alive = alive
+        # New slots go under the existing free ones, lowest on top
+        free = np.empty(new, dtype=np.int64)
+        free[:new - old] = np.arange(new - 1, old - 1, -1)
+        free[new - old:new - old + self._free_count] = self._free[:self._free_count]
+        self._free = free
+        self._free_count += new - old
+        self.capacity = new
+        if old:
+            self.grows += 1
+
+    def spawn(self, count):
+        # Claim count free slots and mark them alive; returns the slots.
+        # Fields keep whatever the slots held last, so set every one.
+        if count > self._free_count:
+            self.reserve(len(self) + count)
+        top = self._free_count
+        slots = self._free[top - count:top][::-1].copy()
+        self._free_count = top - count
+        self.alive[slots] = True
+        if count:
+            self.high = max(self.high, int(slots.max()) + 1)
+        self.spawned += count
+        return slots
+
+    def retire(self, slots):
+        # Give slots back to the pool; the most recently freed are reused first
+        slots = np.asarray(slots, dtype=np.int64)
+        count = len(slots)
+        if not count:
+            return
+        self.alive[slots] = False
+        self._free[self._free_count:self._free_count + count] = slots
+        self._free_count += count
+        self.retired += count
+        if self._free_count == self.capacity:
+            self.high = 0
+        elif not self.alive[self.high - 1]:
+            self._lower_high()
+
+    def _lower_high(self):
+        # The top slot was just freed: walk high down a block at a time to
+        # the next live slot. Each slot is passed over once per time high
+        # rose past it, so this is O(1) amortised per spawn.
+        high = self.high
+        while high:
+            start = max(high - 256, 0)
+            live = np.flatnonzero(self.alive[start:high])
+            if len(live):
+                high = start + int(live[-1]) + 1
+                break
+            high = start
+        self.high = high
+
+    def live_slots(self):
+        return np.flatnonzero(self.alive[:self.high])
+
+    def clear(self):
+        self.retire(self.live_slots())
+
+    def stats(self):
+        return {
+            "live": len(self),
+            "capacity": self.capacity,
+            "high": self.high,
+            "spawned": self.spawned,
+            "retired": self.retired,
+            "grows": self.grows,
+        }
@@ -0,0 +1,390 @@
+import heapq
+import math
+import time
+
+import numpy as np
+
+SQRT2 = math.sqrt(2)
+# (dcol, drow, cost); diagonals may not cut wall corners
+NEIGHBOURS = ((1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+              (1, 1, SQRT2), (1, -1, SQRT2), (-1, 1, SQRT2), (-1, -1, SQRT2))
+# Border segments at least this long get an entrance at each end instead of one in the middle
+MAX_ENTRANCE_WIDTH = 6
+
+
+def octile(a, b):
+    dx = abs(a[0] - b[0])
+    dy = abs(a[1] - b[1])
+    return max(dx, dy) + (SQRT2 - 1) * min(dx, dy)
+
+
+class GridSearch:
+    # Plain 8-connected A* / Dijkstra over a WallGrid, optionally limited to a
+    # rectangle of cells. Used on its own as the full-grid baseline and by the
+    # hierarchical planner for cluster-local searches. open is an optional
+    # buffer of one byte per cell, 1 where open (a worker's view of shared
+    # memory): it is read as is and kept up to date by whoever owns it.
+    def __init__(self, grid, open=None):
+        self.grid = grid
+        self.cols = grid.cols
+        self.rows = grid.rows
+        if open is not None:
+            self.open = open
+            return
+        # Flat bytearray indexing is much faster than numpy scalar access
+        self.open = bytearray((grid.cells == 0).ravel().tobytes())
+        grid.subscribe(self.on_edit)
+
+    def on_edit(self, col, row, blocked):
+        self.open[row * self.cols + col] = 0 if blocked else 1
+
+    def is_open(self, col, row):
+        return 0 <= col < self.cols and 0 <= row < self.rows and self.open[row * self.cols + col] == 1
+
+    def _neighbours(self, col, row, bounds):
+        col0, row0, col1, row1 = bounds
+        is_open = self.open
+        cols = self.cols
+        for dcol, drow, cost in NEIGHBOURS:
+            ncol = col + dcol
+            nrow = row + drow
+            if ncol < col0 or ncol > col1 or nrow < row0 or nrow > row1:
+                continue
+            if not is_open[nrow * cols + ncol]:
+                continue
+            if dcol and drow and not (is_open[row * cols + ncol] and is_open[nrow * cols + col]):
+                continue
+            yield ncol, nrow, cost
+
+    def bounds(self):
+        return 0, 0, self.cols - 1, self.rows - 1
+
+    def astar(self, start, goal, bounds=None):
+        # List of (col, row) cells from start to goal inclusive, or None
+        bounds = bounds or self.bounds()
+        if not (self.is_open(*start) and self.is_open(*goal)):
+            return None
+        came_from = {start: None}
+        cost_so_far = {start: 0.0}
+        frontier = [(octile(start, goal), 0.0, start)]
+        self.expanded = 0
+        while frontier:
+            _, cost, cell = heapq.heappop(frontier)
+            if cell == goal:
+                return self._walk_back(came_from, goal)
+            if cost > cost_so_far[cell]:
+                continue
+            self.expanded += 1
+            for ncol, nrow, step in self._neighbours(cell[0], cell[1], bounds):
+                new_cost = cost + step
+                neighbour = (ncol, nrow)
+                if new_cost < cost_so_far.get(neighbour, math.inf):
+                    cost_so_far[neighbour] = new_cost
+                    came_from[neighbour] = cell
+                    heapq.heappush(frontier, (new_cost + octile(neighbour, goal), new_cost, neighbour))
+        return None
+
+    def dijkstra(self, start, bounds=None, targets=None):
+        # Costs from start to every reachable cell in bounds; stops early once
+        # every cell in targets has been settled
+        bounds = bounds or self.bounds()
+        cost_so_far = {start: 0.0}
+        remaining = set(targets) if targets is not None else None
+        if remaining is not None:
+            remaining.discard(start)
+        frontier = [(0.0, start)]
+        while frontier:
+            cost, cell = heapq.heappop(frontier)
+            if cost > cost_so_far[cell]:
+                continue
+            if remaining is not None:
+                remaining.discard(cell)
+                if not remaining:
+                    break
+            for ncol, nrow, step in self._neighbours(cell[0], cell[1], bounds):
+                new_cost = cost + step
+                neighbour = (ncol, nrow)
+                if new_cost < cost_so_far.get(neighbour, math.inf):
+                    cost_so_far[neighbour] = new_cost
+                    heapq.heappush(frontier, (new_cost, neighbour))
+        return cost_so_far
+
+    @staticmethod
+    def _walk_back(came_from, cell):
+        path = []
+        while cell is not None:
+            path.append(cell)
+            cell = came_from[cell]
+        path.reverse()
+        return path
+
+
+class HierarchicalPlanner:
+    # HPA* over a WallGrid. At load the map is cut into cluster_size square
+    # clusters; entrances are placed along shared open borders and the cost
+    # between every pair of entrances inside a cluster is precomputed. A query
+    # searches that small abstract graph, then refines only the clusters on
+    # the abstract path with cluster-local A*. Wall edits only rebuild the
+    # cluster they land in (and the neighbours sharing an edited border).
+    # open is passed on to the GridSearch.
+    def __init__(self, grid, cluster_size=16, baked=None, open=None):
+        self.grid = grid
+        self.search = GridSearch(grid, open)
+        self.cluster_size = cluster_size
+        self.clusters_x = math.ceil(grid.cols / cluster_size)
+        self.clusters_y = math.ceil(grid.rows / cluster_size)
+        self.nodes = {}  # cell -> dict of neighbour cell -> cost
+        self.cluster_nodes = {}  # cluster -> list of entrance cells
+        self.borders = {}  # (cluster, right or top neighbour) -> list of (cell, cell) transitions
+        self._node_refs = {}  # cell -> number of transitions using it
+        self._refined = {}  # (cell, cell) -> cluster-local path
+        self.edits = 0
+        self.last_edit_ms = 0.0
+        self.last_edit_clusters = 0
+        if baked is not None:
+            self.restore(baked)
+        else:
+            self.build()
+        grid.subscribe(self.on_edit)
+
+    def cluster_of(self, cell):
+        return cell[0] // self.cluster_size, cell[1] // self.cluster_size
+
+    def cluster_bounds(self, cluster):
+        size = self.cluster_size
+        col0 = cluster[0] * size
+        row0 = cluster[1] * size
+        return col0, row0, min(col0 + size, self.grid.cols) - 1, min(row0 + size, self.grid.rows) - 1
+
+    def build(self):
+        self.nodes.clear()
+        self.cluster_nodes.clear()
+        self.borders.clear()
+        self._node_refs.clear()
+        self._refined.clear()
+        for cy in range(self.clusters_y):
+            for cx in range(self.clusters_x):
+                if cx + 1 < self.clusters_x:
+                    self._build_border((cx, cy), (cx + 1, cy))
+                if cy + 1 < self.clusters_y:
+                    self._build_border((cx, cy), (cx, cy + 1))
+        for cluster in list(self.cluster_nodes):
+            self._link_cluster(cluster)
+
+    def export(self):
+        # Abstract graph as flat arrays, for the baked map cache
+        cells = list(self.nodes)
+        index = {cell: i for i, cell in enumerate(cells)}
+        edges = [(index[a], index[b], cost) for a, neighbours in self.nodes.items()
+                 for b, cost in neighbours.items() if index[a] < index[b]]
+        borders = list(self.borders.items())
+        transitions = [(i, index[a], index[b]) for i, (_, pairs) in enumerate(borders) for a, b in pairs]
+        return {
+            "nav_nodes": np.array(cells, dtype=np.int32).reshape(-1, 2),
+            "nav_refs": np.array([self._node_refs[cell] for cell in cells], dtype=np.int32),
+            "nav_edges": np.array([edge[:2] for edge in edges], dtype=np.int32).reshape(-1, 2),
+            "nav_costs": np.array([edge[2] for edge in edges], dtype=np.float64),
+            "nav_borders": np.array([low + high for (low, high), _ in borders], dtype=np.int32).reshape(-1, 4),
+            "nav_transitions": np.array(transitions, dtype=np.int32).reshape(-1, 3),
+        }
+
+    def restore(self, data):
+        # Inverse of export()
+        self.nodes.clear()
+        self.cluster_nodes.clear()
+        self.borders.clear()
+        self._node_refs.clear()
+        self._refined.clear()
+        cells = [(int(col), int(row)) for col, row in data["nav_nodes"]]
+        for cell, refs in zip(cells, data["nav_refs"]):
+            self.nodes[cell] = {}
+            self.cluster_nodes.setdefault(self.cluster_of(cell), []).append(cell)
+            self._node_refs[cell] = int(refs)
+        for (a, b), cost in zip(data["nav_edges"], data["nav_costs"]):
+            self.nodes[cells[a]][cells[b]] = float(cost)
+            self.nodes[cells[b]][cells[a]] = float(cost)
+        borders = [((int(b[0]), int(b[1])), (int(b[2]), int(b[3]))) for b in data["nav_borders"]]
+        for key in borders:
+            self.borders[key] = []
+        for border, a, b in data["nav_transitions"]:
+            self.borders[borders[border]].append((cells[a], cells[b]))
+
+    def on_edit(self, col, row, blocked):
+        # Rebuild the edited cluster, plus any border the cell sits on
+        begin = time.perf_counter()
+        cluster = self.cluster_of((col, row))
+        col0, row0, col1, row1 = self.cluster_bounds(cluster)
+        cx, cy = cluster
+        affected = {cluster}
+        touching = []
+        if col == col0 and cx > 0:
+            touching.append(((cx - 1, cy), cluster))
+        if col == col1 and cx + 1 < self.clusters_x:
+            touching.append((cluster, (cx + 1, cy)))
+        if row == row0 and cy > 0:
+            touching.append(((cx, cy - 1), cluster))
+        if row == row1 and cy + 1 < self.clusters_y:
+            touching.append((cluster, (cx, cy + 1)))
+        for low, high in touching:
+            self._clear_border(low, high)
+            self._build_border(low, high)
+            affected.update((low, high))
+        for each in affected:
+            self._unlink_cluster(each)
+            self._link_cluster(each)
+        self._refined = {key: path for key, path in self._refined.items()
+                         if self.cluster_of(key[0]) not in affected}
+        self.edits += 1
+        self.last_edit_clusters = len(affected)
+        self.last_edit_ms = (time.perf_counter() - begin) * 1000
+
+    def _add_node(self, cell):
+        if cell not in self.nodes:
+            self.nodes[cell] = {}
+            self.cluster_nodes.setdefault(self.cluster_of(cell), []).append(cell)
+        self._node_refs[cell] = self._node_refs.get(cell, 0) + 1
+
+    def _release_node(self, cell):
+        self._node_refs[cell] -= 1
+        if self._node_refs[cell]:
+            return
+        del self._node_refs[cell]
+        for neighbour in self.nodes.pop(cell):
+            self.nodes[neighbour].pop(cell, None)
+        self.cluster_nodes[self.cluster_of(cell)].remove(cell)
+
+    def _border_pairs(self, low, high):
+        col0, row0, col1, row1 = self.cluster_bounds(low)
+        if high[0] > low[0]:
+            return [((col1, row), (col1 + 1, row)) for row in range(row0, row1 + 1)]
+        return [((col, row1), (col, row1 + 1)) for col in range(col0, col1 + 1)]
+
+    def _build_border(self, low, high):
+        # One transition in the middle of each short open segment, one at each end of long ones
+        is_open = self.search.is_open
+        transitions = []
+        segment = []
+        for a, b in self._border_pairs(low, high) + [(None, None)]:
+            if a is not None and is_open(*a) and is_open(*b):
+                segment.append((a, b))
+                continue
+            if segment:
+                if len(segment) < MAX_ENTRANCE_WIDTH:
+                    transitions.append(segment[len(segment) // 2])
+                else:
+                    transitions.extend((segment[0], segment[-1]))
+                segment = []
+        for a, b in transitions:
+            self._add_node(a)
+            self._add_node(b)
+            self.nodes[a][b] = 1.0
+            self.nodes[b][a] = 1.0
+        self.borders[(low, high)] = transitions
+
+    def _clear_border(self, low, high):
+        for a, b in self.borders.pop((low, high), []):
+            self.nodes[a].pop(b, None)
+            self.nodes[b].pop(a, None)
+            self._release_node(a)
+            self._release_node(b)
+
+    def _unlink_cluster(self, cluster):
+        for cell in self.cluster_nodes.get(cluster, []):
+            edges = self.nodes[cell]
+            for other in [other for other in edges if self.cluster_of(other) == cluster]:
+                del edges[other]
+
+    def _link_cluster(self, cluster):
+        # Intra-cluster edges between every pair of entrances that connect
+        cells = self.cluster_nodes.get(cluster, [])
+        bounds = self.cluster_bounds(cluster)
+        for i, cell in enumerate(cells):
+            others = cells[i + 1:]
+            if not others:
+                break
+            costs = self.search.dijkstra(cell, bounds, targets=others)
+            for other in others:
+                cost = costs.get(other)
+                if cost is not None:
+                    self.nodes[cell][other] = cost
+                    self.nodes[other][cell] = cost
+
+    def _connect(self, cell):
+        # Temporary edges from an arbitrary cell to the entrances of its cluster
+        cluster = self.cluster_of(cell)
+        entrances = self.cluster_nodes.get(cluster, [])
+        if cell in self.nodes:
+            return {cell: 0.0}
+        costs = self.search.dijkstra(cell, self.cluster_bounds(cluster), targets=entrances)
+        return {node: costs[node] for node in entrances if node in costs}
+
+    def find_path(self, start, goal):
+        # List of (col, row) cells from start to goal inclusive, or None
+        search = self.search
+        if not (search.is_open(*start) and search.is_open(*goal)):
+            return None
+        if start == goal:
+            return [start]
+        if self.cluster_of(start) == self.cluster_of(goal):
+            path = search.astar(start, goal, self.cluster_bounds(self.cluster_of(start)))
+            if path:
+                return path
+
+        abstract = self._abstract_path(start, goal)
+        if abstract is None:
+            return None
+        return self._refine(abstract)
+
+    def _abstract_path(self, start, goal):
+        start_edges = self._connect(start)
+        goal_edges = self._connect(goal)
+        if not start_edges or not goal_edges:
+            return None
+        came_from = {start: None}
+        cost_so_far = {start: 0.0}
+        frontier = [(octile(start, goal), 0.0, start)]
+        while frontier:
+            _, cost, cell = heapq.heappop(frontier)
+            if cell == goal:
+                return GridSearch._walk_back(came_from, goal)
+            if cost > cost_so_far[cell]:
+                continue
+            if cell in self.nodes:
+                edges = list(self.nodes[cell].items())
+            else:
+                edges = list(start_edges.items())
+            if cell in goal_edges:
+                edges.append((goal, goal_edges[cell]))
+            for neighbour, step in edges:
+                new_cost = cost + step
+                if new_cost < cost_so_far.get(neighbour, math.inf):
+                    cost_so_far[neighbour] = new_cost
+                    came_from[neighbour] = cell
+                    heapq.heappush(frontier, (new_cost + octile(neighbour, goal), new_cost, neighbour))
+        return None
+
+    def _refine(self, abstract):
+        path = [abstract[0]]
+        for a, b in zip(abstract, abstract[1:]):
+            if a == b:
+                continue
+            if self.cluster_of(a) != self.cluster_of(b):
+                # Transition across a cluster border
+                path.append(b)
+                continue
+            key = (a, b)
+            segment = self._refined.get(key)
+            if segment is None:
+                segment = self.search.astar(a, b, self.cluster_bounds(self.cluster_of(a)))
+                if a in self.nodes and b in self.nodes:
+                    self._refined[key] = segment
+            path.extend(segment[1:])
+        return path
+
+    def find_path_world(self, start, goal):
+        # Same as arcade.astar_calculate_path: world points from start to goal, or None
+        grid = self.grid
+        path = self.find_path(grid.cell_at(*start), grid.cell_at(*goal))
+        if path is None:
+            return None
+        return [grid.cell_center(col, row) for col, row in path]
@@ -0,0 +1,165 @@
+import time
+from collections import OrderedDict, deque
+
+
+class PathScheduler:
+    # Shares one planner between every enemy. Paths are cached by
+    # (start cell, goal cell, nav version); an agent only replans when its goal
+    # cell moves or its path is invalidated, and queued searches are spread
+    # across frames under a fixed per-frame millisecond budget. When walls
+    # change, an agent's path is kept if no edit touches it, otherwise only
+    # the broken stretch is replanned and spliced back in.
+    def __init__(self, planner, budget_ms=2.0, cache_size=512, clock=time.perf_counter):
+        self.planner = planner
+        self.grid = planner.grid
+        self.budget = budget_ms / 1000
+        self.cache_size = cache_size
+        self.clock = clock
+        self.cache = OrderedDict()  # (start, goal, version) -> (cell path, world path), or None
+        self.queue = deque()  # agents waiting for a search, oldest first
+        self.pending = {}  # agent -> (start, goal, version) it is waiting on
+        self.paths = {}  # agent -> (goal, version, cell path, world path)
+        # Counters
+        self.requests = 0
+        self.cache_hits = 0
+        self.searches = 0
+        self.overruns = 0
+        self.max_queue_depth = 0
+        self.last_frame_ms = 0.0
+        self.repairs = 0
+        self.last_repair_ms = 0.0
+
+    @property
+    def nav_version(self):
+        return getattr(self.grid, "version", 0)
+
+    @property
+    def queue_depth(self):
+        return len(self.queue)
+
+    def request(self, agent, start, goal):
+        # Returns the best path the agent has right now (possibly the previous
+        # one while a new search is queued), as a list of world points or None
+        self.requests += 1
+        version = self.nav_version
+        current = self.paths.get(agent)
+        if current is not None and current[0] == goal:
+            if current[1] == version:
+                return current[3]
+            cells = self._repair(current[2], current[1])
+            if cells is not None:
+                world = self._to_world(cells)
+                self.paths[agent] = (goal, version, cells, world)
+                self.pending.pop(agent, None)
+                return world
+
+        key = (start, goal, version)
+        if key in self.cache:
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+            cells, world = self.cache[key] or (None, None)
+            self.paths[agent] = (goal, version, cells, world)
+            self.pending.pop(agent, None)
+            return world
+
+        if agent not in self.pending:
+            self.queue.append(agent)
+            self.max_queue_depth = max(self.max_queue_depth, len(self.queue))
+        # A newer request replaces whatever the agent was waiting on
+        self.pending[agent] = key
+        return current[3] if current is not None else None
+
+    def invalidate(self, agent=None):
+        # Forget an agent's path (or everyone's) so the next request replans
+        if agent is None:
+            self.paths.clear()
+        else:
+            self.paths.pop(agent, None)
+
+    def remove(self, agent):
+        self.paths.pop(agent, None)
+        self.pending.pop(agent, None)
+
+    def run(self):
+        # Work through queued searches until this frame's budget is spent.
+        # At least one search runs per frame so the queue always drains.
+        begin = self.clock()
+        while self.queue:
+            agent = self.queue.popleft()
+            key = self.pending.pop(agent, None)
+            if key is None:
+                continue
+            start, goal, version = key
+            if key in self.cache:
+                self.cache_hits += 1
+                entry = self.cache[key]
+            else:
+                cells = self.planner.find_path(start, goal)
+                entry = (cells, self._to_world(cells)) if cells else None
+                self.searches += 1
+                self._store(key, entry)
+            cells, world = entry or (None, None)
+            self.paths[agent] = (goal, version, cells, world)
+            if self.clock() - begin >= self.budget:
+                break
+        elapsed = self.clock() - begin
+        self.last_frame_ms = elapsed * 1000
+        if elapsed > self.budget:
+            self.overruns += 1
+
+    def _to_world(self, cells):
+        return [self.grid.cell_center(col, row) for col, row in cells]
+
+    def _repair(self, cells, version):
+        # Cell path still valid after the edits since version, with any broken
+        # stretch replanned locally, or None if it needs a full search
+        if not cells:
+            return None
+        edits = self.grid.edits_since(version)
+        if edits is None:
+            return None
+        blocked = {(col, row) for _, col, row, _ in edits if self.grid.is_wall(col, row)}
+        if not blocked:
+            # Opened cells never break an existing path
+            return cells
+        begin = self.clock()
+        broken = []
+        for i, (a, b) in enumerate(zip(cells, cells[1:])):
+            if a in blocked or b in blocked or (a[0] != b[0] and a[1] != b[1] and
+                                                ((a[0], b[1]) in blocked or (b[0], a[1]) in blocked)):
+                broken.append(i)
+        if not broken:
+            return cells
+        low = broken[0]
+        high = broken[-1] + 1
+        is_wall = self.grid.is_wall
+        while low > 0 and is_wall(*cells[low]):
+            low -= 1
+        while high < len(cells) - 1 and is_wall(*cells[high]):
+            high += 1
+        if is_wall(*cells[low]) or is_wall(*cells[high]):
+            return None
+        detour = self.planner.find_path(cells[low], cells[high])
+        self.repairs += 1
+        self.last_repair_ms = (self.clock() - begin) * 1000
+        if detour is None:
+            return None
+        return cells[:low] + detour + cells[high + 1:]
+
+    def _store(self, key, path):
+        self.cache[key] = path
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "searches": self.searches,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "overruns": self.overruns,
+            "last_frame_ms": self.last_frame_ms,
+            "repairs": self.repairs,
+            "last_repair_ms": self.last_repair_ms,
+        }
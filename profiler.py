@@ -0,0 +1,160 @@
+import csv
+import json
+import time
+
+import numpy as np
+
+# Histogram bucket edges in ms; 16.7 and 33.3 are one and two frames at 60 FPS
+BUCKETS_MS = (0, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16.7, 33.3, 50, 100, float("inf"))
+
+
+class _Stage:
+    # Reusable timer for one named stage; stages with the same name add up
+    # within a frame (e.g. several simulation ticks in one update)
+    __slots__ = ("profiler", "name", "begin")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.begin = 0
+
+    def __enter__(self):
+        self.begin = self.profiler.clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.profiler.clock() - self.begin)
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class FrameProfiler:
+    # Per-stage frame timings kept over the last window frames. Wrap each
+    # stage in `with profiler.stage(name):` between begin_frame() and
+    # end_frame(); "frame" holds the whole frame. While disabled, stage()
+    # hands back a shared no-op context and the frame calls return at once.
+    def __init__(self, window=600, enabled=True, clock=time.perf_counter):
+        self.window = window
+        self.enabled = enabled
+        self.clock = clock
+        self.frames = 0  # Frames recorded since the last reset
+        self.samples = {}  # name -> ring of ms per frame, NaN before the stage was first seen
+        self._stages = {}
+        self._current = {}
+        self._frame_begin = None
+
+    def stage(self, name):
+        if not self.enabled:
+            return NULL_STAGE
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = _Stage(self, name)
+        return stage
+
+    def add(self, name, seconds):
+        self._current[name] = self._current.get(name, 0) + seconds
+
+    def begin_frame(self):
+        if not self.enabled:
+            self._frame_begin = None
+            return
+        self._current.clear()
+        self._frame_begin = self.clock()
+
+    def end_frame(self):
+        if not self.enabled or self._frame_begin is None:
+            return
+        self._current["frame"] = self.clock() - self._frame_begin
+        self._frame_begin = None
+        slot = self.frames % self.window
+        for name in self._current:
+            if name not in self.samples:
+                self.samples[name] = np.full(self.window, np.nan)
+        for name, ring in self.samples.items():
+            ring[slot] = self._current.get(name, 0) * 1000
+        self.frames += 1
+
+    def reset(self):
+        self.frames = 0
+        self.samples.clear()
+        self._current.clear()
+        self._frame_begin = None
+
+    @property
+    def names(self):
+        # Stage names, slowest (by mean) first, with "frame" always leading
+        means = {name: self._mean(name) for name in self.samples if name != "frame"}
+        ordered = sorted(means, key=means.get, reverse=True)
+        return (["frame"] if "frame" in self.samples else []) + ordered
+
+    def recent(self, name):
+        # ms per frame for the frames still in the window, oldest first
+        ring = self.samples.get(name)
+        if ring is None:
+            return np.zeros(0)
+        count = min(self.frames, self.window)
+        if self.frames <= self.window:
+            return ring[:count]
+        slot = self.frames % self.window
+        return np.concatenate((ring[slot:], ring[:slot]))
+
+    def _valid(self, name):
+        values = self.recent(name)
+        return values[~np.isnan(values)]
+
+    def _mean(self, name):
+        values = self._valid(name)
+        return float(values.mean()) if len(values) else 0.0
+
+    def summary(self):
+        # name -> mean/p50/p95/p99/max in ms over the window
+        stats = {}
+        for name in self.names:
+            values = self._valid(name)
+            if not len(values):
+                continue
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            stats[name] = {"mean": float(values.mean()), "p50": float(p50), "p95": float(p95),
+                           "p99": float(p99), "max": float(values.max())}
+        return stats
+
+    def histogram(self, name, buckets=BUCKETS_MS):
+        # Frame counts per ms bucket over the window
+        counts, _ = np.histogram(self._valid(name), bins=buckets)
+        return counts
+
+    def export_csv(self, path):
+        # One row per frame in the window, one ms column per stage
+        names = self.names
+        columns = [self.recent(name) for name in names]
+        first = self.frames - min(self.frames, self.window)
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["frame_index"] + names)
+            for i in range(min(self.frames, self.window)):
+                writer.writerow([first + i] + ["" if np.isnan(column[i]) else f"{column[i]:.4f}" for column in columns])
+
+    def export_json(self, path):
+        data = {
+            "window": self.window,
+            "frames": self.frames,
+            "buckets_ms": list(BUCKETS_MS[:-1]) + ["inf"],
+            "summary": self.summary(),
+            "histograms": {name: self.histogram(name).tolist() for name in self.names},
+            "samples": {name: [None if np.isnan(value) else round(float(value), 4) for value in self.recent(name)]
+                        for name in self.names},
+        }
+        with open(path, "w") as file:
+            json.dump(data, file, indent=1)
@@ -0,0 +1,302 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+
+from mapcache import load_map, source_hash
+from profiler import FrameProfiler
+from simulation import Simulation, Controls, DT
+
+MAGIC = b"ECHOREC\x00"
+VERSION = 1
+AIM_STEPS = 16  # Aim is stored in 1/16 world unit steps
+CHECKPOINT_TICKS = 60  # Ticks between state digests
+MAX_RUN = 0xFFFF
+# Header: magic, version, seed, enemy count, map scale, player start, tick length
+HEADER = struct.Struct("<8sHQIdddd")
+# Records in the compressed body
+INPUT = b"I"  # One tick with new input: flags, then aim x and y when held
+RUN = b"R"  # A number of further ticks holding the same input
+CHECKPOINT = b"C"  # Tick and state digest after it
+FLAGS = struct.Struct("<B")
+AIM = struct.Struct("<ii")
+RUN_LENGTH = struct.Struct("<H")
+DIGEST = struct.Struct("<I8s")
+RECORD_SIZES = {INPUT: FLAGS.size, RUN: RUN_LENGTH.size, CHECKPOINT: DIGEST.size}  # Less any aim
+WALK = 4
+SHOUT = 8
+HAS_AIM = 16
+
+
+def new_seed():
+    return random.SystemRandom().getrandbits(63)
+
+
+def state_digest(sim):
+    # Short hash of everything a divergence would show up in: the tick,
+    # where every body is and how it is moving, and the echo waves in flight
+    player = sim.player
+    digest = hashlib.blake2b(repr((sim.tick, len(sim.echoes), player.center_x, player.center_y, player.angle,
+                                   player.change_x, player.change_y)).encode(), digest_size=8)
+    enemies = sim.enemies
+    for array in (enemies.x, enemies.y, enemies.vx, enemies.vy, enemies.mode):
+        digest.update(array[:len(enemies)].tobytes())
+    return digest.digest()
+
+
+def _quantise(value):
+    return None if value is None else round(value * AIM_STEPS)
+
+
+def _encode(controls):
+    # (flags, aim) for one tick of input, aim in AIM_STEPS units or None
+    flags = (controls.move + 1) | (WALK if controls.walk else 0) | (SHOUT if controls.shout else 0)
+    if controls.aim_x is None or controls.aim_y is None:
+        return flags, None
+    return flags | HAS_AIM, (_quantise(controls.aim_x), _quantise(controls.aim_y))
+
+
+def _decode(flags, aim):
+    aim_x, aim_y = (None, None) if aim is None else (aim[0] / AIM_STEPS, aim[1] / AIM_STEPS)
+    return Controls((flags & 3) - 1, bool(flags & WALK), bool(flags & SHOUT), aim_x, aim_y)
+
+
+class InputRecorder:
+    # Writes a session to a compact binary log as it is played: the seed and
+    # everything else Simulation was built from, then the input of every
+    # tick and a state digest every CHECKPOINT_TICKS. Input is run-length
+    # coded (ticks holding the same input cost nothing past a counter) and
+    # the body is zlib-compressed, flushed at each checkpoint so a crash
+    # still leaves a log that replays up to it. record() quantises the aim
+    # in place, so the live game steps with exactly what the replay will.
+    def __init__(self, path, map_path, scale, seed, enemy_count, player_start, dt=DT,
+                 checkpoint_ticks=CHECKPOINT_TICKS):
+        self.path = path
+        self.checkpoint_ticks = checkpoint_ticks
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, enemy_count, scale, *player_start, dt))
+        for text in (map_path, source_hash(map_path)):
+            data = text.encode()
+            self.file.write(RUN_LENGTH.pack(len(data)) + data)
+        self.compressor = zlib.compressobj(9)
+        self.last = None  # Input of the last tick written
+        self.run = 0  # Ticks since then still holding it
+        # Counters
+        self.ticks = 0
+        self.bytes_in = 0
+
+    @classmethod
+    def for_simulation(cls, path, sim, map_path, scale, seed, **kwargs):
+        return cls(path, map_path, scale, seed, len(sim.enemies),
+                   (sim.player.center_x, sim.player.center_y), sim.dt, **kwargs)
+
+    def record(self, controls):
+        # Call with the input for a tick, before Simulation.step
+        if controls.aim_x is not None and controls.aim_y is not None:
+            controls.aim_x = _quantise(controls.aim_x) / AIM_STEPS
+            controls.aim_y = _quantise(controls.aim_y) / AIM_STEPS
+        encoded = _encode(controls)
+        if encoded == self.last and self.run < MAX_RUN:
+            self.run += 1
+        else:
+            self._flush_run()
+            flags, aim = encoded
+            self._write(INPUT + FLAGS.pack(flags) + (AIM.pack(*aim) if aim is not None else b""))
+            self.last = encoded
+        self.ticks += 1
+
+    def checkpoint(self, sim):
+        # Call after Simulation.step; writes a digest every checkpoint_ticks
+        if sim.tick % self.checkpoint_ticks:
+            return
+        self._flush_run()
+        self._write(CHECKPOINT + DIGEST.pack(sim.tick, state_digest(sim)))
+        self.file.write(self.compressor.flush(zlib.Z_SYNC_FLUSH))
+        self.file.flush()
+
+    def _flush_run(self):
+        if self.run:
+            self._write(RUN + RUN_LENGTH.pack(self.run))
+            self.run = 0
+
+    def _write(self, data):
+        self.bytes_in += len(data)
+        self.file.write(self.compressor.compress(data))
+
+    def close(self):
+        if self.file.closed:
+            return
+        self._flush_run()
+        self.file.write(self.compressor.flush())
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        return {
+            "ticks": self.ticks,
+            "raw_bytes": self.bytes_in,
+            "file_bytes": self.file.tell() if not self.file.closed else os.path.getsize(self.path),
+        }
+
+
+class Recording:
+    # A recorded session read back: how to rebuild the simulation, the input
+    # as (first tick, ticks held, Controls) runs and the digests by tick
+    def __init__(self, map_path, map_hash, scale, seed, enemy_count, player_start, dt, runs, checkpoints):
+        self.map_path = map_path
+        self.map_hash = map_hash
+        self.scale = scale
+        self.seed = seed
+        self.enemy_count = enemy_count
+        self.player_start = player_start
+        self.dt = dt
+        self.runs = runs
+        self.checkpoints = checkpoints
+
+    @property
+    def ticks(self):
+        if not self.runs:
+            return 0
+        start, length, _ = self.runs[-1]
+        return start + length
+
+    def controls(self):
+        # Input for every tick in order
+        for _, length, controls in self.runs:
+            for _ in range(length):
+                yield controls
+
+    def simulation(self, grid=None, tiles=None):
+        if grid is None:
+            baked = load_map(self.map_path, self.scale)
+            grid = baked.grid()
+            tiles = baked.wall_tiles()
+        return Simulation(grid, enemy_count=self.enemy_count, seed=self.seed,
+                          player_start=self.player_start, dt=self.dt, tiles=tiles)
+
+
+def load_recording(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    magic, version, seed, enemy_count, scale, start_x, start_y, dt = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not an input recording")
+    if version != VERSION:
+        raise ValueError(f"{path} is recording version {version}, expected {VERSION}")
+    offset = HEADER.size
+    texts = []
+    for _ in range(2):
+        (length,) = RUN_LENGTH.unpack_from(data, offset)
+        offset += RUN_LENGTH.size
+        texts.append(data[offset:offset + length].decode())
+        offset += length
+    # A log cut off by a crash ends part way through a record; everything
+    # before that still replays
+    decompressor = zlib.decompressobj()
+    body = decompressor.decompress(data[offset:])
+    complete = decompressor.eof
+
+    runs = []
+    checkpoints = {}
+    tick = 0
+    offset = 0
+    while offset < len(body):
+        kind = body[offset:offset + 1]
+        offset += 1
+        if not complete and (offset + RECORD_SIZES.get(kind, 0) > len(body) or (
+                kind == INPUT and body[offset] & HAS_AIM and offset + FLAGS.size + AIM.size > len(body))):
+            break
+        if kind == INPUT:
+            (flags,) = FLAGS.unpack_from(body, offset)
+            offset += FLAGS.size
+            aim = None
+            if flags & HAS_AIM:
+                aim = AIM.unpack_from(body, offset)
+                offset += AIM.size
+            runs.append([tick, 1, _decode(flags, aim)])
+            tick += 1
+        elif kind == RUN:
+            (length,) = RUN_LENGTH.unpack_from(body, offset)
+            offset += RUN_LENGTH.size
+            runs[-1][1] += length
+            tick += length
+        elif kind == CHECKPOINT:
+            at, digest = DIGEST.unpack_from(body, offset)
+            offset += DIGEST.size
+            checkpoints[at] = digest
+        else:
+            raise ValueError(f"{path} is corrupt at body offset {offset - 1}")
+    return Recording(texts[0], texts[1], scale, seed, enemy_count, (start_x, start_y), dt,
+                     [tuple(run) for run in runs], checkpoints)
+
+
+def replay(recording, grid=None, profiler=None, ticks=None, tiles=None):
+    # Drive a fresh simulation with the recorded input as fast as it will
+    # go, checking the digests on the way. Returns the simulation and the
+    # first checkpoint tick whose state differed from the recording (None
+    # if every one matched).
+    sim = recording.simulation(grid, tiles)
+    sim.profiler = profiler
+    diverged = None
+    checkpoints = recording.checkpoints
+    limit = recording.ticks if ticks is None else min(ticks, recording.ticks)
+    for controls in recording.controls():
+        if sim.tick >= limit:
+            break
+        if profiler is not None:
+            profiler.begin_frame()
+            sim.step(controls)
+            profiler.end_frame()
+        else:
+            sim.step(controls)
+        expected = checkpoints.get(sim.tick)
+        if expected is not None and diverged is None and state_digest(sim) != expected:
+            diverged = sim.tick
+    return sim, diverged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded session headless at full speed")
+    parser.add_argument("path", help="recording written by the game")
+    parser.add_argument("--ticks", type=int, help="stop after this many ticks")
+    parser.add_argument("--profile", action="store_true", help="print per-stage tick times")
+    parser.add_argument("--output", help="write the run's results as JSON")
+    args = parser.parse_args(argv)
+
+    recording = load_recording(args.path)
+    if os.path.exists(recording.map_path) and source_hash(recording.map_path) != recording.map_hash:
+        print(f"warning: {recording.map_path} has changed since this session was recorded")
+    baked = load_map(recording.map_path, recording.scale)
+    profiler = FrameProfiler(window=max(recording.ticks, 1)) if args.profile or args.output else None
+    begin = time.perf_counter()
+    sim, diverged = replay(recording, baked.grid(), profiler, args.ticks, baked.wall_tiles())
+    elapsed = time.perf_counter() - begin
+
+    print(f"{args.path}: {recording.map_path} seed {recording.seed}, {recording.enemy_count} enemies")
+    print(f"{sim.tick} ticks ({sim.time:.1f}s of play) in {elapsed:.2f}s, {sim.tick / elapsed:.0f} ticks/s")
+    print(f"final state {state_digest(sim).hex()}, "
+          + ("matched every checkpoint" if diverged is None else f"diverged by tick {diverged}"))
+    if profiler is not None and args.profile:
+        print(f"{'stage':<14}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        for name, stats in profiler.summary().items():
+            print(f"{name:<14}{stats['p50']:>9.3f}{stats['p99']:>9.3f}{stats['max']:>9.3f}")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"recording": args.path, "ticks": sim.tick, "seconds": elapsed,
+                       "final_state": state_digest(sim).hex(), "diverged": diverged,
+                       "stages": profiler.summary()}, file, indent=1)
+    return 0 if diverged is None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
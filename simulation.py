@@ -0,0 +1,360 @@
+import math
+import random
+
+import numpy as np
+
+from echoengine import EchoEngine
+from distancefield import DistanceField
+from enemies import AGENT_CELL_SIZE, EnemyStore, ENEMY_SIZE
+from flowfield import FlowField
+from movement import MovementResolver
+from sound import SoundField, material_losses
+from spatialhash import SpatialHash
+from spawns import SpawnIndex
+from fog import FogOfWar
+
+# Fixed timestep: the game advances in TICK_RATE ticks per second whatever
+# the frame rate, and speeds below are in pixels per tick
+TICK_RATE = 60
+DT = 1 / TICK_RATE
+MAX_CATCHUP_TICKS = 5  # Most ticks one frame may run before time is dropped
+
+# Constants for the player
+PLAYER_SIZE = (55, 77.5)  # images/player.png at 0.5 scale
+RUNNING_SPEED = 4  # Used to be 2 applied twice per frame
+WALK_SPEED = 1
+SHOUT_PAUSE_TIME = 3  # Seconds a shout lasts
+SHOUT_COOL = 15  # Seconds before shout can be used again
+RUN_LOUDNESS = 16  # Cells of open floor running footsteps carry
+FOOTSTEP_WALL_LOSS = 4 * RUN_LOUDNESS  # Even the thinnest wall piece stops footsteps
+SHOUT_LOUDNESS = 40  # Enough to get through the odd wall
+SPAWN_MIN_STEPS = 10  # Flow field steps kept between the player and a new enemy
+FLOWFIELD_BUDGET = 32768  # Cells of a flow field rebuild per tick, a few ms on the big maps
+ECHOWAVE_INTERVAL = 0.5  # Seconds between footstep echoes while running
+
+# Subsystems a tick is split into, in the order they run
+STAGES = ("player", "flowfield", "enemies", "physics", "detection", "echoes", "fog")
+
+# Constants for the player's echo wave
+WAVE_SPEED = 6
+WAVE_RANGE = 100
+WAVE_STEP = 0.5
+WAVE_COLOUR = (255, 0, 0)  # Until a dot hits a wall, then it turns green
+SHOUT_COLOUR = (255, 160, 0)  # Waves sent while a shout lasts
+
+
+class Controls:
+    # Player input for one tick. The window fills it in from key and mouse
+    # events; anything headless (benchmarks, replays) builds it directly.
+    # move is 1 forwards, -1 backwards or 0; aim is a world point or None.
+    __slots__ = ("move", "walk", "shout", "aim_x", "aim_y")
+
+    def __init__(self, move=0, walk=False, shout=False, aim_x=None, aim_y=None):
+        self.move = move
+        self.walk = walk
+        self.shout = shout
+        self.aim_x = aim_x
+        self.aim_y = aim_y
+
+    def copy(self):
+        return Controls(self.move, self.walk, self.shout, self.aim_x, self.aim_y)
+
+
+class Body:
+    # Axis-aligned box with the sprite attributes MovementResolver reads,
+    # so the simulation never needs arcade
+    def __init__(self, x, y, width, height):
+        self.center_x = x
+        self.center_y = y
+        self.width = width
+        self.height = height
+        self.change_x = 0
+        self.change_y = 0
+        self.angle = 0
+
+    @property
+    def left(self):
+        return self.center_x - self.width / 2
+
+    @property
+    def right(self):
+        return self.center_x + self.width / 2
+
+    @property
+    def bottom(self):
+        return self.center_y - self.height / 2
+
+    @property
+    def top(self):
+        return self.center_y + self.height / 2
+
+
+class Player(Body):
+    def __init__(self, x, y):
+        super().__init__(x, y, *PLAYER_SIZE)
+        self.speed = RUNNING_SPEED
+        # Shout variables
+        self.shout = False
+        self.shout_time = SHOUT_PAUSE_TIME
+        self.shout_cooldown = SHOUT_COOL
+        # Direction variables
+        self.forward_x = 0
+        self.forward_y = 0
+        self.aim_x = None
+        self.aim_y = None
+        # Movement state
+        self.moving_forwards = False
+        self.moving_backwards = False
+        self.is_running_forwards = False
+        self.echowave_timer = ECHOWAVE_INTERVAL
+
+    def update(self, dt):
+        # Returns True when a footstep echo is due
+        if self.shout_time > 0:
+            self.shout_time = max(self.shout_time - dt, 0)
+        else:
+            self.shout = False
+        if self.shout_cooldown > 0:
+            self.shout_cooldown = max(self.shout_cooldown - dt, 0)
+        self.update_direction()
+        if self.moving_forwards:
+            self.change_x = self.forward_x * self.speed
+            self.change_y = self.forward_y * self.speed
+        elif self.moving_backwards:
+            self.change_x = -self.forward_x * self.speed
+            self.change_y = -self.forward_y * self.speed
+        else:
+            self.change_x = 0
+            self.change_y = 0
+
+        if self.is_running_forwards and self.speed == RUNNING_SPEED:
+            self.echowave_timer -= dt
+            if self.echowave_timer <= 0:
+                self.echowave_timer = ECHOWAVE_INTERVAL
+                return True
+        else:
+            self.echowave_timer = ECHOWAVE_INTERVAL
+        return False
+
+    def update_direction(self):
+        # Face the aim point and stop once it has been reached
+        if self.aim_x is None or self.aim_y is None:
+            return
+        diff_x = self.aim_x - self.center_x
+        diff_y = self.aim_y - self.center_y
+        norm = math.sqrt(diff_x ** 2 + diff_y ** 2)
+        if norm != 0:
+            self.forward_x = diff_x / norm
+            self.forward_y = diff_y / norm
+        self.angle = math.degrees(math.atan2(diff_y, diff_x)) - 90
+        if norm < 5:
+            self.stop()
+
+    def shout_wave(self):
+        # Returns True if the player actually shouted
+        if self.shout_time == 0 and self.shout_cooldown == 0:
+            self.shout = True
+            self.shout_time = SHOUT_PAUSE_TIME
+            self.shout_cooldown = SHOUT_COOL
+            return True
+        return False
+
+    def move_forwards(self):
+        self.moving_forwards = True
+        self.moving_backwards = False
+        self.is_running_forwards = True
+
+    def move_backwards(self):
+        self.moving_forwards = False
+        self.moving_backwards = True
+        self.is_running_forwards = False
+
+    def stop(self):
+        self.moving_forwards = False
+        self.moving_backwards = False
+        self.is_running_forwards = False
+
+
+class Simulation:
+    # Everything that changes game state - player, enemies, echo waves and
+    # detection - advanced in fixed dt ticks with no window or GPU. The arcade
+    # Game view feeds it Controls and draws whatever it holds; benchmarks and
+    # replays drive it directly. All randomness comes from one seeded rng.
+    # tiles is the map's raw Walls layer, giving walls their sound materials.
+    def __init__(self, grid, enemy_count=5, seed=None, player_start=(0, 0), dt=DT, tiles=None):
+        self.grid = grid
+        self.dt = dt
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.tick = 0
+        self.controls = Controls()
+        self.walking = False
+        self.stopped = True
+        self.wave_position = None
+        self.player_wave = None
+        # Optional FrameProfiler that times each stage of a tick
+        self.profiler = None
+        self._stages = [getattr(self, "_update_" + name) for name in STAGES]
+
+        self.player = Player(*player_start)
+        # Player and enemies are moved against the walls in one batch
+        self.movement = MovementResolver(grid)
+        # Room around every cell; echo rays are sphere-traced through it once
+        # per wave and patrolling enemies steer by it
+        self.distance = DistanceField(grid)
+        # Echo waves are advanced in one batch against the wall grid
+        self.echoes = EchoEngine(grid, field=self.distance)
+        # Walls the player has heard echoes off, fading back into the dark
+        self.fog = FogOfWar(grid)
+        # One search from the player's cell serves every chasing enemy
+        self.flowfield = FlowField(grid, slack=1, budget=FLOWFIELD_BUDGET)
+        self.flowfield.update(grid.cell_at(self.player.center_x, self.player.center_y))
+        # Wall-attenuated loudness around the player, one field per kind of noise
+        self.footsteps = SoundField(grid, tiles, material_losses(FOOTSTEP_WALL_LOSS), FOOTSTEP_WALL_LOSS,
+                                    radius=RUN_LOUDNESS)
+        self.shouts = SoundField(grid, tiles, material_losses(), radius=SHOUT_LOUDNESS)
+        self.shouted = False
+
+        # Open cells an enemy fits in, by region, so spawns can reach the player
+        self.spawns = SpawnIndex(grid, ENEMY_SIZE, self.flowfield)
+        # Player and enemies in one spatial hash for proximity queries; the
+        # player goes in first, every enemy after it
+        self.agents = SpatialHash(AGENT_CELL_SIZE, max(enemy_count, 1) + 1)
+        self.player_agent = self.agents.insert(self.player.center_x, self.player.center_y)
+        # Every enemy's state in arrays, advanced in vectorised steps
+        self.enemies = EnemyStore(grid, self.flowfield, self.distance, seed=self.rng.getrandbits(64),
+                                  capacity=max(enemy_count, 1), agents=self.agents)
+        for _ in range(enemy_count):
+            self.spawn_enemy()
+
+    @property
+    def time(self):
+        return self.tick * self.dt
+
+    def spawn_enemy(self, min_distance=SPAWN_MIN_STEPS, region=None):
+        # Random open spot the player can be reached from, min_distance steps
+        # away if anywhere is (region limits it to a cell rectangle, see
+        # spawns.quadrant); returns the enemy's index
+        source = self.grid.cell_at(self.player.center_x, self.player.center_y)
+        position = self.spawns.pick(self.rng, source, min_distance, region)
+        if position is None:
+            # Nowhere that far: closer will have to do
+            position = self.spawns.pick(self.rng, source, 0, region)
+        if position is None:
+            raise ValueError(f"No room for an enemy reachable from cell {source}")
+        return self.enemies.add(*position)
+
+    def run(self, ticks, controls=None):
+        for _ in range(ticks):
+            self.step(controls)
+
+    def step(self, controls=None):
+        # Advance one tick. controls is the input held during this tick;
+        # None keeps whatever was held last tick.
+        self.apply_controls(controls or self.controls)
+        profiler = self.profiler
+        if profiler is None or not profiler.enabled:
+            for stage in self._stages:
+                stage()
+        else:
+            for name, stage in zip(STAGES, self._stages):
+                with profiler.stage(name):
+                    stage()
+        self.tick += 1
+
+    def _update_player(self):
+        if self.player.update(self.dt):
+            self.echowave()
+
+    def _update_flowfield(self):
+        # Only rebuilt when the player moves into a new cell, a slice per tick
+        self.flowfield.update(self.grid.cell_at(self.player.center_x, self.player.center_y))
+
+    def _update_enemies(self):
+        self.enemies.update(self.dt, self.player)
+
+    def _update_physics(self):
+        self.enemies.move(self.movement, [self.player])
+        self.agents.move(self.player_agent, self.player.center_x, self.player.center_y)
+
+    def _update_detection(self):
+        self.detect_noise()
+
+    def _update_echoes(self):
+        if (not self.stopped or self.wave_position is not None) and not self.walking:
+            self.echowave()
+        self.update_echoes()
+
+    def _update_fog(self):
+        # Walls this tick's echoes reached light up; everything lit fades
+        self.fog.reveal(self.echoes.hit_cols, self.echoes.hit_rows)
+        self.fog.update(self.dt)
+
+    def apply_controls(self, controls):
+        # Turn held input into the press and release events the game reacts to
+        previous = self.controls
+        player = self.player
+        if controls.shout and not previous.shout:
+            self.shouted = player.shout_wave()
+            self.wave_position = None  # Reset wave position when shout is triggered
+        if controls.move != previous.move:
+            if controls.move > 0:
+                self.stopped = False
+                player.move_forwards()
+            elif controls.move < 0:
+                self.stopped = False
+                player.move_backwards()
+            else:
+                player.stop()
+                self.stopped = True
+        self.walking = controls.walk
+        player.speed = WALK_SPEED if controls.walk else RUNNING_SPEED
+        released = ((previous.move and controls.move != previous.move) or
+                    (previous.walk and not controls.walk) or (previous.shout and not controls.shout))
+        # Ensure echowave completes its path
+        if released and self.wave_position is not None:
+            self.stopped = False
+        player.aim_x = controls.aim_x
+        player.aim_y = controls.aim_y
+        if controls is not previous:
+            self.controls = controls.copy()
+
+    def echowave(self):
+        # Start a new wave from the player once the last one has finished
+        if self.wave_position is None:
+            self.wave_position = (self.player.center_x, self.player.center_y)
+            colour = SHOUT_COLOUR if self.player.shout else WAVE_COLOUR
+            self.player_wave = self.echoes.emit(self.wave_position[0], self.wave_position[1],
+                                                speed=WAVE_SPEED, max_range=WAVE_RANGE, step=WAVE_STEP,
+                                                colour=colour)
+
+    def update_echoes(self):
+        # Advance every live wave (player, shouts, enemies) in one batch
+        self.echoes.update()
+        if self.wave_position is not None and not self.echoes.is_active(self.player_wave):
+            self.wave_position = None
+            self.stopped = True  # Ensure stopped is set to True when wave completes
+
+    def running(self):
+        return not self.walking and not self.stopped
+
+    def detect_noise(self):
+        # Running footsteps, and shouts, alert every enemy that can hear them
+        if self.running():
+            self.alert(self.footsteps, RUN_LOUDNESS)
+        if self.shouted:
+            self.shouted = False
+            self.alert(self.shouts, SHOUT_LOUDNESS)
+
+    def alert(self, sound, level):
+        # Sound never carries further than level cells, so only enemies the
+        # spatial hash finds inside that circle need their loudness looked up
+        grid = self.grid
+        enemies = self.enemies
+        source = grid.cell_at(self.player.center_x, self.player.center_y)
+        near = enemies.within(self.player.center_x, self.player.center_y, (level + 1) * grid.cell_size)
+        if not len(near):
+            return
+        cols = np.floor(enemies.x[near] / grid.cell_size).astype(np.int64)
+        rows = np.floor(enemies.y[near] / grid.cell_size).astype(np.int64)
+        enemies.alert(near[sound.loudness_cells(source, level, cols, rows) > 0])
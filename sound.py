@@ -0,0 +1,153 @@
+import math
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from wallgrid import GID_MASK
+
+OPEN_LOSS = 1.0  # Loudness lost crossing one open cell
+WALL_LOSS = 20.0  # Loudness lost crossing one solid wall cell; more than running footsteps carry
+SQRT2 = math.sqrt(2)
+# How much of each Blind Maze Tileset wall tile is solid: 1 the full block,
+# 2 the rounded corner, 4 the three-quarter piece, 3 and 5 the quarter pieces
+TILE_COVERAGE = {1: 1.0, 2: 0.52, 3: 0.25, 4: 0.8, 5: 0.25}
+
+
+def material_losses(wall_loss=WALL_LOSS, coverage=TILE_COVERAGE, open_loss=OPEN_LOSS):
+    # Loss through each wall tile, from open floor up to wall_loss by how much of it is solid
+    return {tile_id: open_loss + (wall_loss - open_loss) * solid for tile_id, solid in coverage.items()}
+
+
+def attenuation_from_tiles(tiles, losses=None, wall_loss=WALL_LOSS, open_loss=OPEN_LOSS):
+    # Per-cell loss from a wall tile layer (raw gids, row 0 at the bottom).
+    # losses maps a tile id (flip flags ignored) to its own loss, so thin
+    # panels can let more sound through than solid rock.
+    tiles = np.asarray(tiles, dtype=np.uint32) & GID_MASK
+    attenuation = np.where(tiles != 0, wall_loss, open_loss).astype(np.float32)
+    for tile_id, loss in (losses or {}).items():
+        attenuation[tiles == tile_id] = loss
+    return attenuation
+
+
+class SoundField:
+    # How loud a noise is around the tile grid. From a source cell, sound
+    # spreads to all 8 neighbours losing each cell's attenuation on the way
+    # (walls cost much more than open floor, diagonals root 2 more and have
+    # to pass the cheaper of the two corners), so it bends round corners and
+    # only just bleeds through walls. A wall's loss comes from its tile in
+    # tiles (the raw Walls layer) through losses, wall_loss for tiles with no
+    # entry and without a layer. Each source cell's cost field covers a
+    # square of radius cells and is cached; a field is recomputed lazily after
+    # an edit touches its square. loudness() is an array lookup.
+    def __init__(self, grid, tiles=None, losses=None, wall_loss=WALL_LOSS, radius=40, cache_size=64):
+        self.grid = grid
+        self.radius = radius
+        self.cache_size = cache_size
+        # Loss of every cell as a wall, so a wall put back keeps its material
+        self.materials = attenuation_from_tiles(grid.cells if tiles is None else tiles, losses, wall_loss, wall_loss)
+        self.attenuation = np.where(grid.cells != 0, self.materials, OPEN_LOSS).astype(np.float32)
+        self.fields = OrderedDict()  # source cell -> cost to reach every cell of its square
+        # Counters
+        self.computes = 0
+        self.cache_hits = 0
+        self.last_compute_ms = 0.0
+        grid.subscribe(self.on_edit)
+
+    def on_edit(self, col, row, blocked):
+        # The cell's own material or open floor; fields that can see it are dropped
+        self.attenuation[row, col] = self.materials[row, col] if blocked else OPEN_LOSS
+        radius = self.radius
+        for source in [source for source in self.fields
+                       if abs(source[0] - col) <= radius and abs(source[1] - row) <= radius]:
+            del self.fields[source]
+
+    def field(self, col, row):
+        # Cost from (col, row) to each cell of the square around it
+        source = (col, row)
+        cost = self.fields.get(source)
+        if cost is not None:
+            self.cache_hits += 1
+            self.fields.move_to_end(source)
+            return cost
+        cost = self._compute(col, row)
+        self.fields[source] = cost
+        if len(self.fields) > self.cache_size:
+            self.fields.popitem(last=False)
+        return cost
+
+    def _compute(self, col, row):
+        begin = time.perf_counter()
+        radius = self.radius
+        size = 2 * radius + 1
+        # Losses for the square, padded by one cell; off the map sound stops
+        loss = np.full((size + 2, size + 2), np.inf, dtype=np.float32)
+        row0, col0 = row - radius, col - radius
+        top = max(row0, 0)
+        bottom = min(row0 + size, self.grid.rows)
+        left = max(col0, 0)
+        right = min(col0 + size, self.grid.cols)
+        if top < bottom and left < right:
+            loss[top - row0 + 1:bottom - row0 + 1, left - col0 + 1:right - col0 + 1] = \
+                self.attenuation[top:bottom, left:right]
+        inner = (slice(1, -1), slice(1, -1))
+        here = loss[inner]
+        # Diagonal steps: root 2 of the larger of the target and the cheaper corner
+        diagonal = {}
+        for dr in (-1, 1):
+            for dc in (-1, 1):
+                corner_a = loss[1 + dr:size + 1 + dr, 1:-1]
+                corner_b = loss[1:-1, 1 + dc:size + 1 + dc]
+                diagonal[dr, dc] = SQRT2 * np.maximum(here, np.minimum(corner_a, corner_b))
+
+        cost = np.full((size + 2, size + 2), np.inf, dtype=np.float32)
+        cost[radius + 1, radius + 1] = 0
+        # Relax from every neighbour until nothing improves. Nothing louder
+        # than radius exists, so costs past it are dropped and the number of
+        # rounds is bounded by the radius, never the map size.
+        best = cost[inner]
+        for _ in range(size * size):
+            previous = best.copy()
+            for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                np.minimum(best, cost[1 + dr:size + 1 + dr, 1 + dc:size + 1 + dc] + here, out=best)
+            for (dr, dc), step in diagonal.items():
+                np.minimum(best, cost[1 + dr:size + 1 + dr, 1 + dc:size + 1 + dc] + step, out=best)
+            best[best > radius] = np.inf
+            if np.array_equal(best, previous):
+                break
+        self.computes += 1
+        self.last_compute_ms = (time.perf_counter() - begin) * 1000
+        return cost[inner]
+
+    def loudness(self, source, level, col, row):
+        # How loud a noise of level made at source is at (col, row); 0 when
+        # it is inaudible or outside the propagation radius
+        dc = col - source[0]
+        dr = row - source[1]
+        radius = self.radius
+        if abs(dc) > radius or abs(dr) > radius:
+            return 0.0
+        cost = self.field(*source)[dr + radius, dc + radius]
+        return max(level - float(cost), 0.0)
+
+    def loudness_cells(self, source, level, cols, rows):
+        # loudness for arrays of cells around one source
+        dc = np.asarray(cols) - source[0]
+        dr = np.asarray(rows) - source[1]
+        radius = self.radius
+        inside = (np.abs(dc) <= radius) & (np.abs(dr) <= radius)
+        if not inside.any():
+            return np.zeros(len(dc))
+        cost = self.field(*source)[np.where(inside, dr + radius, 0), np.where(inside, dc + radius, 0)]
+        return np.where(inside, np.maximum(level - cost.astype(float), 0.0), 0.0)
+
+    def loudness_world(self, source_xy, level, x, y):
+        return self.loudness(self.grid.cell_at(*source_xy), level, *self.grid.cell_at(x, y))
+
+    def stats(self):
+        return {
+            "fields": len(self.fields),
+            "computes": self.computes,
+            "cache_hits": self.cache_hits,
+            "last_compute_ms": self.last_compute_ms,
+        }
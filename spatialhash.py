@@ -0,0 +1,231 @@
+import math
+
+import numpy as np
+
+SMALL_COUNT = 64  # Up to this many agents, pairs and nearest test every one of them
+# Up to this many agents a box or radius query tests every agent: one numpy
+# pass over the positions costs less than gathering the buckets it covers
+SCAN_COUNT = 16384
+# Cell keys pack (cx, cy) into one int64 so a row of cells is one key range
+KEY_OFFSET = 1 << 20
+KEY_STRIDE = 1 << 21
+
+_NO_IDS = np.zeros(0, dtype=np.int64)
+
+
+class SpatialHash:
+    # Uniform grid of agents (player, enemies) keyed by cell. Agents are the
+    # dense ids insert() hands out, with their positions and cell keys in
+    # arrays; move() writes new positions in place and only touches the cell
+    # keys of agents that crossed into another cell. Buckets are runs of ids
+    # sorted by cell key, re-sorted only after some agent changed cell (the
+    # order is then nearly sorted, which a stable sort handles in about linear
+    # time). Radius, AABB, k-nearest and all-pairs queries search just the
+    # cells they overlap, so their cost follows local density, not the agent
+    # count - once there are enough agents for that to beat a plain numpy
+    # pass over all of them, which for a single box is tens of thousands.
+    def __init__(self, cell_size, capacity=64):
+        self.cell_size = float(cell_size)
+        self.count = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.key = np.zeros(capacity, dtype=np.int64)
+        self._order = _NO_IDS  # Ids sorted by cell key
+        self._keys = _NO_IDS  # Their keys, in the same order
+        self._dirty = False
+        # Counters
+        self.sorts = 0
+        self.crossings = 0  # Agents that changed cell in move()
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self, count):
+        capacity = max(len(self.x) * 2, count, 1)
+        for name in ("x", "y", "key"):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def _cells(self, x, y):
+        size = self.cell_size
+        limit = KEY_OFFSET - 1
+        cx = np.clip(np.floor(np.asarray(x, dtype=float) / size), -limit, limit).astype(np.int64)
+        cy = np.clip(np.floor(np.asarray(y, dtype=float) / size), -limit, limit).astype(np.int64)
+        return cx, cy
+
+    def _cell(self, x, y):
+        # Clamped cell of one point
+        limit = KEY_OFFSET - 1
+        cx = min(max(math.floor(x / self.cell_size), -limit), limit)
+        cy = min(max(math.floor(y / self.cell_size), -limit), limit)
+        return cx, cy
+
+    def _key(self, x, y):
+        cx, cy = self._cells(x, y)
+        return (cy + KEY_OFFSET) * KEY_STRIDE + cx + KEY_OFFSET
+
+    def insert(self, x, y):
+        # Register an agent at (x, y); returns its id
+        if self.count == len(self.x):
+            self._grow(self.count + 1)
+        agent = self.count
+        self.x[agent] = x
+        self.y[agent] = y
+        self.key[agent] = self._key(x, y)
+        self.count += 1
+        self._dirty = True
+        return agent
+
+    def move(self, agents, x, y):
+        # New positions for one id or an array of ids
+        self.x[agents] = x
+        self.y[agents] = y
+        key = self._key(x, y)
+        crossed = self.key[agents] != key
+        if np.any(crossed):
+            self.key[agents] = key
+            self.crossings += int(np.count_nonzero(crossed))
+            self._dirty = True
+
+    def _sorted(self):
+        if self._dirty:
+            n = self.count
+            if len(self._order) == n:
+                order = self._order[np.argsort(self.key[self._order], kind="stable")]
+            else:
+                order = np.argsort(self.key[:n], kind="stable")
+            self._order = order
+            self._keys = self.key[order]
+            self._dirty = False
+            self.sorts += 1
+        return self._order, self._keys
+
+    def query_aabb(self, left, bottom, right, top):
+        # Ids of the agents whose position lies in a world AABB
+        n = self.count
+        if n <= SCAN_COUNT:
+            x = self.x[:n]
+            y = self.y[:n]
+            return np.flatnonzero((x >= left) & (x <= right) & (y >= bottom) & (y <= top))
+        order, keys = self._sorted()
+        if left > right or bottom > top:
+            return _NO_IDS
+        cx0, cy0 = self._cell(left, bottom)
+        cx1, cy1 = self._cell(right, top)
+        # Only rows of cells that hold anyone
+        cy0 = max(cy0, int(keys[0]) // KEY_STRIDE - KEY_OFFSET)
+        cy1 = min(cy1, int(keys[-1]) // KEY_STRIDE - KEY_OFFSET)
+        if cy0 > cy1:
+            return _NO_IDS
+        rows = (np.arange(cy0, cy1 + 1, dtype=np.int64) + KEY_OFFSET) * KEY_STRIDE + KEY_OFFSET
+        start = np.searchsorted(keys, rows + cx0, "left")
+        counts = np.searchsorted(keys, rows + cx1, "right") - start
+        total = int(counts.sum())
+        if not total:
+            return _NO_IDS
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        found = order[np.repeat(start, counts) + within]
+        x = self.x[found]
+        y = self.y[found]
+        return found[(x >= left) & (x <= right) & (y >= bottom) & (y <= top)]
+
+    def query_radius(self, x, y, radius, exclude=None):
+        # Ids of the agents within radius of (x, y)
+        found = self.query_aabb(x - radius, y - radius, x + radius, y + radius)
+        near = (self.x[found] - x) ** 2 + (self.y[found] - y) ** 2 <= radius * radius
+        if exclude is not None:
+            near &= found != exclude
+        return found[near]
+
+    def nearest(self, x, y, k=1, max_radius=None, exclude=None):
+        # Up to k agents closest to (x, y), nearest first (ties by id). With
+        # many agents, searches circles of doubling radius until one holds k
+        # agents (every agent closer than the kth is then inside it) or
+        # covers everyone; the first circle is sized to hold k agents at the
+        # average density.
+        n = self.count
+        if not n or k < 1:
+            return _NO_IDS
+        all_x = self.x[:n]
+        all_y = self.y[:n]
+        if n <= SCAN_COUNT:
+            keep = np.ones(n, dtype=bool)
+            if max_radius is not None:
+                keep = (all_x - x) ** 2 + (all_y - y) ** 2 <= max_radius * max_radius
+            if exclude is not None:
+                keep[exclude] = False
+            found = np.flatnonzero(keep)
+        else:
+            left, right = float(all_x.min()), float(all_x.max())
+            bottom, top = float(all_y.min()), float(all_y.max())
+            # A cell past the farthest agent, so rounding can't leave it out
+            reach = math.hypot(max(x - left, right - x), max(y - bottom, top - y)) + self.cell_size
+            if max_radius is not None:
+                reach = min(reach, max_radius)
+            area = max(right - left, self.cell_size) * max(top - bottom, self.cell_size)
+            radius = min(max(math.sqrt(area * k / (math.pi * n)), self.cell_size), reach)
+            while True:
+                found = self.query_radius(x, y, radius, exclude)
+                if len(found) >= k or radius >= reach:
+                    break
+                radius = min(radius * 2, reach)
+        distance = (self.x[found] - x) ** 2 + (self.y[found] - y) ** 2
+        if len(found) > k:
+            # Everything as close as the kth, then sorted
+            closest = distance <= np.partition(distance, k - 1)[k - 1]
+            found = found[closest]
+            distance = distance[closest]
+        return found[np.lexsort((found, distance))[:k]]
+
+    def pairs(self, radius):
+        # (i, j) id arrays of every ordered pair of agents within radius of
+        # each other; radius must not exceed the cell size. Only half the
+        # neighbouring cells are searched (queries in sorted order, which
+        # searchsorted is much faster at); pairs from the other half are the
+        # same ones mirrored.
+        if radius > self.cell_size:
+            raise ValueError(f"Pair radius {radius} is larger than the cell size {self.cell_size}")
+        n = self.count
+        if n < 2:
+            return _NO_IDS, _NO_IDS
+        x = self.x[:n]
+        y = self.y[:n]
+        if n <= SMALL_COUNT:
+            # A handful of agents: every pair at once is cheaper than the buckets
+            near = (x[:, None] - x) ** 2 + (y[:, None] - y) ** 2 <= radius * radius
+            np.fill_diagonal(near, False)
+            return np.nonzero(near)
+        order, keys = self._sorted()
+        firsts = []
+        seconds = []
+        for offset in (0, 1, KEY_STRIDE - 1, KEY_STRIDE, KEY_STRIDE + 1):
+            query = keys + offset
+            start = np.searchsorted(keys, query, "left")
+            counts = np.searchsorted(keys, query, "right") - start
+            total = int(counts.sum())
+            if not total:
+                continue
+            first = np.repeat(order, counts)
+            within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            second = order[np.repeat(start, counts) + within]
+            near = (x[first] - x[second]) ** 2 + (y[first] - y[second]) ** 2 <= radius * radius
+            if offset:
+                firsts += [first[near], second[near]]
+                seconds += [second[near], first[near]]
+            else:
+                near &= first != second
+                firsts.append(first[near])
+                seconds.append(second[near])
+        if not firsts:
+            return _NO_IDS, _NO_IDS
+        return np.concatenate(firsts), np.concatenate(seconds)
+
+    def stats(self):
+        return {
+            "agents": self.count,
+            "cells": len(np.unique(self._sorted()[1])),
+            "sorts": self.sorts,
+            "crossings": self.crossings,
+        }
@@ -0,0 +1,224 @@
+import math
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from flowfield import UNREACHED
+
+NO_COMPONENT = -1
+
+
+def label_components(open_cells):
+    # Connected components of the True cells of a 2D array (4-connected, the
+    # same regions the flow field's no-corner-cutting steps can cover).
+    # Returns (labels, sizes): labels[row, col] is the component id (0 is the
+    # largest) or NO_COMPONENT, sizes[id] its cell count. Union-find over
+    # row runs, so the Python work scales with runs rather than cells.
+    rows, cols = open_cells.shape
+    parent = []
+    run_rows = []
+    run_starts = []
+    run_ends = []
+
+    def find(run):
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+
+    previous = []  # (start, end, run) of the row below
+    for row in range(rows):
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], open_cells[row].view(np.int8), [0]))))
+        current = []
+        below = 0
+        for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+            run = len(parent)
+            parent.append(run)
+            run_rows.append(row)
+            run_starts.append(start)
+            run_ends.append(end)
+            # Join every run below that shares a column with this one
+            while below < len(previous) and previous[below][1] <= start:
+                below += 1
+            other = below
+            while other < len(previous) and previous[other][0] < end:
+                a, b = find(run), find(previous[other][2])
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+                other += 1
+            current.append((start, end, run))
+        previous = current
+
+    labels = np.full((rows, cols), NO_COMPONENT, dtype=np.int32)
+    if not parent:
+        return labels, np.zeros(0, dtype=np.int64)
+    roots = np.array([find(run) for run in range(len(parent))])
+    lengths = np.array(run_ends) - np.array(run_starts)
+    # Number components by size, largest first
+    unique, inverse = np.unique(roots, return_inverse=True)
+    sizes = np.bincount(inverse, weights=lengths).astype(np.int64)
+    rank = np.empty(len(unique), dtype=np.int32)
+    rank[np.argsort(-sizes, kind="stable")] = np.arange(len(unique))
+    run_labels = rank[inverse]
+    flat = labels.ravel()
+    for row, start, end, label in zip(run_rows, run_starts, run_ends, run_labels.tolist()):
+        flat[row * cols + start:row * cols + end] = label
+    return labels, np.sort(sizes)[::-1]
+
+
+def quadrant(grid, index):
+    # Cell rectangle (col0, row0, col1, row1), inclusive, of one quarter of
+    # the map: 0 bottom left, 1 bottom right, 2 top left, 3 top right
+    half_cols = grid.cols // 2
+    half_rows = grid.rows // 2
+    col0 = half_cols if index % 2 else 0
+    row0 = half_rows if index >= 2 else 0
+    return (col0, row0, grid.cols - 1 if index % 2 else half_cols - 1,
+            grid.rows - 1 if index >= 2 else half_rows - 1)
+
+
+class SpawnIndex:
+    # Where an enemy of a given size can be placed: every open cell whose
+    # centre holds the whole box clear of walls, labelled with the connected
+    # component it lies in. pick() draws uniformly from the cells in the same
+    # component as a source cell (the player; the largest component if that
+    # is not open floor), optionally at least some distance away and inside
+    # a cell rectangle. The candidate cells for a query are gathered once and
+    # kept (the cache_size most recently used queries), so each spawn after
+    # that is one rng draw. Distances are the flow
+    # field's steps from the player when given one (cells it has not
+    # reached count by their straight-line bound), straight-line cells
+    # otherwise. Wall edits rebuild everything on the next pick.
+    def __init__(self, grid, size, flowfield=None, cache_size=16):
+        self.grid = grid
+        self.size = size
+        self.flowfield = flowfield
+        self.labels = None
+        self.sizes = None
+        self.fits = None
+        self.cache_size = cache_size
+        self._candidates = OrderedDict()  # Query -> (cols, rows)
+        self.dirty = True
+        # Counters
+        self.builds = 0
+        self.queries = 0
+        self.last_build_ms = 0.0
+        grid.subscribe(self.on_edit)
+
+    def on_edit(self, col, row, blocked):
+        self.dirty = True
+
+    def _build(self):
+        begin = time.perf_counter()
+        grid = self.grid
+        size = grid.cell_size
+        walls = grid.cells != 0
+        self.labels, self.sizes = label_components(~walls)
+        # Cells a box centred on the cell centre overlaps, relative to the
+        # cell; off the map counts as open like WallGrid.hit_aabb
+        half_w = self.size[0] / 2
+        half_h = self.size[1] / 2
+        col0 = math.floor(0.5 - half_w / size)
+        col1 = math.floor(0.5 + half_w / size)
+        row0 = math.floor(0.5 - half_h / size)
+        row1 = math.floor(0.5 + half_h / size)
+        pad_x = max(-col0, col1)
+        pad_y = max(-row0, row1)
+        padded = np.zeros((grid.rows + 2 * pad_y + 1, grid.cols + 2 * pad_x + 1), dtype=np.int32)
+        padded[pad_y + 1:pad_y + 1 + grid.rows, pad_x + 1:pad_x + 1 + grid.cols] = walls
+        table = padded.cumsum(0).cumsum(1)
+
+        def corner(dr, dc):
+            return table[pad_y + dr:pad_y + dr + grid.rows, pad_x + dc:pad_x + dc + grid.cols]
+
+        window = (corner(row1 + 1, col1 + 1) - corner(row0, col1 + 1)
+                  - corner(row1 + 1, col0) + corner(row0, col0))
+        self.fits = (window == 0) & ~walls
+        self._candidates.clear()
+        self.dirty = False
+        self.builds += 1
+        self.last_build_ms = (time.perf_counter() - begin) * 1000
+
+    def component(self, col, row):
+        # Component id of a cell, NO_COMPONENT for walls and off the map
+        if self.dirty:
+            self._build()
+        if not self.grid.in_bounds(col, row):
+            return NO_COMPONENT
+        return int(self.labels[row, col])
+
+    def reachable(self, a, b):
+        # Whether cells a and b are joined by open floor
+        component = self.component(*a)
+        return component != NO_COMPONENT and component == self.component(*b)
+
+    def candidates(self, source, min_distance=0, region=None):
+        # (cols, rows) of every cell a spawn for this query may use
+        if self.dirty:
+            self._build()
+        component = self.component(*source)
+        if component == NO_COMPONENT and len(self.sizes):
+            component = 0  # Source in a wall or off the map: use the largest region
+        flowfield = self.flowfield
+        key = (component, min_distance and source, min_distance, region,
+               flowfield.version if flowfield is not None and min_distance else None)
+        found = self._candidates.get(key)
+        if found is not None:
+            self._candidates.move_to_end(key)
+            return found
+        if component == NO_COMPONENT:
+            found = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))  # No open floor at all
+        else:
+            allowed = self.fits & (self.labels == component)
+            if region is not None:
+                col0, row0, col1, row1 = region
+                inside = np.zeros_like(allowed)
+                inside[max(row0, 0):row1 + 1, max(col0, 0):col1 + 1] = True
+                allowed &= inside
+            rows, cols = np.nonzero(allowed)
+            if min_distance:
+                if flowfield is not None:
+                    # Steps no route from source can beat: a cell's steps from
+                    # the field's root less the root's steps to source (the
+                    # root may lag within the field's slack), and never under
+                    # the straight-line bound, which is all a cell the field
+                    # has not reached (yet) gets
+                    far = np.maximum(np.abs(cols - source[0]), np.abs(rows - source[1]))
+                    offset = int(flowfield.dist[source[1], source[0]]) if self.grid.in_bounds(*source) else UNREACHED
+                    if offset != UNREACHED:
+                        steps = flowfield.dist[rows, cols]
+                        reached = steps != UNREACHED
+                        far[reached] = np.maximum(far[reached], steps[reached] - offset)
+                    far = far >= min_distance
+                else:
+                    far = np.hypot(cols - source[0], rows - source[1]) >= min_distance
+                cols = cols[far]
+                rows = rows[far]
+            found = (cols, rows)
+        self._candidates[key] = found
+        if len(self._candidates) > self.cache_size:
+            self._candidates.popitem(last=False)
+        return found
+
+    def pick(self, rng, source, min_distance=0, region=None):
+        # World centre of a random cell for a spawn reachable from source
+        # (col, row), or None when there is none. rng is a random.Random.
+        cols, rows = self.candidates(source, min_distance, region)
+        self.queries += 1
+        if not len(cols):
+            return None
+        index = rng.randrange(len(cols))
+        return self.grid.cell_center(int(cols[index]), int(rows[index]))
+
+    def stats(self):
+        if self.dirty:
+            self._build()
+        return {
+            "components": len(self.sizes),
+            "largest": int(self.sizes[0]) if len(self.sizes) else 0,
+            "fitting_cells": int(self.fits.sum()),
+            "builds": self.builds,
+            "queries": self.queries,
+            "last_build_ms": self.last_build_ms,
+        }
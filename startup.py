@@ -0,0 +1,101 @@
+import importlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StartupTimer:
+    # Milestones of a launch in ms since `started` (taken on main.py's first
+    # line): the first frame on screen, loading finished, the click, and the
+    # first playable frame. Each milestone keeps the first time it was hit.
+    def __init__(self, started=None, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock() if started is None else started
+        self.marks = {}
+
+    def mark(self, name):
+        if name not in self.marks:
+            self.marks[name] = (self.clock() - self.started) * 1000
+        return self.marks[name]
+
+    def since(self, name):
+        # ms from a milestone to now
+        return (self.clock() - self.started) * 1000 - self.marks[name]
+
+    def stats(self):
+        return dict(self.marks)
+
+    def report(self):
+        return ", ".join(f"{name.replace('_', ' ')} {ms:.0f} ms" for name, ms in self.marks.items())
+
+
+class Preloader:
+    # Loading jobs run on background threads while the menu is up. Jobs are
+    # plain callables keyed by name; take() hands back a job's result (and
+    # forgets it), blocking only if the job has not finished, and raises the
+    # job's error on the caller's thread. Threads rather than processes
+    # because the results - memory-mapped maps, numpy arrays, textures - are
+    # needed in this process; file reads, numpy and image decoding release
+    # the GIL, so the menu keeps drawing.
+    def __init__(self, workers=2, clock=time.perf_counter):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preload")
+        self.clock = clock
+        self.jobs = {}
+        # Counters
+        self.timings = {}  # name -> ms the job ran for
+        self.waited = {}  # name -> ms take() blocked on it
+
+    def __contains__(self, name):
+        return name in self.jobs
+
+    def submit(self, name, fn, *args, **kwargs):
+        def timed():
+            begin = self.clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.timings[name] = (self.clock() - begin) * 1000
+
+        self.jobs[name] = self.pool.submit(timed)
+
+    def ready(self, name=None):
+        # Whether a job, or every job left, has finished (or failed)
+        if name is not None:
+            return self.jobs[name].done()
+        return all(job.done() for job in self.jobs.values())
+
+    def take(self, name):
+        job = self.jobs.pop(name)
+        begin = self.clock()
+        try:
+            return job.result()
+        finally:
+            self.waited[name] = (self.clock() - begin) * 1000
+
+    def close(self):
+        # Drop whatever has not started; a job already running is left to finish
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.jobs.clear()
+
+    def stats(self):
+        return {name: {"ms": ms, "waited_ms": self.waited.get(name, 0.0)} for name, ms in self.timings.items()}
+
+
+def import_modules(names):
+    # Background job: import modules so the main thread finds them loaded
+    for name in names:
+        importlib.import_module(name)
+
+
+def load_world(map_path, scale, enemy_count, player_start, seed=None, cache_dir=None):
+    # Background job: the baked map (compiled first if the cache is stale)
+    # and a seeded Simulation on it. The simulation modules are imported
+    # here, so their import cost lands on the worker too. Returns
+    # (baked_map, sim, seed).
+    from mapcache import CACHE_DIR, load_map
+    from replay import new_seed
+    from simulation import Simulation
+    baked_map = load_map(map_path, scale, cache_dir or CACHE_DIR)
+    seed = new_seed() if seed is None else seed
+    sim = Simulation(baked_map.grid(), enemy_count=enemy_count, seed=seed, player_start=player_start,
+                     tiles=baked_map.wall_tiles())
+    return baked_map, sim, seed
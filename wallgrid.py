@@ -0,0 +1,202 @@
+import math
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+
+import numpy as np
+
+# Tiled stores flip/rotation flags in the top bits of every gid
+GID_MASK = 0x0FFFFFFF
+
+
+def read_tmx_layer(path, layer_name):
+    # Returns (tiles, tile_width, tile_height) with tiles[row, col] in Tiled order (row 0 = top)
+    root = ET.parse(path).getroot()
+    tile_width = int(root.get("tilewidth"))
+    tile_height = int(root.get("tileheight"))
+    for layer in root.iter("layer"):
+        if layer.get("name") != layer_name:
+            continue
+        width = int(layer.get("width"))
+        height = int(layer.get("height"))
+        data = layer.find("data")
+        if data is None or data.get("encoding") != "csv":
+            raise ValueError(f"Layer {layer_name!r} in {path} is not CSV encoded")
+        tiles = np.array(data.text.replace("\n", "").split(","), dtype=np.uint32)
+        return (tiles & GID_MASK).reshape(height, width), tile_width, tile_height
+    raise ValueError(f"No layer named {layer_name!r} in {path}")
+
+
+class WallGrid:
+    # Occupancy grid for one tile layer, in world coordinates matching arcade's
+    # load_tilemap (origin bottom left, each tile tile_width * scale wide).
+    # cells[row, col] is 1 for a wall, with row 0 at the bottom of the map.
+    # Walls can be edited at runtime with set_wall(); every edit bumps version
+    # and is pushed to subscribed consumers (searches, planners) so they can
+    # update just the part of their data that the cell touches.
+    def __init__(self, cells, cell_size, edit_log_size=4096):
+        self.cells = np.ascontiguousarray(cells, dtype=np.uint8)
+        self.rows, self.cols = self.cells.shape
+        self.cell_size = float(cell_size)
+        self.width = self.cols * self.cell_size
+        self.height = self.rows * self.cell_size
+        self.version = 0
+        self.edits = deque(maxlen=edit_log_size)  # (version, col, row, blocked)
+        self.listeners = []
+        self.edit_count = 0
+        self.last_edit_ms = 0.0
+        self.max_edit_ms = 0.0
+
+    @classmethod
+    def from_tmx(cls, path, scale, layer_name="Walls"):
+        tiles, tile_width, _ = read_tmx_layer(path, layer_name)
+        return cls(np.flipud(tiles != 0), tile_width * scale)
+
+    def cell_at(self, x, y):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def cell_center(self, col, row):
+        return (col + 0.5) * self.cell_size, (row + 0.5) * self.cell_size
+
+    def in_bounds(self, col, row):
+        return 0 <= col < self.cols and 0 <= row < self.rows
+
+    def is_wall(self, col, row):
+        # Cells outside the map are open, same as an empty sprite list
+        if not self.in_bounds(col, row):
+            return False
+        return bool(self.cells[row, col])
+
+    def hit_point(self, x, y):
+        col, row = self.cell_at(x, y)
+        return self.is_wall(col, row)
+
+    def _cell_range(self, left, bottom, right, top):
+        # Clamped inclusive cell range covering an AABB, or None if it is off the map
+        col0 = max(int(math.floor(left / self.cell_size)), 0)
+        row0 = max(int(math.floor(bottom / self.cell_size)), 0)
+        col1 = min(int(math.floor(right / self.cell_size)), self.cols - 1)
+        row1 = min(int(math.floor(top / self.cell_size)), self.rows - 1)
+        if col0 > col1 or row0 > row1:
+            return None
+        return col0, row0, col1, row1
+
+    def hit_aabb(self, left, bottom, right, top):
+        span = self._cell_range(left, bottom, right, top)
+        if span is None:
+            return False
+        col0, row0, col1, row1 = span
+        return bool(self.cells[row0:row1 + 1, col0:col1 + 1].any())
+
+    def hit_rect(self, center_x, center_y, width, height, angle=0):
+        # Rotated rectangle (angle in degrees, like arcade) against the grid,
+        # using a separating axis test on every wall cell under its bounding box
+        if angle % 90 == 0:
+            if angle % 180 != 0:
+                width, height = height, width
+            return self.hit_aabb(center_x - width / 2, center_y - height / 2,
+                                 center_x + width / 2, center_y + height / 2)
+        rad = math.radians(angle)
+        ux, uy = math.cos(rad), math.sin(rad)
+        half_w, half_h = width / 2, height / 2
+        extent_x = abs(ux) * half_w + abs(uy) * half_h
+        extent_y = abs(uy) * half_w + abs(ux) * half_h
+        span = self._cell_range(center_x - extent_x, center_y - extent_y,
+                                center_x + extent_x, center_y + extent_y)
+        if span is None:
+            return False
+        col0, row0, col1, row1 = span
+        half_cell = self.cell_size / 2
+        # Projection radius of a wall cell onto the rectangle's own axes
+        cell_u = half_cell * (abs(ux) + abs(uy))
+        for row, col in np.argwhere(self.cells[row0:row1 + 1, col0:col1 + 1]):
+            dx = (col0 + col + 0.5) * self.cell_size - center_x
+            dy = (row0 + row + 0.5) * self.cell_size - center_y
+            if abs(dx) > extent_x + half_cell or abs(dy) > extent_y + half_cell:
+                continue
+            if abs(dx * ux + dy * uy) > half_w + cell_u:
+                continue
+            if abs(-dx * uy + dy * ux) > half_h + cell_u:
+                continue
+            return True
+        return False
+
+    def hit_sprite(self, sprite):
+        return self.hit_aabb(sprite.left, sprite.bottom, sprite.right, sprite.top)
+
+    def subscribe(self, listener):
+        # listener(col, row, blocked) is called after every wall edit
+        self.listeners.append(listener)
+
+    def set_wall(self, col, row, blocked=True):
+        # Returns False if the cell already had that state
+        if not self.in_bounds(col, row):
+            raise ValueError(f"Cell {(col, row)} is outside the {self.cols}x{self.rows} grid")
+        if bool(self.cells[row, col]) == blocked:
+            return False
+        self.cells[row, col] = blocked
+        self.notify_edit(col, row, blocked)
+        return True
+
+    def notify_edit(self, col, row, blocked):
+        # Record an edit whose cell is already written and pass it on to every
+        # subscriber. set_wall() uses it; so do grids over shared memory that
+        # another process has already written to.
+        begin = time.perf_counter()
+        self.version += 1
+        self.edits.append((self.version, col, row, blocked))
+        for listener in self.listeners:
+            listener(col, row, blocked)
+        self.edit_count += 1
+        self.last_edit_ms = (time.perf_counter() - begin) * 1000
+        self.max_edit_ms = max(self.max_edit_ms, self.last_edit_ms)
+
+    def edits_since(self, version):
+        # Edits made after version, or None if the log no longer reaches back that far
+        if version == self.version:
+            return []
+        if not self.edits or self.edits[0][0] > version + 1:
+            return None
+        return [edit for edit in self.edits if edit[0] > version]
+
+    def free_cells(self):
+        # (col, row) arrays of every open cell
+        rows, cols = np.nonzero(self.cells == 0)
+        return cols, rows
+
+
+class GridPhysicsEngine:
+    # Drop-in for arcade.PhysicsEngineSimple that resolves against a WallGrid
+    # instead of scanning the walls SpriteList
+    def __init__(self, player_sprite, grid):
+        self.player_sprite = player_sprite
+        self.grid = grid
+
+    def update(self):
+        sprite = self.player_sprite
+        if sprite.change_x:
+            sprite.center_x += sprite.change_x
+            if self.grid.hit_sprite(sprite):
+                self._back_off(sprite, "x")
+        if sprite.change_y:
+            sprite.center_y += sprite.change_y
+            if self.grid.hit_sprite(sprite):
+                self._back_off(sprite, "y")
+
+    def _back_off(self, sprite, axis):
+        # Snap flush against the wall we ran into, then stop on that axis
+        size = self.grid.cell_size
+        if axis == "x":
+            if sprite.change_x > 0:
+                sprite.center_x -= sprite.right - math.floor(sprite.right / size) * size + 1e-6
+            else:
+                sprite.center_x += math.ceil(sprite.left / size) * size - sprite.left + 1e-6
+            if self.grid.hit_sprite(sprite):
+                sprite.center_x -= sprite.change_x
+        else:
+            if sprite.change_y > 0:
+                sprite.center_y -= sprite.top - math.floor(sprite.top / size) * size + 1e-6
+            else:
+                sprite.center_y += math.ceil(sprite.bottom / size) * size - sprite.bottom + 1e-6
+            if self.grid.hit_sprite(sprite):
+                sprite.center_y -= sprite.change_y
@@ -0,0 +1,217 @@
+import math
+import time
+
+import numpy as np
+
+BLOCK_SIZE = 32  # Cells along each side of a meshing block
+
+
+def greedy_mesh(cells):
+    # Cover the non-zero cells of a 2D array with axis-aligned rectangles:
+    # take the longest run along a row, then grow it over the following rows
+    # while they have the same run free. Returns (n, 4) col0, row0, col1, row1
+    # (inclusive), local to cells.
+    cells = np.asarray(cells) != 0
+    used = np.zeros_like(cells)
+    rows, cols = cells.shape
+    rects = []
+    for row in range(rows):
+        todo = cells[row] & ~used[row]
+        if not todo.any():
+            continue
+        # Starts and ends of every run still to cover in this row
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], todo.view(np.int8), [0]))))
+        for col0, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+            row1 = row
+            while row1 + 1 < rows and cells[row1 + 1, col0:end].all() and not used[row1 + 1, col0:end].any():
+                row1 += 1
+            used[row:row1 + 1, col0:end] = True
+            rects.append((col0, row, end - 1, row1))
+    return np.array(rects, dtype=np.int32).reshape(-1, 4)
+
+
+class WallRects:
+    # The walls of a WallGrid merged into rectangles, so long straight runs
+    # are one primitive instead of a tile each. Meshing is done per
+    # block_size square block; a wall edit re-meshes only its own block, and
+    # rectangles keep stable ids in a slot array (freed slots are reused).
+    # owner[row, col] is the id of the rectangle covering a wall cell, -1 on
+    # open floor. Used for rotated-box collision, ray casts and drawing.
+    def __init__(self, grid, block_size=BLOCK_SIZE):
+        self.grid = grid
+        self.block_size = block_size
+        self.blocks_x = math.ceil(grid.cols / block_size)
+        self.blocks_y = math.ceil(grid.rows / block_size)
+        self.owner = np.full((grid.rows, grid.cols), -1, dtype=np.int32)
+        self.cells = np.zeros((0, 4), dtype=np.int32)  # Per slot col0, row0, col1, row1
+        self.bounds = np.zeros((0, 4))  # Per slot left, bottom, right, top in world units
+        self.alive = np.zeros(0, dtype=bool)
+        self.free = []  # Dead slots to reuse
+        self.block_rects = {}  # (bx, by) -> ids of its rectangles
+        self.dirty = set()  # Blocks re-meshed since take_dirty()
+        # Counters
+        self.remeshes = 0
+        self.last_remesh_ms = 0.0
+        for by in range(self.blocks_y):
+            for bx in range(self.blocks_x):
+                self._mesh_block((bx, by))
+        grid.subscribe(self.on_edit)
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    def block_of(self, col, row):
+        return col // self.block_size, row // self.block_size
+
+    def block_slices(self, key):
+        size = self.block_size
+        return slice(key[1] * size, (key[1] + 1) * size), slice(key[0] * size, (key[0] + 1) * size)
+
+    def on_edit(self, col, row, blocked):
+        begin = time.perf_counter()
+        key = self.block_of(col, row)
+        self._mesh_block(key)
+        self.dirty.add(key)
+        self.remeshes += 1
+        self.last_remesh_ms = (time.perf_counter() - begin) * 1000
+
+    def take_dirty(self):
+        # Blocks to redraw since the last call
+        dirty = self.dirty
+        self.dirty = set()
+        return dirty
+
+    def _mesh_block(self, key):
+        rows, cols = self.block_slices(key)
+        old = self.block_rects.pop(key, None)
+        if old is not None:
+            self.alive[old] = False
+            self.free.extend(old.tolist())
+            self.owner[rows, cols] = -1
+        rects = greedy_mesh(self.grid.cells[rows, cols])
+        if not len(rects):
+            return
+        rects[:, [0, 2]] += cols.start
+        rects[:, [1, 3]] += rows.start
+        ids = self._allocate(len(rects))
+        self.cells[ids] = rects
+        size = self.grid.cell_size
+        self.bounds[ids] = np.column_stack((rects[:, 0] * size, rects[:, 1] * size,
+                                            (rects[:, 2] + 1) * size, (rects[:, 3] + 1) * size))
+        self.alive[ids] = True
+        for rect_id, (col0, row0, col1, row1) in zip(ids.tolist(), rects.tolist()):
+            self.owner[row0:row1 + 1, col0:col1 + 1] = rect_id
+        self.block_rects[key] = ids
+
+    def _allocate(self, count):
+        reused = self.free[-count:] if count <= len(self.free) else self.free[:]
+        del self.free[len(self.free) - len(reused):]
+        extra = count - len(reused)
+        if extra:
+            first = len(self.alive)
+            self.cells = np.concatenate((self.cells, np.zeros((extra, 4), dtype=np.int32)))
+            self.bounds = np.concatenate((self.bounds, np.zeros((extra, 4))))
+            self.alive = np.concatenate((self.alive, np.zeros(extra, dtype=bool)))
+            reused += range(first, first + extra)
+        return np.array(reused, dtype=np.int64)
+
+    def query_aabb(self, left, bottom, right, top):
+        # Ids of the rectangles overlapping a world AABB
+        size = self.grid.cell_size
+        col0 = max(int(math.floor(left / size)), 0)
+        row0 = max(int(math.floor(bottom / size)), 0)
+        col1 = min(int(math.floor(right / size)), self.grid.cols - 1)
+        row1 = min(int(math.floor(top / size)), self.grid.rows - 1)
+        if col0 > col1 or row0 > row1:
+            return np.zeros(0, dtype=np.int32)
+        ids = np.unique(self.owner[row0:row1 + 1, col0:col1 + 1])
+        return ids[1:] if len(ids) and ids[0] < 0 else ids
+
+    def hit_rect(self, center_x, center_y, width, height, angle=0):
+        # Rotated rectangle (angle in degrees, like arcade) against the walls,
+        # with a separating axis test per wall rectangle rather than per cell
+        rad = math.radians(angle)
+        ux, uy = math.cos(rad), math.sin(rad)
+        half_w, half_h = width / 2, height / 2
+        extent_x = abs(ux) * half_w + abs(uy) * half_h
+        extent_y = abs(uy) * half_w + abs(ux) * half_h
+        if self.grid.hit_point(center_x, center_y):
+            return True
+        size = self.grid.cell_size
+        col0 = max(int(math.floor((center_x - extent_x) / size)), 0)
+        row0 = max(int(math.floor((center_y - extent_y) / size)), 0)
+        col1 = min(int(math.floor((center_x + extent_x) / size)), self.grid.cols - 1)
+        row1 = min(int(math.floor((center_y + extent_y) / size)), self.grid.rows - 1)
+        if col0 > col1 or row0 > row1:
+            return False
+        ids = set(self.owner[row0:row1 + 1, col0:col1 + 1].ravel().tolist())
+        ids.discard(-1)
+        if not ids or angle % 90 == 0:
+            # Axis aligned: overlapping the covered cells is a hit
+            return bool(ids)
+        # The wall rectangle's axes were covered by the cell range; test the box's own
+        for left, bottom, right, top in self.bounds[list(ids)].tolist():
+            half_x = (right - left) / 2
+            half_y = (top - bottom) / 2
+            dx = left + half_x - center_x
+            dy = bottom + half_y - center_y
+            if abs(dx * ux + dy * uy) > half_w + half_x * abs(ux) + half_y * abs(uy):
+                continue
+            if abs(-dx * uy + dy * ux) > half_h + half_x * abs(uy) + half_y * abs(ux):
+                continue
+            return True
+        return False
+
+    def raycast(self, x, y, dir_x, dir_y, max_dist):
+        # Distance along unit directions to the first wall, inf if none within
+        # max_dist and 0 for rays starting inside a wall. Takes arrays (a
+        # whole echo wave at once) or scalars; every ray is slab tested in one
+        # pass against the rectangles under the rays' bounding box.
+        scalar = np.ndim(x) == 0 and np.ndim(dir_x) == 0
+        x, y, dir_x, dir_y = (np.atleast_1d(np.asarray(value, dtype=float)) for value in (x, y, dir_x, dir_y))
+        max_dist = np.asarray(max_dist, dtype=float)
+        end_x = x + dir_x * max_dist
+        end_y = y + dir_y * max_dist
+        ids = self.query_aabb(min(x.min(), end_x.min()), min(y.min(), end_y.min()),
+                              max(x.max(), end_x.max()), max(y.max(), end_y.max()))
+        if not len(ids):
+            distance = np.full(np.broadcast(x, dir_x).shape, np.inf)
+        else:
+            left, bottom, right, top = self.bounds[ids].T
+            # A zero component becomes a tiny one: the slab is then either
+            # never left or never entered, which is what parallel rays do
+            inv_x = 1 / np.where(dir_x == 0, 1e-12, dir_x)[:, None]
+            inv_y = 1 / np.where(dir_y == 0, 1e-12, dir_y)[:, None]
+            tx0 = (left - x[:, None]) * inv_x
+            tx1 = (right - x[:, None]) * inv_x
+            ty0 = (bottom - y[:, None]) * inv_y
+            ty1 = (top - y[:, None]) * inv_y
+            near = np.maximum(np.minimum(tx0, tx1), np.minimum(ty0, ty1))
+            far = np.minimum(np.maximum(tx0, tx1), np.maximum(ty0, ty1))
+            hit = (near <= far) & (far > 0) & (near <= np.reshape(max_dist, (-1, 1)))
+            distance = np.where(hit, np.maximum(near, 0), np.inf).min(axis=1)
+        return float(distance[0]) if scalar else distance
+
+    def stats(self):
+        return {
+            "rects": len(self),
+            "wall_cells": int(np.count_nonzero(self.grid.cells)),
+            "remeshes": self.remeshes,
+            "last_remesh_ms": self.last_remesh_ms,
+        }
+
+
+def rect_chunk_builder(rects, colour=(255, 255, 255)):
+    # build_chunk for a ChunkStreamer with chunk_size == rects.block_size:
+    # one filled rectangle per wall rectangle in a single ShapeElementList
+    def build(streamer, cx, cy):
+        ids = rects.block_rects.get((cx, cy))
+        if ids is None or not len(ids):
+            return None, 0
+        import arcade
+        shapes = arcade.ShapeElementList()
+        for left, bottom, right, top in rects.bounds[ids].tolist():
+            shapes.append(arcade.create_rectangle_filled((left + right) / 2, (bottom + top) / 2,
+                                                         right - left, top - bottom, colour))
+        return shapes, len(ids)
+    return build